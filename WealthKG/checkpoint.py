@@ -0,0 +1,164 @@
+#Import the libraries needed
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+class CrawlCheckpoint:
+    '''
+    Checkpoint directory of a multiclass crawl. Every finished class is written atomically as it completes,
+    so a crawl that is killed can be resumed by running the same query with the same directory.
+
+    Layout of the directory:
+    - manifest.json: fingerprint of the query, class list and the pending, done and failed classes, rewritten atomically
+      every manifest_every finished or failed classes and at the end of the crawl
+    - journal.jsonl: one line per finished or failed class, appended as the crawl progresses. It is the authoritative
+      record, a crawl killed between two manifest writes is resumed from it
+    - classes/<key>.csv: dataframe of every finished class
+
+    The state of a checkpoint, also of a crawl that is still running or was killed, can be read with
+    CrawlCheckpoint(directory).status()
+
+    Attributes:
+    - directory: string. Location of the checkpoint
+    - fingerprint: string. Hash of the query parameters the checkpoint belongs to
+    - class_list: list. Class URIs of the crawl
+    - done: dictionary with class key as the key and class URI as value
+    - failed: dictionary with class key as the key and the last error as value
+    - manifest_every: int. Amount of finished or failed classes between two manifest writes
+    '''
+    def __init__(self, directory, fingerprint=None, manifest_every=50):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.class_list = None
+        self.done = {}
+        self.failed = {}
+        self.manifest_every = manifest_every
+        self.__unsaved = 0
+
+        os.makedirs(os.path.join(directory, "classes"), exist_ok=True)
+        manifest = self.__read_manifest()
+        if manifest is not None:
+            if fingerprint is None:
+                #opened to read the state of an existing checkpoint
+                self.fingerprint = manifest["fingerprint"]
+            elif manifest["fingerprint"] != fingerprint:
+                raise Exception("Checkpoint at {} belongs to a different query".format(directory))
+            self.class_list = manifest["class_list"]
+            self.__replay_journal()
+
+    @staticmethod
+    def query_fingerprint(**parameters):
+        '''
+        Builds the fingerprint of a query
+        Input:
+        -parameters: keyword arguments, every parameter that changes the result of the query
+        Output:
+        -string: sha256 hash of the parameters
+        '''
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def start(self, class_list):
+        #Stores the class list of a new crawl, a resumed crawl keeps the class list it started with
+        if self.class_list is None:
+            self.class_list = list(class_list)
+        self.save_manifest()
+        return self.class_list
+
+    def is_done(self, key):
+        return key in self.done
+
+    def write_class(self, key, class_uri, df):
+        '''
+        Atomically writes a finished class and records it in the journal
+        Input:
+        -key: string, class key
+        -class_uri: string, URI of the class
+        -df: pandas dataframe, result of the class
+        '''
+        fullname = self.__class_file(key)
+        tmp_name = fullname + ".tmp"
+        df.to_csv(tmp_name, index=False)
+        self.__fsync_file(tmp_name)
+        os.replace(tmp_name, fullname)
+
+        self.__append_journal({"class": key, "uri": class_uri, "status": "done", "rows": len(df)})
+        self.done[key] = class_uri
+        self.failed.pop(key, None)
+        self.__progress()
+
+    def mark_failed(self, key, class_uri, error):
+        #Records a class that could not be queried, it is retried when the crawl is resumed
+        self.__append_journal({"class": key, "uri": class_uri, "status": "failed", "error": error})
+        self.failed[key] = error
+        self.__progress()
+
+    def read_class(self, key):
+        #Reads a finished class
+        return pd.read_csv(self.__class_file(key))
+
+    def status(self):
+        '''
+        Returns the state of the crawl
+        Output:
+        -dict: lists of pending, done and failed class keys
+        '''
+        keys = [class_uri.split('/')[-1] for class_uri in (self.class_list or [])]
+        return {"pending": [k for k in keys if k not in self.done and k not in self.failed],
+                "done": [k for k in keys if k in self.done],
+                "failed": [k for k in keys if k in self.failed]}
+
+    def save_manifest(self):
+        #Atomically rewrites manifest.json
+        self.__unsaved = 0
+        manifest = {"fingerprint": self.fingerprint, "class_list": self.class_list, **self.status(), "errors": self.failed}
+        fullname = os.path.join(self.directory, "manifest.json")
+        with open(fullname + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        self.__fsync_file(fullname + ".tmp")
+        os.replace(fullname + ".tmp", fullname)
+
+    def __progress(self):
+        #Helper function rewriting the manifest after every manifest_every recorded classes
+        self.__unsaved += 1
+        if self.__unsaved >= self.manifest_every:
+            self.save_manifest()
+
+    def __class_file(self, key):
+        return os.path.join(self.directory, "classes", "{}.csv".format(key))
+
+    def __read_manifest(self):
+        fullname = os.path.join(self.directory, "manifest.json")
+        if not os.path.exists(fullname):
+            return None
+        with open(fullname) as f:
+            return json.load(f)
+
+    def __append_journal(self, entry):
+        with open(os.path.join(self.directory, "journal.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __replay_journal(self):
+        #Rebuilds done and failed from the journal, a line torn by a crash is ignored
+        fullname = os.path.join(self.directory, "journal.jsonl")
+        if not os.path.exists(fullname):
+            return
+        with open(fullname) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["status"] == "done" and os.path.exists(self.__class_file(entry["class"])):
+                    self.done[entry["class"]] = entry["uri"]
+                    self.failed.pop(entry["class"], None)
+                elif entry["status"] == "failed":
+                    self.failed[entry["class"]] = entry["error"]
+
+    def __fsync_file(self, fullname):
+        with open(fullname, "rb+") as f:
+            os.fsync(f.fileno())
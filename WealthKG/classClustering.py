@@ -0,0 +1,174 @@
+#Import the libraries needed
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import cdist, pdist
+
+from .distanceMatrix import condensed_index
+
+#largest amount of distances held at once when a cluster is compared with itself
+BLOCK_CELLS = 10**7
+
+
+class CondensedDistances:
+    '''
+    Distances between classes read from a condensed upper triangle (scipy's pdist format), for example a float32
+    matrix of get_emd_distance_matrix(condensed=True) or the memmap of save_distance_matrix.
+    Only the requested blocks are read and converted, the square matrix is never built.
+
+    Attributes:
+    - matrix: numpy array or memmap. The condensed distances
+    - n: int. Amount of classes
+    '''
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.n = int(round((1 + np.sqrt(1 + 8 * len(matrix))) / 2)) if len(matrix) else 1
+        if self.n * (self.n - 1) // 2 != len(matrix):
+            raise Exception("A condensed matrix can not have {} values".format(len(matrix)))
+
+    def block(self, rows, columns):
+        #Returns the float64 distances between two lists of classes
+        rows = np.asarray(rows, dtype=np.int64)[:, None]
+        columns = np.asarray(columns, dtype=np.int64)[None, :]
+        low, high = np.minimum(rows, columns), np.maximum(rows, columns)
+        diagonal = low == high
+        positions = condensed_index(self.n, low, high)
+        positions[diagonal] = 0
+        result = np.asarray(self.matrix[positions], dtype=np.float64) if len(self.matrix) else np.zeros(positions.shape)
+        result[diagonal] = 0
+        return result
+
+    def condensed(self):
+        return self.matrix
+
+
+class EmbeddingDistances:
+    '''
+    Distances between classes computed on demand from one embedding vector per class,
+    for example the quantile sketches whose scaled cityblock distance is the approximate EMD
+
+    Attributes:
+    - embeddings: numpy array. One row per class
+    - metric: string. Metric of scipy's cdist
+    - scale: float. Factor applied to every distance
+    - n: int. Amount of classes
+    '''
+    def __init__(self, embeddings, metric="cityblock", scale=1.0):
+        self.embeddings = embeddings
+        self.metric = metric
+        self.scale = scale
+        self.n = len(embeddings)
+
+    def block(self, rows, columns):
+        return cdist(self.embeddings[rows], self.embeddings[columns], self.metric) * self.scale
+
+    def condensed(self):
+        return pdist(self.embeddings, self.metric) * self.scale
+
+
+class SubsetDistances:
+    '''
+    Distances between some of the classes of CondensedDistances or EmbeddingDistances, for example the classes with entities
+
+    Attributes:
+    - distances: CondensedDistances or EmbeddingDistances. The distances between all classes
+    - classes: numpy array. Position of every kept class among all classes
+    - n: int. Amount of kept classes
+    '''
+    def __init__(self, distances, classes):
+        self.distances = distances
+        self.classes = np.asarray(classes, dtype=np.int64)
+        self.n = len(self.classes)
+
+    def block(self, rows, columns):
+        return self.distances.block(self.classes[rows], self.classes[columns])
+
+    def condensed(self):
+        #the condensed matrix of the kept classes is filled one row of the upper triangle at a time
+        result = np.empty(self.n * (self.n - 1) // 2, dtype=np.float64)
+        for i in range(self.n - 1):
+            start = condensed_index(self.n, i, i + 1)
+            result[start:start + self.n - 1 - i] = self.distances.block(self.classes[i:i + 1], self.classes[i + 1:])[0]
+        return result
+
+
+def hierarchical(distances, n_clusters, method="average"):
+    '''
+    Agglomerative clustering cut into at most n_clusters clusters
+    Input:
+    -distances: CondensedDistances, EmbeddingDistances or SubsetDistances
+    -n_clusters: int, largest amount of clusters
+    -method: string, linkage method of scipy ("single", "complete", "average", "weighted"). Default "average".
+    Output:
+    -numpy array: cluster label of every class, starting at 0
+    '''
+    if distances.n < 2:
+        return np.zeros(distances.n, dtype=np.int64)
+    tree = linkage(distances.condensed(), method)
+    return fcluster(tree, n_clusters, "maxclust").astype(np.int64) - 1
+
+
+def k_medoids(distances, n_clusters, max_iter=100, seed=0):
+    '''
+    k-medoids clustering by alternating assignment and medoid update, started from a k-means++ like seeding.
+    Every step only needs the distances to the medoids and within the clusters.
+    Input:
+    -distances: CondensedDistances, EmbeddingDistances or SubsetDistances
+    -n_clusters: int, amount of clusters
+    -max_iter: int, largest amount of iterations. Default 100.
+    -seed: int, seed of the starting medoids. Default 0.
+    Output:
+    -labels: numpy array, cluster label of every class, starting at 0
+    -medoids: numpy array, position of the medoid class of every cluster
+    '''
+    n = distances.n
+    n_clusters = min(n_clusters, n)
+    rng = np.random.default_rng(seed)
+    medoids = [int(rng.integers(n))]
+    nearest = distances.block(np.arange(n), medoids)[:, 0]
+    while len(medoids) < n_clusters:
+        #a class is picked as the next medoid with a probability growing with its distance to the closest medoid
+        weights = nearest**2
+        candidate = int(rng.choice(n, p=weights / weights.sum())) if weights.sum() > 0 else \
+            int(rng.choice(np.setdiff1d(np.arange(n), medoids)))
+        medoids.append(candidate)
+        nearest = np.minimum(nearest, distances.block(np.arange(n), [candidate])[:, 0])
+    medoids = np.array(medoids, dtype=np.int64)
+
+    labels = np.zeros(n, dtype=np.int64)
+    for _ in range(max_iter):
+        labels = np.argmin(distances.block(np.arange(n), medoids), axis=1)
+        #a medoid is always in its own cluster, also when it is as close to another medoid
+        labels[medoids] = np.arange(len(medoids))
+        updated = cluster_medoids(distances, labels, len(medoids))[0]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return labels, medoids
+
+
+def cluster_medoids(distances, labels, n_clusters=None):
+    '''
+    Finds the class with the smallest total distance to the other classes of its cluster
+    Input:
+    -distances: CondensedDistances, EmbeddingDistances or SubsetDistances
+    -labels: numpy array, cluster label of every class
+    -n_clusters: int, amount of clusters, None for the largest label + 1. Default None.
+    Output:
+    -medoids: numpy array, position of the medoid class of every cluster
+    -mean_distance: numpy array, mean distance of the classes of every cluster to its medoid
+    '''
+    n_clusters = int(labels.max()) + 1 if n_clusters is None else n_clusters
+    medoids = np.zeros(n_clusters, dtype=np.int64)
+    mean_distance = np.full(n_clusters, np.nan)
+    for cluster in range(n_clusters):
+        members = np.flatnonzero(labels == cluster)
+        if len(members) == 0:
+            continue
+        totals = np.empty(len(members))
+        step = max(1, BLOCK_CELLS // len(members))
+        for start in range(0, len(members), step):
+            totals[start:start + step] = distances.block(members[start:start + step], members).sum(axis=1)
+        best = int(np.argmin(totals))
+        medoids[cluster] = members[best]
+        mean_distance[cluster] = totals[best] / len(members)
+    return medoids, mean_distance
@@ -0,0 +1,405 @@
+#Import the libraries needed
+import glob
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+METADATA_KEY = b"wealthkg.classes"
+MANIFEST_NAME = "_classes.json"
+COUNT_COLUMNS = ["pCount", "iCount", "totalCount"]
+FORMATS = ["parquet", "arrow"]
+
+
+def require_pyarrow():
+    #Helper function for the optional pyarrow dependency
+    if pa is None:
+        raise Exception("pyarrow is needed for the columnar formats, install it with pip install pyarrow")
+
+
+def class_schema():
+    '''
+    Schema of the columnar store. Entity IRIs and class keys are dictionary-encoded, counts are int32.
+    Output:
+    -pyarrow schema
+    '''
+    require_pyarrow()
+    return pa.schema([("class", pa.dictionary(pa.int32(), pa.string())),
+                      ("s", pa.dictionary(pa.int32(), pa.string())),
+                      ("pCount", pa.int32()),
+                      ("iCount", pa.int32()),
+                      ("totalCount", pa.int32())])
+
+
+def frame_to_table(key, df):
+    '''
+    Converts a class dataframe into a table of the columnar store
+    Input:
+    -key: string, class key
+    -df: pandas dataframe with the s, pCount, iCount and totalCount columns
+    Output:
+    -pyarrow table
+    '''
+    entity_column = "s" if "s" in df.columns else "entity"
+    entities = pa.array(df[entity_column].astype(str).to_numpy(), type=pa.string()).dictionary_encode()
+    columns = [pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(df), dtype=np.int32)), pa.array([key], type=pa.string())),
+               entities.cast(pa.dictionary(pa.int32(), pa.string()))]
+    for column in COUNT_COLUMNS:
+        columns.append(pa.array(df[column].to_numpy().astype(np.int32), type=pa.int32()))
+    return pa.Table.from_arrays(columns, schema=class_schema())
+
+
+class ColumnarWriter:
+    '''
+    Writer for the columnar store.
+    A single file is one parquet file with one or more row groups per class and the class index in its metadata.
+    A partitioned store is a folder with one parquet or arrow file per class and a _classes.json index.
+    Arrow IPC files can not replace their dictionaries, so the arrow format is always partitioned and
+    the chunks of a class are unified before its file is written.
+
+    Attributes:
+    - location: string. File (single file) or folder (partitioned) to write to
+    - format: string. "parquet" or "arrow"
+    - partitioned: boolean. True for one file per class
+    '''
+    def __init__(self, location, format="parquet", partitioned=False, compression="zstd"):
+        require_pyarrow()
+        if format not in FORMATS:
+            raise Exception("Unknown columnar format {}".format(format))
+        if format == "arrow" and not partitioned:
+            raise Exception("The arrow format is only available partitioned")
+
+        self.location = location
+        self.format = format
+        self.partitioned = partitioned
+        self.__compression = compression
+        self.__classes = {}
+        self.__row_groups = 0
+        self.__writer = None
+        self.__writer_key = None
+        self.__pending = []
+
+        if partitioned:
+            os.makedirs(location, exist_ok=True)
+        else:
+            directory = os.path.dirname(location)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            self.__writer = pq.ParquetWriter(location, class_schema(), compression=compression)
+
+    def write_class(self, key, df, class_value=None):
+        '''
+        Writes the dataframe of a class, calling it again with the same key appends to the class
+        Input:
+        -key: string, class key
+        -df: pandas dataframe of the class
+        -class_value: string, value of the class list for the class (e.g. its URI). Default key.
+        '''
+        entry = self.__classes.setdefault(key, {"class": class_value if class_value is not None else key, "rows": 0, "row_groups": []})
+        entry["rows"] += len(df)
+        if len(df) == 0:
+            return
+
+        table = frame_to_table(key, df)
+        if not self.partitioned:
+            self.__writer.write_table(table, row_group_size=len(table))
+            entry["row_groups"].append(self.__row_groups)
+            self.__row_groups += 1
+            return
+
+        if self.__writer_key != key:
+            self.__close_partition()
+            fullname = os.path.join(self.location, "{}.{}".format(key, self.format))
+            if self.format == "parquet":
+                self.__writer = pq.ParquetWriter(fullname, class_schema(), compression=self.__compression)
+            else:
+                self.__writer = ipc.new_file(fullname, class_schema(), options=ipc.IpcWriteOptions(compression=self.__compression))
+            self.__writer_key = key
+
+        if self.format == "parquet":
+            self.__writer.write_table(table)
+        else:
+            self.__pending.append(table)
+
+    def close(self):
+        #Finishes the store and writes the class index
+        index = json.dumps([{"key": key, **entry} for key, entry in self.__classes.items()])
+        if self.partitioned:
+            self.__close_partition()
+            with open(os.path.join(self.location, MANIFEST_NAME), "w") as f:
+                f.write(index)
+        else:
+            self.__writer.add_key_value_metadata({METADATA_KEY: index})
+            self.__writer.close()
+
+    def __close_partition(self):
+        if self.__writer is not None:
+            if self.__pending:
+                self.__writer.write_table(pa.concat_tables(self.__pending).unify_dictionaries().combine_chunks())
+                self.__pending = []
+            self.__writer.close()
+            self.__writer = None
+            self.__writer_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_class_csv(file_name, columns=None):
+    '''
+    Reads one class csv written by save_to_csv_folder. The pandas index column is skipped,
+    entity IRIs are read as strings and the counts as int32.
+    Input:
+    -file_name: string, csv file
+    -columns: list, columns to read, None for all. Default None.
+    Output:
+    -key, df: class key derived from the file name and the pandas dataframe of the class
+    '''
+    key = os.path.splitext(os.path.basename(file_name))[0]
+    #counts are parsed as nullable int32, classes without incoming properties have empty iCount cells after the merge
+    dtype = {"s": str, "entity": str, "pCount": "Int32", "iCount": "Int32", "totalCount": "Int32"}
+    df = pd.read_csv(file_name, usecols=lambda c: not c.startswith("Unnamed") and (columns is None or c in columns), dtype=dtype)
+    for c in COUNT_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].fillna(0).to_numpy(dtype=np.int32)
+    return key, df
+
+
+def detect_format(location):
+    '''
+    Detects the storage format of a saved multiclass result
+    Input:
+    -location: string, file or folder
+    Output:
+    -string: "csv", "parquet" or "arrow"
+    '''
+    if os.path.isfile(location):
+        return "parquet"
+    if os.path.exists(os.path.join(location, MANIFEST_NAME)):
+        with open(os.path.join(location, MANIFEST_NAME)) as f:
+            index = json.load(f)
+        for entry in index:
+            for format in FORMATS:
+                if os.path.exists(os.path.join(location, "{}.{}".format(entry["key"], format))):
+                    return format
+        return "parquet"
+    return "csv"
+
+
+class LazyClassDict(Mapping):
+    '''
+    Read-only class dictionary backed by a saved multiclass result, a class is only read when it is accessed.
+    The classes read are kept in least recently used order, when a memory budget is given the least recently used
+    classes are dropped until the resident frames fit in it again. The most recent class is always kept.
+
+    Attributes:
+    - location: string. File or folder of the store
+    - format: string. "csv", "parquet" or "arrow"
+    - columns: list. Columns to read, None for all columns
+    - memory_budget: int. Maximum bytes of resident frames, None to keep every class read
+    - index: dictionary with class key as the key and its entry of the class index as value, classes with entities only
+    - classes: list. Values of the class list of every stored class, also the ones without entities
+    - resident_bytes: int. Bytes of the resident frames
+    - loads: int. Amount of classes read from disk, a class dropped and accessed again is read again
+    '''
+    def __init__(self, location, columns=None, memory_budget=None, format=None):
+        self.location = location
+        self.columns = columns
+        self.memory_budget = memory_budget
+        self.format = format if format is not None else detect_format(location)
+        self.resident_bytes = 0
+        self.loads = 0
+        self.__parquet_file = None
+        self.__frames = OrderedDict()
+        self.__sizes = {}
+
+        if self.format == "csv":
+            entries = []
+            for file_name in sorted(glob.glob(os.path.join(location, "*.csv"))):
+                key = os.path.splitext(os.path.basename(file_name))[0]
+                entries.append({"key": key, "class": key, "file": file_name, "empty": not self.__has_rows(file_name)})
+            self.classes = [entry["class"] for entry in entries]
+            self.index = {entry["key"]: entry for entry in entries if not entry["empty"]}
+            return
+
+        require_pyarrow()
+        if os.path.isfile(location):
+            self.__parquet_file = pq.ParquetFile(location)
+            entries = json.loads(self.__parquet_file.metadata.metadata[METADATA_KEY])
+        else:
+            with open(os.path.join(location, MANIFEST_NAME)) as f:
+                entries = json.load(f)
+        self.classes = [entry["class"] for entry in entries]
+        self.index = {entry["key"]: entry for entry in entries if entry["rows"] > 0}
+
+    def __getitem__(self, key):
+        if key in self.__frames:
+            self.__frames.move_to_end(key)
+            return self.__frames[key]
+        if key not in self.index:
+            raise KeyError(key)
+
+        df = self.read(key)
+        self.loads += 1
+        self.__frames[key] = df
+        self.__sizes[key] = int(df.memory_usage(deep=True).sum())
+        self.resident_bytes += self.__sizes[key]
+        if self.memory_budget is not None:
+            while self.resident_bytes > self.memory_budget and len(self.__frames) > 1:
+                self.__drop(next(iter(self.__frames)))
+        return df
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self, key):
+        '''
+        Reads a class from the store without keeping it
+        Input:
+        -key: string, class key
+        Output:
+        -pandas dataframe: frame of the class, entity IRIs as a categorical column in the columnar formats
+        '''
+        if self.format == "csv":
+            return read_class_csv(self.index[key]["file"], self.columns)[1]
+
+        columns = self.columns if self.columns is not None else ["s"] + COUNT_COLUMNS
+        if self.__parquet_file is not None:
+            table = self.__parquet_file.read_row_groups(self.index[key]["row_groups"], columns=columns)
+        elif self.format == "parquet":
+            table = pq.read_table(os.path.join(self.location, "{}.parquet".format(key)), columns=columns)
+        else:
+            with pa.memory_map(os.path.join(self.location, "{}.arrow".format(key))) as source:
+                table = ipc.open_file(source).read_all().select(columns)
+        return table.to_pandas()
+
+    def resident_keys(self):
+        #Returns the keys of the resident classes, least recently used first
+        return list(self.__frames)
+
+    def clear_resident(self):
+        #Drops every resident class, they are read again when accessed
+        self.__frames.clear()
+        self.__sizes.clear()
+        self.resident_bytes = 0
+
+    def class_values(self):
+        #Returns the values of the class list in store order, the classes without entities included
+        return list(self.classes)
+
+    def __drop(self, key):
+        del self.__frames[key]
+        self.resident_bytes -= self.__sizes.pop(key)
+
+    def __has_rows(self, file_name):
+        #Helper function checking that a csv has a row after its header without parsing it
+        with open(file_name) as f:
+            f.readline()
+            return f.readline().strip() != ""
+
+
+class ClassDictOverlay(MutableMapping):
+    '''
+    Class dictionary with changes on top of another one, e.g. a LazyClassDict. Classes that are not replaced are
+    read from the base when accessed, so a lazily loaded result can be updated without reading every class.
+
+    Attributes:
+    - base: dictionary or LazyClassDict of each class' dataframe, never modified
+    - updates: dictionary with class key as the key and the replacing or added dataframe as value
+    - removed: set. Class keys of the base that are removed
+    '''
+    def __init__(self, base):
+        self.base = base
+        self.updates = {}
+        self.removed = set()
+
+    def __getitem__(self, key):
+        if key in self.updates:
+            return self.updates[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __setitem__(self, key, df):
+        self.updates[key] = df
+        self.removed.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.updates.pop(key, None)
+        if key in self.base:
+            self.removed.add(key)
+
+    def __contains__(self, key):
+        return key in self.updates or (key not in self.removed and key in self.base)
+
+    def __iter__(self):
+        for key in self.base:
+            if key not in self.removed:
+                yield key
+        for key in self.updates:
+            if key not in self.base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class ObservedClassDict(MutableMapping):
+    '''
+    Class dictionary calling a function with the keys of the classes replaced, added or removed through it.
+    The multiclass object wraps its class_dict in it to invalidate the cached statistics of those classes.
+    Other attributes (e.g. resident_bytes of a LazyClassDict) are read from the wrapped dictionary.
+
+    Attributes:
+    - mapping: dictionary or LazyClassDict of each class' dataframe
+    - on_change: function called with the list of changed class keys
+    '''
+    def __init__(self, mapping, on_change):
+        self.mapping = mapping.mapping if isinstance(mapping, ObservedClassDict) else mapping
+        self.on_change = on_change
+
+    def __getitem__(self, key):
+        return self.mapping[key]
+
+    def __setitem__(self, key, df):
+        self.mapping[key] = df
+        self.on_change([key])
+
+    def __delitem__(self, key):
+        del self.mapping[key]
+        self.on_change([key])
+
+    def __contains__(self, key):
+        return key in self.mapping
+
+    def __iter__(self):
+        return iter(self.mapping)
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def __getattr__(self, name):
+        if name in ("mapping", "on_change"):
+            raise AttributeError(name)
+        return getattr(self.mapping, name)
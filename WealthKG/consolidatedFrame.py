@@ -0,0 +1,144 @@
+#Import the libraries needed
+import numpy as np
+import pandas as pd
+
+from . import inequality
+
+
+class ConsolidatedFrame:
+    '''
+    All classes of a multiclass result in one set of arrays. The values of every class are stored
+    one after the other and the offsets mark where each class starts, so per-class statistics are
+    computed in one vectorized pass instead of one Python loop iteration per class.
+
+    Attributes:
+    - keys: list. Class keys in the order of the arrays
+    - offsets: numpy array. Start of every class in the arrays, followed by the total amount of entities
+    - counts: numpy array. Amount of entities of every class
+    - values: dictionary with part as the key and the concatenated numpy array of the part as value
+    '''
+    def __init__(self, keys, offsets, values):
+        self.keys = list(keys)
+        self.offsets = offsets
+        self.counts = np.diff(offsets)
+        self.values = values
+        self.__codes = None
+        self.__sorted = {}
+
+    @classmethod
+    def from_class_dict(cls, class_dict, parts=[], keys=None):
+        '''
+        Builds the consolidated arrays, every class is read once and only the parts are kept
+        Input:
+        -class_dict: dictionary or LazyClassDict of each class' dataframe
+        -parts: list, columns to keep (e.g. ["pCount", "iCount"]). Default empty, only the entity counts.
+        -keys: list, classes to keep and their order, None for the order of class_dict. Default None.
+        Output:
+        -ConsolidatedFrame
+        '''
+        keys = list(class_dict.keys()) if keys is None else list(keys)
+        chunks = {part: [] for part in parts}
+        counts = np.zeros(len(keys), dtype=np.int64)
+        for index, key in enumerate(keys):
+            df = class_dict[key]
+            counts[index] = len(df)
+            for part in parts:
+                chunks[part].append(df[part].to_numpy())
+
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        values = {}
+        for part in parts:
+            values[part] = np.concatenate(chunks[part]) if chunks[part] else np.zeros(0)
+        return cls(keys, offsets, values)
+
+    def codes(self):
+        #Returns the position of the class of every value
+        if self.__codes is None:
+            self.__codes = np.repeat(np.arange(len(self.keys), dtype=np.int32), self.counts)
+        return self.__codes
+
+    def sorted_values(self, part):
+        #Returns the values of a part sorted in ascending order within every class, sorted once and cached
+        if part not in self.__sorted:
+            self.__sorted[part] = inequality.sort_values(self.values[part], self.offsets)
+        return self.__sorted[part]
+
+    def to_frame(self):
+        '''
+        Returns the long format frame
+        Output:
+        -pandas dataframe: one row per entity with a categorical class column and a column per part
+        '''
+        columns = {"class": pd.Categorical.from_codes(self.codes(), categories=self.keys)}
+        columns.update(self.values)
+        return pd.DataFrame(columns)
+
+    def class_statistics(self, part):
+        '''
+        Computes the statistics of every class at once. Skewness and kurtosis match pandas
+        (bias corrected, NaN below 3 and 4 entities), gini and palma are computed on the sorted values.
+        Input:
+        -part: string, the column to calculate the statistics for (pCount, iCount or totalCount)
+        Output:
+        -pandas dataframe: entity_count, skewness, kurtosis, gini and palma, indexed by class
+        '''
+        arr = self.values[part].astype(np.float64)
+        count = self.counts.astype(np.float64)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total = self.__segment_sum(arr)
+            mean = total / count
+            adjusted = arr - np.repeat(mean, self.counts)
+            adjusted2 = adjusted**2
+            m2 = self.__segment_sum(adjusted2)
+            m3 = self.__segment_sum(adjusted2 * adjusted)
+            m4 = self.__segment_sum(adjusted2**2)
+
+            #pandas treats sums below the floating point error of the largest value as zero
+            eps = np.finfo(np.float64).eps
+            max_abs = self.__segment_max(np.abs(arr))
+            m2 = self.__zero_out_fperr(m2, ((eps * max_abs) ** 2) * count)
+            m3 = self.__zero_out_fperr(m3, ((eps * max_abs) ** 3) * count)
+            m4 = self.__zero_out_fperr(m4, ((eps * max_abs) ** 4) * count)
+
+            skewness = (count * (count - 1) ** 0.5 / (count - 2)) * (m3 / m2**1.5)
+            skewness = np.where(m2 == 0, 0, skewness)
+            skewness[count < 3] = np.nan
+
+            adj = 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+            numerator = count * (count + 1) * (count - 1) * m4
+            denominator = (count - 2) * (count - 3) * m2**2
+            kurtosis = np.where(denominator == 0, 0, numerator / denominator - adj)
+            kurtosis[count < 4] = np.nan
+
+            shares = inequality.concentration(self.sorted_values(part), ["gini", "palma"], self.offsets)
+
+        return pd.DataFrame({"entity_count": self.counts, "skewness": skewness, "kurtosis": kurtosis,
+                             "gini": shares["gini"], "palma": shares["palma"]}, index=pd.Index(self.keys, name="class"))
+
+    def concentration(self, part, metrics=None, atkinson_epsilon=0.5):
+        '''
+        Computes concentration metrics of every class at once, see inequality.concentration
+        Input:
+        -part: string, the column to calculate the metrics for (pCount, iCount or totalCount)
+        -metrics: list, metrics from inequality.CONCENTRATION_METRICS, None for all. Default None.
+        -atkinson_epsilon: float, inequality aversion of the atkinson index. Default 0.5.
+        Output:
+        -pandas dataframe: one column per metric, indexed by class
+        '''
+        result = inequality.concentration(self.sorted_values(part), metrics, self.offsets, atkinson_epsilon)
+        return pd.DataFrame(result, index=pd.Index(self.keys, name="class"))
+
+    def __segment_sum(self, arr):
+        return np.bincount(self.codes(), weights=arr, minlength=len(self.keys))
+
+    def __segment_max(self, arr):
+        result = np.zeros(len(self.keys))
+        nonempty = self.counts > 0
+        if nonempty.any():
+            result[nonempty] = np.maximum.reduceat(arr, self.offsets[:-1][nonempty])
+        return result
+
+    def __zero_out_fperr(self, arr, tolerance):
+        return np.where(np.abs(arr) < tolerance, 0, arr)
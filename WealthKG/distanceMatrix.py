@@ -0,0 +1,187 @@
+#Import the libraries needed
+import numpy as np
+from scipy.spatial.distance import cdist, squareform
+from scipy.stats import kstwo
+
+from .frequencyDistribution import FrequencyDistribution
+
+#largest shared support the grid method is used for, above it the classes are merged pair by pair
+MAX_GRID_SIZE = 10000
+#largest amount of cdf values held at once by the grid method
+MAX_GRID_CELLS = 5 * 10**7
+
+
+def class_distributions(class_dict, keys, part):
+    '''
+    Reads every class once and keeps only its sorted distinct values and their multiplicities
+    Input:
+    -class_dict: dictionary or LazyClassDict of each class' dataframe
+    -keys: list, classes in the order of the matrix
+    -part: string, the column (pCount, iCount or totalCount)
+    Output:
+    -list of FrequencyDistribution in the order of keys
+    '''
+    return [FrequencyDistribution.from_values(class_dict[key][part].to_numpy()) for key in keys]
+
+
+def condensed_index(n, i, j):
+    #Position of the pair i < j in a condensed matrix of n classes, the order of scipy's pdist and squareform
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def to_square(condensed, empty=None):
+    #Returns the square matrix of a condensed matrix, with zeros on the diagonal and NaN for the classes in empty
+    square = squareform(condensed, checks=False)
+    if empty is not None:
+        square[np.flatnonzero(empty), np.flatnonzero(empty)] = np.nan
+    return square
+
+
+def emd_matrix(distributions, condensed=False, method="auto", dtype=np.float32, progress=None, on_row=None):
+    '''
+    Exact earth mover's distance between every pair of classes. The distance is symmetric,
+    so only the pairs i < j are computed.
+    - "grid": the cdfs of all classes on the shared support of their values, a pair's distance is the
+      weighted L1 distance between two rows, computed for many pairs at once. Fast when the classes share few distinct values.
+    - "merge": the sorted distinct values of both classes are merged and the area between their cdfs summed, pair by pair.
+    Input:
+    -distributions: list of FrequencyDistribution, see class_distributions
+    -condensed: boolean, True for the condensed upper triangle of scipy's pdist, False for the square matrix. Default False.
+    -method: string, "grid", "merge" or "auto" for grid when the shared support is small enough. Default "auto".
+    -dtype: numpy dtype of the result. Default float32.
+    -progress: function wrapping the loop over the rows (e.g. EventDispatcher.progress). Default None.
+    -on_row: function called with the position of every finished row. Default None.
+    Output:
+    -numpy array: condensed or square distance matrix, NaN for the classes without entities (also on the diagonal)
+    '''
+    result = _pairwise(distributions, "emd", method, dtype, progress, on_row)
+    return result if condensed else to_square(result, empty_classes(distributions))
+
+
+def ks_matrix(distributions, condensed=False, method="auto", transform=None, pvalues=False, dtype=np.float32,
+              progress=None, on_row=None):
+    '''
+    Exact two sample Kolmogorov-Smirnov statistic between every pair of classes, the largest distance between their cdfs.
+    Only the pairs i < j are computed, with the same "grid" (Chebyshev distance between cdf rows) and
+    "merge" methods as emd_matrix.
+    Input:
+    -distributions: list of FrequencyDistribution, see class_distributions
+    -condensed: boolean, True for the condensed upper triangle of scipy's pdist, False for the square matrix. Default False.
+    -method: string, "grid", "merge" or "auto". Default "auto".
+    -transform: function applied to the values of every class once before the comparison (e.g. norm.cdf).
+                Values it maps to the same number become ties. Default None.
+    -pvalues: boolean, True to also return the asymptotic two-sided p-values of ks_2samp, computed for all pairs at once.
+              kstwo.sf is exact for the sample sizes and takes most of the time. Default False.
+    -dtype: numpy dtype of the result. Default float32.
+    -progress: function wrapping the loop over the rows. Default None.
+    -on_row: function called with the position of every finished row. Default None.
+    Output:
+    -numpy array: condensed or square statistic matrix, and the p-value matrix of the same shape if pvalues is True.
+                  NaN for the classes without entities (also on the diagonal)
+    '''
+    if transform is not None:
+        distributions = [distribution.map(transform) for distribution in distributions]
+    statistics = _pairwise(distributions, "ks", method, dtype, progress, on_row)
+    if not pvalues:
+        return statistics if condensed else to_square(statistics, empty_classes(distributions))
+
+    #asymptotic formula of ks_2samp with the effective sample size of every pair
+    sizes = np.array([distribution.n for distribution in distributions], dtype=np.float64)
+    i, j = np.triu_indices(len(sizes), k=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        effective = np.round(sizes[i] * sizes[j] / (sizes[i] + sizes[j]))
+    probabilities = np.clip(kstwo.sf(statistics.astype(np.float64), effective), 0, 1).astype(dtype)
+    if condensed:
+        return statistics, probabilities
+    empty = empty_classes(distributions)
+    probabilities = to_square(probabilities)
+    np.fill_diagonal(probabilities, 1)
+    probabilities[np.flatnonzero(empty), np.flatnonzero(empty)] = np.nan
+    return to_square(statistics, empty), probabilities
+
+
+def _pairwise(distributions, distance, method, dtype, progress, on_row):
+    #Helper function computing the condensed upper triangle of a distance between cdfs
+    n = len(distributions)
+    result = np.zeros(n * (n - 1) // 2, dtype=dtype)
+    rows = range(n) if progress is None else progress(range(n))
+
+    support = np.unique(np.concatenate([d.values for d in distributions])) if n > 0 else np.zeros(0)
+    if method == "auto":
+        method = "grid" if len(support) <= MAX_GRID_SIZE and n * len(support) <= MAX_GRID_CELLS else "merge"
+
+    if method == "grid":
+        #the cdf of a class is constant between two support values, so the area between two cdfs is
+        #a weighted L1 distance between two rows and their largest gap a Chebyshev distance
+        cdfs = np.empty((n, max(len(support) - 1, 0)), dtype=np.float64)
+        if distance == "emd":
+            widths = np.diff(support.astype(np.float64))
+        for index, distribution in enumerate(distributions):
+            cdfs[index] = distribution.cdf(support[:-1])
+            if distance == "emd":
+                cdfs[index] *= widths
+        metric = "cityblock" if distance == "emd" else "chebyshev"
+        for i in rows:
+            if i + 1 < n:
+                start = condensed_index(n, i, i + 1)
+                result[start:start + n - i - 1] = cdist(cdfs[i:i + 1], cdfs[i + 1:], metric)[0] if cdfs.shape[1] else 0
+            if on_row is not None:
+                on_row(i)
+    elif method == "merge":
+        kernel = emd_pair if distance == "emd" else ks_pair
+        cdfs = sorted_cdfs(distributions)
+        for i in rows:
+            for j in range(i + 1, n):
+                result[condensed_index(n, i, j)] = kernel(cdfs[i], cdfs[j])
+            if on_row is not None:
+                on_row(i)
+    else:
+        raise Exception("Unknown distance method {}".format(method))
+    mask_empty(result, empty_classes(distributions))
+    return result
+
+
+def empty_classes(distributions):
+    #True for the distributions without entities
+    return np.array([distribution.n == 0 for distribution in distributions], dtype=bool)
+
+
+def mask_empty(condensed, empty):
+    '''
+    Sets the distances of the classes without entities to NaN, in place
+    Input:
+    -condensed: numpy array, condensed matrix
+    -empty: boolean numpy array, True for every class without entities
+    '''
+    n = len(empty)
+    for index in np.flatnonzero(empty):
+        condensed[condensed_index(n, index, np.arange(index + 1, n))] = np.nan
+        condensed[condensed_index(n, np.arange(index), index)] = np.nan
+
+
+def sorted_cdfs(distributions):
+    #Returns the sorted distinct values and the cdf after each of them (starting with 0) of every distribution
+    return [(d.values.astype(np.float64), np.concatenate([[0], np.cumsum(d.counts) / d.n])) for d in distributions]
+
+
+def emd_pair(u, v):
+    #Exact earth mover's distance of two sorted_cdfs entries, the area between their cdfs
+    support, u_at, v_at = _merged_cdfs(u, v)
+    return float(np.abs(u_at[:-1] - v_at[:-1]) @ np.diff(support))
+
+
+def ks_pair(u, v):
+    #Exact KS statistic of two sorted_cdfs entries, the largest distance between their cdfs
+    support, u_at, v_at = _merged_cdfs(u, v)
+    return float(np.max(np.abs(u_at - v_at))) if len(support) else np.nan
+
+
+def _merged_cdfs(u, v):
+    #Helper function for the cdfs of two sorted distinct value arrays on their merged support
+    u_values, u_cdf = u
+    v_values, v_cdf = v
+    support = np.union1d(u_values, v_values)
+    u_at = u_cdf[np.searchsorted(u_values, support, side="right")]
+    v_at = v_cdf[np.searchsorted(v_values, support, side="right")]
+    return support, u_at, v_at
+
@@ -0,0 +1,59 @@
+#Import the libraries needed
+from tqdm import tqdm
+
+
+class EventDispatcher:
+    '''
+    Progress and event callbacks for WealthKG and the result objects, replacing the hardwired tqdm bars.
+    Callbacks are called with one dictionary per event, holding the "event" and "stage" keys and the event fields:
+    - batch_started: batch, size
+    - batch_finished: batch, rows, retries
+    - class_finished: class, rows, index, total (also emitted per class by read_csv_folder, get_all_pareto and the distance matrices)
+    - retry: class, batch, attempt, error
+    - bytes_received: class, batch, bytes
+    - tile_finished: tile, index, total (emitted by save_distance_matrix)
+    - refresh_finished: changed, classes, unprobed (emitted by refresh)
+
+    Attributes:
+    - quiet: boolean. True to disable the tqdm progress bars, the callbacks are still called
+    - callbacks: dictionary with event name as the key and list of functions as value
+    '''
+    EVENTS = ["batch_started", "batch_finished", "class_finished", "retry", "bytes_received", "tile_finished", "refresh_finished"]
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+        self.callbacks = {event: [] for event in self.EVENTS}
+
+    def on(self, event, callback):
+        '''
+        Registers a callback
+        Input:
+        -event: string, one of EVENTS or "*" for every event
+        -callback: function called with the event dictionary
+        '''
+        events = self.EVENTS if event == "*" else [event]
+        for e in events:
+            if e not in self.callbacks:
+                raise Exception("Unknown event {}".format(e))
+            self.callbacks[e].append(callback)
+
+    def emit(self, event, stage, **fields):
+        #Calls the callbacks of an event, does nothing without callbacks
+        callbacks = self.callbacks[event]
+        if callbacks:
+            payload = {"event": event, "stage": stage, **fields}
+            for callback in callbacks:
+                callback(payload)
+
+    def progress(self, iterable, total=None):
+        '''
+        Wraps a loop in a tqdm bar unless quiet
+        Input:
+        -iterable: iterable to loop over
+        -total: int, length of the iterable if it has no len. Default None.
+        Output:
+        -iterable
+        '''
+        if self.quiet:
+            return iterable
+        return tqdm(iterable, total=total)
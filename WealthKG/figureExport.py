@@ -0,0 +1,78 @@
+#Import the libraries needed
+import os
+import re
+
+import kaleido
+
+#the FigureExporter that started kaleido's sync server, None when no exporter holds it open
+_server_owner = None
+
+
+class FigureExporter:
+    '''
+    Static export of many plotly figures through kaleido. Kaleido renders with a headless Chrome whose startup
+    costs far more than one figure, so all figures of an export are rendered by one browser with workers tabs
+    working in parallel. Used as a context manager the browser is kept open and reused by every export inside it.
+
+    Attributes:
+    - workers: int. Amount of figures rendered at the same time
+    - format: string. "png", "svg", "jpeg", "webp" or "pdf"
+    - width, height, scale: layout options of every image, None for the size of the figure
+    '''
+    def __init__(self, workers=4, format="png", width=None, height=None, scale=None):
+        self.workers = workers
+        self.format = format
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.__started = False
+
+    def __enter__(self):
+        #the browser of an outer FigureExporter is reused and left open
+        global _server_owner
+        if _server_owner is None:
+            kaleido.start_sync_server(n=self.workers, silence_warnings=True)
+            _server_owner = self
+            self.__started = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _server_owner
+        if self.__started:
+            self.__started = False
+            _server_owner = None
+            kaleido.stop_sync_server(silence_warnings=True)
+
+    def export(self, figures, location):
+        '''
+        Renders figures into a folder
+        Input:
+        -figures: iterable of (name, figure) pairs, a generator builds every figure only when it is rendered
+        -location: string, folder of the images. Created if it does not exist
+        Output:
+        -list of the paths written, in the order of figures
+        '''
+        os.makedirs(location, exist_ok=True)
+        paths = []
+        opts = {key: value for key, value in [("format", self.format), ("width", self.width),
+                                             ("height", self.height), ("scale", self.scale)] if value is not None}
+
+        def figure_dicts():
+            for name, fig in figures:
+                path = os.path.join(location, "{}.{}".format(file_name(name), self.format))
+                paths.append(path)
+                yield {"fig": fig, "path": path, "opts": opts}
+
+        if _server_owner is not None:
+            errors = kaleido.write_fig_from_object_sync(figure_dicts())
+        else:
+            errors = kaleido.write_fig_from_object_sync(figure_dicts(), kopts={"n": self.workers})
+        if errors:
+            raise Exception("{} figures could not be exported, first error: {!r}".format(len(errors), errors[0]))
+        print("Saved to {}".format(location))
+        return paths
+
+
+def file_name(name):
+    #Returns a name that is safe as a file name, characters other than letters, digits, "-" and "." become "_"
+    return re.sub(r"[^\w.-]", "_", str(name))
@@ -0,0 +1,294 @@
+#Import the libraries needed
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy.stats import wasserstein_distance
+
+from .inequality import CONCENTRATION_METRICS
+
+
+class FrequencyDistribution:
+    '''
+    Distribution of a count column stored as its distinct values and how many entities have each value.
+    Property counts repeat heavily, so millions of entities are held in a few hundred pairs and every measure
+    is computed in O(distinct values). The results are the same as the ones of the expanded values.
+
+    Attributes:
+    - values: numpy array. Distinct values in ascending order
+    - counts: numpy array. Amount of entities with each value
+    - n: int. Amount of entities
+    '''
+    def __init__(self, values, counts):
+        self.values = np.asarray(values)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.n = int(self.counts.sum())
+        self.__cumulative_counts = np.concatenate([[0], np.cumsum(self.counts)])
+        self.__cumulative_total = np.concatenate([[0], np.cumsum(self.values * self.counts.astype(np.float64))])
+
+    @classmethod
+    def from_values(cls, values):
+        '''
+        Builds the distribution of a column
+        Input:
+        -values: numpy array or pandas series
+        Output:
+        -FrequencyDistribution
+        '''
+        values = np.asarray(values)
+        if values.dtype.kind in "iu" and len(values) > 0 and values.min() >= 0 and values.max() <= 4 * len(values) + 1024:
+            counts = np.bincount(values)
+            distinct = np.flatnonzero(counts)
+            return cls(distinct.astype(values.dtype), counts[distinct])
+        distinct, counts = np.unique(values, return_counts=True)
+        return cls(distinct, counts)
+
+    @classmethod
+    def from_dict(cls, frequencies):
+        #Builds the distribution from a dictionary with value as the key and amount of entities as value
+        values = np.array(sorted(frequencies))
+        return cls(values, [frequencies[value] for value in values])
+
+    def to_dict(self):
+        #Returns a dictionary with value as the key and amount of entities as value
+        return dict(zip(self.values.tolist(), self.counts.tolist()))
+
+    def to_values(self):
+        #Returns the expanded values in ascending order
+        return np.repeat(self.values, self.counts)
+
+    def to_frame(self, part="value"):
+        #Returns a dataframe with one row per distinct value and its amount of entities
+        return pd.DataFrame({part: self.values, "entities": self.counts})
+
+    @property
+    def total(self):
+        return float(self.__cumulative_total[-1])
+
+    def mean(self):
+        return self.total / self.n if self.n > 0 else np.nan
+
+    def var(self):
+        #Sample variance, the same as pandas
+        if self.n < 2:
+            return np.nan
+        return float(self.counts @ (self.values - self.mean()) ** 2) / (self.n - 1)
+
+    def skew(self):
+        #Bias corrected skewness, the same as pandas
+        n = self.n
+        if n < 3:
+            return np.nan
+        m2, m3, _ = self.__central_sums()
+        if m2 == 0:
+            return 0.0
+        return (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2**1.5)
+
+    def kurtosis(self):
+        #Bias corrected excess kurtosis, the same as pandas
+        n = self.n
+        if n < 4:
+            return np.nan
+        m2, _, m4 = self.__central_sums()
+        denominator = (n - 2) * (n - 3) * m2**2
+        if denominator == 0:
+            return 0.0
+        return n * (n + 1) * (n - 1) * m4 / denominator - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+
+    def quantile(self, q):
+        '''
+        Quantile with linear interpolation, the same as numpy and pandas
+        Input:
+        -q: float or list of floats between 0 and 1
+        Output:
+        -float or numpy array
+        '''
+        position = np.asarray(q, dtype=np.float64) * (self.n - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, self.n - 1)
+        lower_value = self.__value_at(lower)
+        result = lower_value + (position - lower) * (self.__value_at(upper) - lower_value)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def gini(self):
+        #Gini coefficient, the same as the one of the expanded values sorted in ascending order
+        n = self.n
+        start = self.__cumulative_counts[:-1].astype(np.float64)
+        counts = self.counts.astype(np.float64)
+        #sum of rank * value, each value covers the ranks start + 1 to start + count
+        weighted_sum = float(self.values @ (counts * start + counts * (counts + 1) / 2))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return float(2 / n * weighted_sum / np.float64(self.total) - (n + 1) / n) if n > 0 else np.nan
+
+    def lorenz(self):
+        '''
+        Lorenz curve at the end of every distinct value, the curve is a straight line in between
+        Output:
+        -population, share: numpy arrays, share of the entities and share of the total they hold, starting at 0
+        '''
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.__cumulative_counts / self.n, self.__cumulative_total / self.total
+
+    def lorenz_share(self, q):
+        #Share of the total held by the poorest q of the entities, linearly interpolated like the expanded lorenz curve
+        position = q * self.n
+        lower = int(np.floor(position))
+        upper = min(lower + 1, self.n)
+        total = np.float64(self.total)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lower_share = self.__wealth_below(lower) / total
+            upper_share = self.__wealth_below(upper) / total
+        return lower_share + (position - lower) * (upper_share - lower_share)
+
+    def top_share(self, k):
+        #Share of the total held by the richest k of the entities
+        return 1 - self.lorenz_share(1 - k)
+
+    def palma(self):
+        #Palma ratio, share of the richest 10% divided by the share of the poorest 40%
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.top_share(0.1) / self.lorenz_share(0.4)
+
+    def pareto_point(self, share=0.8):
+        #Share of the richest entities holding share of the total, interpolated between ranks like the expanded values
+        if self.n == 0 or not self.total > 0:
+            return np.nan
+        target = (1 - share) * self.total
+        #the poorest entities holding target fill the distinct values below group and part of group
+        group = int(np.searchsorted(self.__cumulative_total, target, side="left")) - 1
+        poorest = self.__cumulative_counts[group] + (target - self.__cumulative_total[group]) / float(self.values[group])
+        return 1 - poorest / self.n
+
+    def concentration(self, metrics=None, atkinson_epsilon=0.5):
+        '''
+        Computes several concentration metrics, the same as inequality.concentration of the expanded values
+        Input:
+        -metrics: list, metrics to compute from CONCENTRATION_METRICS, None for all. Default None.
+        -atkinson_epsilon: float, inequality aversion of the atkinson index. Default 0.5.
+        Output:
+        -dictionary with metric as the key and a float as value
+        '''
+        metrics = CONCENTRATION_METRICS if metrics is None else metrics
+        for metric in metrics:
+            if metric not in CONCENTRATION_METRICS:
+                raise Exception("Unknown concentration metric {}".format(metric))
+        if self.n == 0:
+            return {metric: np.nan for metric in metrics}
+        values = self.values.astype(np.float64)
+        counts = self.counts.astype(np.float64)
+        mean = np.float64(self.mean())
+        result = {}
+        for metric in metrics:
+            with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+                if metric == "gini":
+                    result[metric] = self.gini()
+                elif metric == "palma":
+                    result[metric] = self.palma()
+                elif metric == "top_1_share":
+                    result[metric] = self.top_share(0.01)
+                elif metric == "top_10_share":
+                    result[metric] = self.top_share(0.1)
+                elif metric == "pareto_point":
+                    result[metric] = self.pareto_point()
+                elif metric == "theil":
+                    #x ln x is 0 for entities without any count
+                    x_log_x = np.where(values > 0, values * np.log(np.where(values > 0, values, 1)), 0)
+                    result[metric] = float(counts @ x_log_x) / np.float64(self.total) - np.log(mean)
+                elif metric == "atkinson":
+                    if atkinson_epsilon == 1:
+                        equally_distributed = np.exp(float(counts @ np.log(values)) / self.n)
+                    else:
+                        equally_distributed = (float(counts @ values ** (1 - atkinson_epsilon)) / self.n) ** (1 / (1 - atkinson_epsilon))
+                    result[metric] = 1 - equally_distributed / mean
+                elif metric == "hoover":
+                    result[metric] = 0.5 * float(counts @ np.abs(values - mean)) / np.float64(self.total)
+                else:
+                    result[metric] = float(counts @ values**2) / np.float64(self.total)**2
+            result[metric] = float(result[metric])
+        return result
+
+    def mode(self):
+        #Smallest of the most frequent values
+        return self.values[np.argmax(self.counts)] if self.n > 0 else np.nan
+
+    def emd(self, other):
+        #Earth mover's distance to another distribution, the same as wasserstein_distance of the expanded values
+        return wasserstein_distance(self.values, other.values, self.counts, other.counts)
+
+    def ks(self, other, transform=None):
+        '''
+        Two sample Kolmogorov-Smirnov statistic, the largest distance between the two empirical CDFs
+        Input:
+        -other: FrequencyDistribution
+        -transform: function applied to the values first (e.g. norm.cdf), values it maps to the same number are merged. Default None.
+        Output:
+        -float
+        '''
+        u = self.map(transform) if transform is not None else self
+        v = other.map(transform) if transform is not None else other
+        support = np.union1d(u.values, v.values)
+        return float(np.max(np.abs(u.cdf(support) - v.cdf(support)))) if len(support) else np.nan
+
+    def cdf(self, x):
+        #Share of the entities with a value lower or equal to x, NaN without entities
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.__cumulative_counts[np.searchsorted(self.values, x, side="right")] / self.n
+
+    def map(self, function):
+        '''
+        Applies a non decreasing function to the values, values mapped to the same number are merged
+        Input:
+        -function: function on numpy arrays
+        Output:
+        -FrequencyDistribution
+        '''
+        mapped = np.asarray(function(self.values))
+        distinct, inverse = np.unique(mapped, return_inverse=True)
+        return FrequencyDistribution(distinct, np.bincount(inverse, weights=self.counts).astype(np.int64))
+
+    def __central_sums(self):
+        deviation = self.values - self.mean()
+        return (float(self.counts @ deviation**2), float(self.counts @ deviation**3), float(self.counts @ deviation**4))
+
+    def __value_at(self, rank):
+        #value at a 0-based position of the expanded values
+        return self.values[np.searchsorted(self.__cumulative_counts, rank, side="right") - 1]
+
+    def __wealth_below(self, rank):
+        #sum of the rank smallest expanded values
+        group = np.searchsorted(self.__cumulative_counts, rank, side="right") - 1
+        if group >= len(self.values):
+            return self.total
+        return self.__cumulative_total[group] + (rank - self.__cumulative_counts[group]) * float(self.values[group])
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return "FrequencyDistribution(n={}, distinct={})".format(self.n, len(self.values))
+
+
+class ExpandedClassDict(Mapping):
+    '''
+    Read-only class dictionary built from frequency distributions. The dataframe of a class is expanded from its
+    distribution every time it is accessed and not kept, so only the distributions are held in memory.
+
+    Attributes:
+    - distributions: dictionary with class key as the key and FrequencyDistribution as value
+    - part: string. Column of the expanded dataframes (pCount, iCount or totalCount)
+    '''
+    def __init__(self, distributions, part):
+        self.distributions = distributions
+        self.part = part
+
+    def __getitem__(self, key):
+        return pd.DataFrame({self.part: self.distributions[key].to_values()})
+
+    def __contains__(self, key):
+        return key in self.distributions
+
+    def __iter__(self):
+        return iter(self.distributions)
+
+    def __len__(self):
+        return len(self.distributions)
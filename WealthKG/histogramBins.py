@@ -0,0 +1,88 @@
+#Import the libraries needed
+import numpy as np
+import plotly.graph_objects as go
+
+
+def histogram_edges(ranges, bins=50, scale="linear", width=None, integer=True):
+    '''
+    Builds bin edges shared by several arrays
+    Input:
+    -ranges: list of (minimum, maximum) of every array, see value_range. None for an empty array
+    -bins: int, largest amount of bins. Default 50.
+    -scale: string, "linear" for bins of the same width, "log" for bins growing geometrically. Default "linear".
+    -width: number, width of the linear bins instead of bins. Default None.
+    -integer: boolean, True when the values are integers, the edges are then whole numbers. Default True.
+    Output:
+    -numpy array: ascending edges, a value v is in bin i when edges[i] <= v < edges[i + 1] (the last bin also holds its right edge)
+    '''
+    ranges = [r for r in ranges if r is not None]
+    if not ranges:
+        return np.array([0, 1])
+    low = min(minimum for minimum, _ in ranges)
+    high = max(maximum for _, maximum in ranges)
+
+    if scale == "log":
+        if low < 0:
+            raise Exception("Log bins need values of at least 0")
+        if integer:
+            #bins [0, 1), [1, 2), ... until the growth of the geometric edges is larger than 1
+            edges = np.unique(np.floor(np.geomspace(1, high + 1, bins)).astype(np.int64))
+            return np.concatenate([[0], edges])
+        #the geometric edges start at the smallest positive minimum, or at 1, with one more bin from 0 below them
+        positive = min((minimum for minimum, _ in ranges if minimum > 0), default=1)
+        positive = min(positive, high) if high > 0 else 1
+        edges = np.geomspace(positive, max(high, positive) * (1 + 1e-9), bins)
+        return np.concatenate([[0], edges]) if low < positive else edges
+    elif scale == "linear":
+        if integer:
+            width = width if width is not None else max(1, int(np.ceil((high - low + 1) / bins)))
+            return int(low) + int(width) * np.arange(int(np.ceil((high - low + 1) / width)) + 1, dtype=np.int64)
+        if width is not None:
+            return low + width * np.arange(int(np.floor((high - low) / width)) + 2)
+        return np.linspace(low, high, bins + 1) if high > low else np.array([low - 0.5, low + 0.5])
+    raise Exception("Unknown bin scale {}".format(scale))
+
+
+def value_range(values):
+    #Returns (minimum, maximum) of an array, None when it is empty
+    values = np.asarray(values)
+    return (values.min(), values.max()) if len(values) else None
+
+
+def bin_counts(values, edges, weights=None):
+    #Amount of values in every bin of histogram_edges, every value counted weights times when given
+    counts = np.histogram(np.asarray(values), edges, weights=weights)[0]
+    return counts if weights is None else counts.astype(np.int64)
+
+
+def histogram_trace(values, edges, scale="linear", name=None, weights=None):
+    '''
+    Bins an array with NumPy and returns the histogram as a bar trace, the figure holds one value per bin
+    Input:
+    -values: numpy array or pandas series
+    -edges: numpy array, see histogram_edges
+    -scale: string, "linear" for bars placed on a numeric x axis, "log" for one bar per bin named after its range,
+            so bins of very different widths are drawn side by side. Default "linear".
+    -name: string, name of the trace. Default None.
+    -weights: numpy array, amount of entities with each value (e.g. FrequencyDistribution.counts), None for one each. Default None.
+    Output:
+    -plotly bar trace
+    '''
+    counts = bin_counts(values, edges, weights)
+    left, right = edges[:-1], edges[1:]
+    hover = "[%{customdata[0]}, %{customdata[1]}): %{y}<extra></extra>"
+    if scale == "log":
+        return go.Bar(x=bin_labels(edges), y=counts, name=name, customdata=np.stack([left, right], axis=1), hovertemplate=hover)
+    return go.Bar(x=(left + right) / 2, y=counts, width=right - left, name=name,
+                  customdata=np.stack([left, right], axis=1), hovertemplate=hover)
+
+
+def bin_labels(edges):
+    #Names every bin after its range, whole number bins after the first and last number they hold (e.g. "4-7")
+    labels = []
+    for left, right in zip(edges[:-1], edges[1:]):
+        if edges.dtype.kind in "iu":
+            labels.append(str(int(left)) if right - left == 1 else "{}-{}".format(int(left), int(right) - 1))
+        else:
+            labels.append("{:.3g}-{:.3g}".format(left, right))
+    return labels
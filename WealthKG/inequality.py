@@ -0,0 +1,273 @@
+'''
+Inequality measures shared by the single class and multiclass objects.
+Every function takes values sorted in ascending order, either one class or several classes stored
+one after the other with offsets marking where each class starts (see ConsolidatedFrame).
+Without offsets a function returns one float, with offsets a numpy array with one value per class.
+Integer and float32 values are accumulated in float64 without converting the input array.
+'''
+
+#Import the libraries needed
+import functools
+
+import numpy as np
+
+CONCENTRATION_METRICS = ["gini", "palma", "top_1_share", "top_10_share", "pareto_point",
+                         "theil", "atkinson", "hoover", "herfindahl"]
+
+
+def sort_values(values, offsets=None):
+    '''
+    Sorts the values of every class in ascending order
+    Input:
+    -values: numpy array or pandas series
+    -offsets: numpy array, start of every class followed by the length of values. None for one class. Default None.
+    Output:
+    -numpy array: sorted values with the dtype of the input
+    '''
+    values = np.asarray(values)
+    if offsets is None:
+        if len(values) < 2 or np.all(values[:-1] <= values[1:]):
+            return values
+        return np.sort(values)
+    order = np.lexsort((values, segment_codes(offsets)))
+    return values[order]
+
+
+def segment_codes(offsets):
+    #Returns the position of the class of every value
+    counts = np.diff(offsets)
+    return np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+
+
+class SortedSegments:
+    '''
+    Sorted values of one or more classes with the per-class sums every measure is built from.
+    Each sum is computed the first time a measure needs it and then reused, so computing
+    several measures goes over the values once per sum instead of once per measure.
+
+    Attributes:
+    - values: numpy array. Values sorted in ascending order within every class
+    - offsets: numpy array. Start of every class followed by the length of values
+    - single: boolean. True when the values are one class given without offsets
+    '''
+    def __init__(self, sorted_values, offsets=None):
+        self.values = np.asarray(sorted_values)
+        self.single = offsets is None
+        self.offsets = np.array([0, len(self.values)], dtype=np.int64) if offsets is None else offsets
+
+    @functools.cached_property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @functools.cached_property
+    def codes(self):
+        return segment_codes(self.offsets)
+
+    @functools.cached_property
+    def cumulative(self):
+        #running total of all values with a leading 0, the total of a class is the difference at its offsets
+        return np.concatenate([[0], np.cumsum(self.values, dtype=np.float64)])
+
+    @functools.cached_property
+    def total(self):
+        return self.cumulative[self.offsets[1:]] - self.cumulative[self.offsets[:-1]]
+
+    @functools.cached_property
+    def mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.total / self.counts
+
+    def segment_sum(self, weights):
+        #Sums an array with one value per entity within every class
+        return np.bincount(self.codes, weights=weights, minlength=len(self.counts))
+
+    def result(self, result):
+        #Returns a float for one class given without offsets
+        return float(result[0]) if self.single else result
+
+
+def gini(sorted_values, offsets=None):
+    '''
+    Gini coefficient, 0 when every entity has the same count and close to 1 when one entity has everything
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -offsets: numpy array, start of every class. None for one class. Default None.
+    Output:
+    -float or numpy array: gini coefficient, NaN for empty classes and classes without any count
+    '''
+    segments = SortedSegments(sorted_values, offsets)
+    return segments.result(_gini(segments))
+
+
+def lorenz(sorted_values):
+    '''
+    Lorenz curve of one class, the share of the total held by the poorest entities
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    Output:
+    -numpy array: len(sorted_values) + 1 shares between 0 and 1, starting at 0
+    '''
+    cumulative = np.cumsum(sorted_values, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.concatenate([[0], cumulative / cumulative[-1]]) if len(cumulative) else np.zeros(1)
+
+
+def lorenz_share(sorted_values, q, offsets=None):
+    '''
+    Share of the total held by the poorest q of the entities, linearly interpolated on the lorenz curve
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -q: float, fraction of the entities between 0 and 1
+    -offsets: numpy array, start of every class. None for one class. Default None.
+    Output:
+    -float or numpy array: share between 0 and 1
+    '''
+    segments = SortedSegments(sorted_values, offsets)
+    return segments.result(_lorenz_share(segments, q))
+
+
+def top_share(sorted_values, k, offsets=None):
+    '''
+    Share of the total held by the richest k of the entities
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -k: float, fraction of the entities between 0 and 1 (e.g. 0.1 for the top 10%)
+    -offsets: numpy array, start of every class. None for one class. Default None.
+    Output:
+    -float or numpy array: share between 0 and 1
+    '''
+    segments = SortedSegments(sorted_values, offsets)
+    return segments.result(1 - _lorenz_share(segments, 1 - k))
+
+
+def palma(sorted_values, offsets=None):
+    '''
+    Palma ratio, share of the richest 10% divided by the share of the poorest 40%
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -offsets: numpy array, start of every class. None for one class. Default None.
+    Output:
+    -float or numpy array: palma ratio
+    '''
+    segments = SortedSegments(sorted_values, offsets)
+    return segments.result(_palma(segments))
+
+
+def concentration(sorted_values, metrics=None, offsets=None, atkinson_epsilon=0.5):
+    '''
+    Computes several concentration metrics at once, sharing the sums they are built from
+    - gini, palma: see gini and palma
+    - top_1_share, top_10_share: share of the total held by the richest 1% and 10% of the entities
+    - pareto_point: share of the richest entities holding 80% of the total, 0.2 for an exact 80/20 rule
+    - theil: Theil T index, 0 for perfect equality and ln(n) when one entity has everything
+    - atkinson: Atkinson index with the inequality aversion atkinson_epsilon, between 0 and 1
+    - hoover: Hoover index, share of the total that has to be moved to reach perfect equality
+    - herfindahl: Herfindahl-Hirschman index, sum of the squared shares of the entities
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -metrics: list, metrics to compute from CONCENTRATION_METRICS, None for all. Default None.
+    -offsets: numpy array, start of every class. None for one class. Default None.
+    -atkinson_epsilon: float, inequality aversion of the atkinson index. Default 0.5.
+    Output:
+    -dictionary with metric as the key and a float or numpy array as value
+    '''
+    metrics = CONCENTRATION_METRICS if metrics is None else metrics
+    segments = SortedSegments(sorted_values, offsets)
+    result = {}
+    for metric in metrics:
+        if metric not in CONCENTRATION_METRICS:
+            raise Exception("Unknown concentration metric {}".format(metric))
+        if metric == "atkinson":
+            value = _atkinson(segments, atkinson_epsilon)
+        else:
+            value = _METRIC_FUNCTIONS[metric](segments)
+        result[metric] = segments.result(value)
+    return result
+
+
+def _gini(segments):
+    count = segments.counts.astype(np.float64)
+    #rank of every value within its class, starting at 1
+    ranks = np.arange(1, len(segments.values) + 1, dtype=np.float64) - np.repeat(segments.offsets[:-1], segments.counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted_sum = segments.segment_sum(ranks * segments.values)
+        return 2 / count * weighted_sum / segments.total - (count + 1) / count
+
+
+def _lorenz_share(segments, q):
+    counts = segments.counts
+    starts = segments.offsets[:-1]
+    before = segments.cumulative[starts]
+
+    position = q * counts
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, counts)
+    fraction = position - lower
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lower_share = (segments.cumulative[starts + lower] - before) / segments.total
+        upper_share = (segments.cumulative[starts + upper] - before) / segments.total
+        result = lower_share + fraction * (upper_share - lower_share)
+    result[counts == 0] = np.nan
+    return result
+
+
+def _palma(segments):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (1 - _lorenz_share(segments, 0.9)) / _lorenz_share(segments, 0.4)
+
+
+def _pareto_point(segments, share=0.8):
+    #inverse of the lorenz curve: the poorest entities holding 1 - share of the total, interpolated between ranks
+    starts = segments.offsets[:-1]
+    target = segments.cumulative[starts] + (1 - share) * segments.total
+    position = np.searchsorted(segments.cumulative, target, side="left")
+    position = np.clip(position, starts + 1, segments.offsets[1:])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        below = segments.cumulative[position - 1]
+        fraction = (target - below) / (segments.cumulative[position] - below)
+        poorest = (position - 1 - starts + fraction) / segments.counts
+    result = 1 - poorest
+    result[(segments.counts == 0) | ~(segments.total > 0)] = np.nan
+    return result
+
+
+def _theil(segments):
+    values = segments.values.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        #x ln x is 0 for entities without any count
+        x_log_x = np.where(values > 0, values * np.log(np.where(values > 0, values, 1)), 0)
+        return segments.segment_sum(x_log_x) / segments.total - np.log(segments.mean)
+
+
+def _atkinson(segments, epsilon):
+    values = segments.values.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        if epsilon == 1:
+            equally_distributed = np.exp(segments.segment_sum(np.log(values)) / segments.counts)
+        else:
+            equally_distributed = (segments.segment_sum(values ** (1 - epsilon)) / segments.counts) ** (1 / (1 - epsilon))
+        return 1 - equally_distributed / segments.mean
+
+
+def _hoover(segments):
+    deviation = np.abs(segments.values - np.repeat(segments.mean, segments.counts))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 0.5 * segments.segment_sum(deviation) / segments.total
+
+
+def _herfindahl(segments):
+    values = segments.values.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return segments.segment_sum(values**2) / segments.total**2
+
+
+_METRIC_FUNCTIONS = {
+    "gini": _gini,
+    "palma": _palma,
+    "top_1_share": lambda segments: 1 - _lorenz_share(segments, 0.99),
+    "top_10_share": lambda segments: 1 - _lorenz_share(segments, 0.9),
+    "pareto_point": _pareto_point,
+    "theil": _theil,
+    "hoover": _hoover,
+    "herfindahl": _herfindahl,
+}
@@ -0,0 +1,122 @@
+#Import the libraries needed
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+
+class Instrumentation:
+    '''
+    Opt-in recorder for stage level timings of WealthKG and the result objects.
+    Pass the same object to WealthKG and it is handed on to every result object it creates.
+
+    Every finished stage produces one record with the columns:
+    stage, class, batch, start, seconds, bytes_in, bytes_out, rows, retries, peak_memory.
+    Stages used by the framework are "query_build", "http_wait", "decode", "merge", "sort", "class", "batch",
+    "statistics" and "figure_build". "class" and "batch" enclose the other crawling stages.
+
+    Attributes:
+    - records: list of dict. Records of the finished stages
+    - callbacks: list of functions. Each one is called with every record when its stage finishes
+    - trace_memory: boolean. True to record the tracemalloc peak memory of every stage
+    '''
+    COLUMNS = ["stage", "class", "batch", "start", "seconds", "bytes_in", "bytes_out", "rows", "retries", "peak_memory"]
+
+    def __init__(self, callbacks=None, trace_memory=False):
+        self.records = []
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.trace_memory = trace_memory
+        self.__origin = time.perf_counter()
+        self.__open_peaks = []
+
+    def add_callback(self, callback):
+        #Adds a function that is called with every record
+        self.callbacks.append(callback)
+
+    def reset(self):
+        #Removes all records
+        self.records = []
+        self.__origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, stage, class_key=None, batch=None):
+        '''
+        Context manager measuring one stage. The yielded record can be filled with
+        bytes_in, bytes_out, rows and retries by the measured code.
+        Input:
+        -stage: string, name of the stage
+        -class_key: string, class the stage belongs to. Default None.
+        -batch: int, batch the stage belongs to. Default None.
+        '''
+        record = {"stage": stage, "class": class_key, "batch": batch, "bytes_in": 0, "bytes_out": 0, "rows": None, "retries": 0}
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            #resetting the peak hides it from the enclosing stage, so it is carried on the stack of open stages
+            if self.__open_peaks:
+                self.__open_peaks[-1] = max(self.__open_peaks[-1], tracemalloc.get_traced_memory()[1])
+            self.__open_peaks.append(0)
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["start"] = start - self.__origin
+            record["peak_memory"] = None
+            if self.trace_memory:
+                peak = max(self.__open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record["peak_memory"] = peak
+                if self.__open_peaks:
+                    self.__open_peaks[-1] = max(self.__open_peaks[-1], peak)
+
+            self.records.append(record)
+            for callback in self.callbacks:
+                callback(record)
+
+    def to_dataframe(self):
+        '''
+        Returns the records
+        Output:
+        -pandas dataframe: one row per finished stage
+        '''
+        return pd.DataFrame(self.records, columns=self.COLUMNS)
+
+    def summary(self):
+        '''
+        Returns the records aggregated per stage
+        Output:
+        -pandas dataframe: count, total seconds, bytes, rows, retries and max peak memory per stage
+        '''
+        df = self.to_dataframe()
+        return df.groupby("stage").agg(count=("seconds", "size"), seconds=("seconds", "sum"),
+                                       bytes_in=("bytes_in", "sum"), bytes_out=("bytes_out", "sum"),
+                                       rows=("rows", "sum"), retries=("retries", "sum"),
+                                       peak_memory=("peak_memory", "max")).sort_values(by="seconds", ascending=False)
+
+
+def instrument(instrumentation, stage, class_key=None, batch=None):
+    #Helper function returning the stage context of an instrumentation, or an unmeasured record if it is None
+    if instrumentation is None:
+        return nullcontext({})
+    return instrumentation.stage(stage, class_key, batch)
+
+
+def measured(stage):
+    '''
+    Decorator for methods of the result objects, measures the method as one stage
+    of the instrumentation attribute of the object
+    Input:
+    -stage: string, name of the stage
+    '''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with instrument(self.instrumentation, stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,18 +1,34 @@
 #Import the libraries needed
-import pandas as pd
 import numpy as np
+import pandas as pd
 import plotly.express as px
 import matplotlib.pyplot as plt
 import math
+import re
 import kaleido
 import plotly.graph_objects as go
 import time
 import glob
 import os
 from plotly.subplots import make_subplots
-from scipy.stats import ks_2samp, norm, wasserstein_distance
+from scipy.stats import norm
 from matplotlib.ticker import PercentFormatter
-from tqdm import tqdm
+from .instrumentation import measured, instrument
+from .events import EventDispatcher
+from .columnarStore import ColumnarWriter, ObservedClassDict
+from .consolidatedFrame import ConsolidatedFrame
+from .frequencyDistribution import ExpandedClassDict, FrequencyDistribution
+from . import inequality
+from .inequality import CONCENTRATION_METRICS
+from .distanceMatrix import class_distributions, emd_matrix, ks_matrix
+from .quantileSketch import QuantileSketches
+from .tiledDistance import TiledDistanceMatrix
+from .similarityIndex import ClassSimilarityIndex
+from .histogramBins import histogram_edges, histogram_trace, value_range
+from .paretoCurve import pareto_bars, pareto_curve
+from .figureExport import FigureExporter
+from .singleClassObject import WealthKGSingleClassObject
+from .classClustering import CondensedDistances, EmbeddingDistances, SubsetDistances, hierarchical, k_medoids, cluster_medoids
 
 
 
@@ -21,28 +37,113 @@ class WealthKGMultiClassObject:
     Wealth KG Object for all classes within a knowledge graph
 
     Attributes:
-    - class_dict: dictionary of each class' dataframe
+    - class_dict: dictionary of each class' dataframe, or a LazyClassDict reading the classes from disk when accessed
     - bag: Boolean. True if bag was used for queries, false if set was used for queries.
     - class_count: int. Represents number of entities in analysis.
     - class_list: list. Represents each class in a list
+    - instrumentation: Instrumentation. Records stage timings of the statistics and figures, None to disable.
+    - events: EventDispatcher. Progress bars and event callbacks of the long running methods
+    - distributions: dictionary with part as the key and a dictionary of the FrequencyDistribution of every class as value.
+      The statistics, distances and histograms of these parts are computed from the distributions, see from_distributions.
+      Cleared when class_dict is replaced.
+
+    The per-class statistics and the similarity indexes are computed once and cached per part. class_dict is wrapped in an
+    ObservedClassDict, so a class replaced, added or removed through it (obj.class_dict["A"] = df) is computed again,
+    and the cache is cleared when class_dict is replaced. A class dataframe changed in place, or a change made to the
+    wrapped dictionary directly, has to be invalidated with invalidate_statistics.
     '''
-    def __init__(self, class_dict, class_list):
+    def __init__(self, class_dict, class_list, instrumentation=None, events=None, distributions=None):
+        self.__statistics = {}
+        self.__similarity_indexes = {}
         self.class_dict = class_dict
         self.class_list = class_list
+        self.instrumentation = instrumentation
+        self.events = events if events is not None else EventDispatcher()
+        self.distributions = distributions if distributions is not None else {}
+
+    @classmethod
+    def from_distributions(cls, distributions, part, instrumentation=None, events=None):
+        '''
+        Builds a multiclass object from the frequency distributions of the classes, the entities are unnamed.
+        Only the distributions are kept, the statistics, concentration metrics, distance matrices, similarity index,
+        clusters and histograms of the part are computed from them in O(distinct values) per class.
+        Input:
+        -distributions: dictionary with class key as the key and FrequencyDistribution of the part as value
+        -part: string, column the distributions belong to (pCount, iCount or totalCount)
+        Output:
+        -WealthKGMultiClassObject: class_dict is read-only and expands the values of a class when it is accessed
+        '''
+        class_dict = ExpandedClassDict(distributions, part)
+        return cls(class_dict, pd.DataFrame({'class': list(distributions.keys())}), instrumentation, events, {part: distributions})
+
+    def to_distributions(self, part):
+        '''
+        Returns the frequency distribution of a part for every class
+        Input:
+        -part: string, the column (pCount, iCount or totalCount)
+        Output:
+        -dictionary with class key as the key and FrequencyDistribution as value
+        '''
+        if part in self.distributions:
+            return dict(self.distributions[part])
+        distributions = {}
+        for key in self.class_dict.keys():
+            distributions[key] = FrequencyDistribution.from_values(self.class_dict[key][part].to_numpy())
+        return distributions
+
+    def __class_distributions(self, keys, part):
+        #Helper function returning the distribution of every class in the order of keys
+        if part in self.distributions:
+            return [self.distributions[part][key] for key in keys]
+        return class_distributions(self.class_dict, keys, part)
+
+    @property
+    def class_dict(self):
+        return self.__class_dict
+
+    @class_dict.setter
+    def class_dict(self, class_dict):
+        self.__class_dict = ObservedClassDict(class_dict, self.invalidate_statistics)
+        self.distributions = {}
+        self.invalidate_statistics()
+
+    def invalidate_statistics(self, keys=None):
+        '''
+        Removes cached statistics, they are computed again when next needed
+        Input:
+        -keys: list, classes whose data changed, None for every class. Default None.
+        '''
+        if keys is None:
+            self.__statistics = {}
+            self.__similarity_indexes = {}
+            return
+        for part in self.__statistics:
+            self.__statistics[part] = self.__statistics[part].drop(index=keys, errors="ignore")
+        for index in self.__similarity_indexes.values():
+            index.remove(keys)
   
-    def get_all_histogram(self, title_text, part):
+    @measured("figure_build")
+    def get_all_histogram(self, title_text, part, bins=50, scale="linear", shared_bins=True):
         '''
         This function creates a subplot filled with each class' histogram
+        The classes are binned with NumPy and drawn as bars, so the figure holds one value per bin instead of every entity
         Input:
         -title_text: string, for setting the title of the plot
         -part: part of the dataframe to be mapped to histogram ("pCount", "iCount")
+        -bins: int, largest amount of bins per class. Default 50.
+        -scale: string, "linear" for bins of the same width, "log" for bins growing geometrically. Default "linear".
+        -shared_bins: boolean, True for the same bins in every class (the classes are read once more to find
+                      the range of all of them), False for bins fitted to each class. Default True.
         
         output:
         -plotly figure for histogram
         '''
         key_list = list(self.class_dict.keys())
         key_list.sort()
+        return self.__histogram_grid(key_list, title_text, part, bins, scale, shared_bins)
 
+    def __histogram_grid(self, key_list, title_text, part, bins, scale, shared_bins):
+        #Helper function building the subplot grid of the histograms of some classes
         rows = math.ceil(len(key_list)/5)
         height = 2*120*rows
 
@@ -54,11 +155,26 @@ class WealthKGMultiClassObject:
         rows=rows, cols=5, subplot_titles=subplot_titles
         )
         
+        edges = None
+        if shared_bins:
+            ranges = []
+            integer = True
+            for key in key_list:
+                values, _ = self.__histogram_values(key, part)
+                ranges.append(value_range(values))
+                integer = integer and values.dtype.kind in "iub"
+            edges = histogram_edges(ranges, bins, scale, integer=integer)
+
         row = 1
         col = 1
         index = 0
         for key in key_list:
-            fig.add_trace(go.Histogram(x=self.class_dict[key][part]), row=row, col=col)
+            values, weights = self.__histogram_values(key, part)
+            class_edges = edges
+            if class_edges is None:
+                class_edges = histogram_edges([value_range(values)], bins, scale,
+                                              integer=values.dtype.kind in "iub")
+            fig.add_trace(histogram_trace(values, class_edges, scale, weights=weights), row=row, col=col)
             fig.layout.annotations[index].update(text=key)
             index += 1
             col += 1
@@ -66,9 +182,153 @@ class WealthKGMultiClassObject:
                 col = 1
                 row += 1
 
-        fig.update_layout(height=height, width=1200, title_text=title_text, title_x=0.5, showlegend=False)
+        fig.update_layout(height=height, width=1200, title_text=title_text, title_x=0.5, showlegend=False, bargap=0)
         return fig
 
+    def __histogram_values(self, key, part):
+        #Helper function returning the values of a class and their amount of entities, None for one entity each
+        if part in self.distributions:
+            return self.distributions[part][key].values, self.distributions[part][key].counts
+        return self.class_dict[key][part].to_numpy(), None
+
+    def select_classes(self, part, sort_by=None, ascending=False, query=None):
+        '''
+        This function returns the class keys ordered and filtered by their statistics
+        Input:
+        -part: part of the dataframe ("pCount", "iCount")
+        -sort_by: string, column of get_class_statistics or get_concentration_metrics to order by, None for the key. Default None.
+        -ascending: boolean, True to start with the smallest value of sort_by. Default False.
+        -query: string, pandas query on the same columns keeping the classes it matches (e.g. "entity_count > 1000 and gini > 0.5").
+                Default None.
+        Output:
+        -list of class keys
+        '''
+        key_list = list(self.class_dict.keys())
+        key_list.sort()
+        if sort_by is None and query is None:
+            return key_list
+
+        table = self.get_class_statistics(part)
+        #only the concentration metrics named by sort_by or the query are computed
+        metrics = [metric for metric in CONCENTRATION_METRICS if metric not in table.columns and
+                   (metric == sort_by or (query is not None and re.search(r"\b{}\b".format(metric), query)))]
+        if metrics:
+            table = table.join(self.get_concentration_metrics(part, metrics))
+        table = table.loc[key_list]
+        if query is not None:
+            table = table.query(query)
+        if sort_by is not None:
+            if sort_by not in table.columns:
+                raise Exception("Unknown statistic {}".format(sort_by))
+            table = table.sort_values(by=sort_by, ascending=ascending, kind="stable", na_position="last")
+        return list(table.index)
+
+    def get_figure_pages(self, figure, title_text, part, page_size=25, sort_by=None, ascending=False, query=None,
+                         pages=None, **options):
+        '''
+        This function yields the class grid of get_all_histogram or get_all_pareto page by page. A page is built only
+        when the loop reaches it, so thousands of classes can be browsed without building one huge figure.
+        Input:
+        -figure: string, "histogram" or "pareto"
+        -title_text: string, title of every page, followed by the page number
+        -part: part of the dataframe ("pCount", "iCount")
+        -page_size: int, amount of classes per page. Default 25.
+        -sort_by, ascending, query: order and filter of the classes, see select_classes. Default sorted by key.
+        -pages: list, page numbers to build starting at 0, None for every page. Default None.
+        -options: keyword arguments of the figure, bins, scale and shared_bins (shared within a page) for "histogram"
+                  and max_points for "pareto"
+        Output:
+        -generator of plotly figures. The figure, the options and the selection of the classes are checked
+         when this function is called, before the first page is built
+        '''
+        if figure == "histogram":
+            defaults = {"bins": 50, "scale": "linear", "shared_bins": True}
+        elif figure == "pareto":
+            defaults = {"max_points": 200}
+        else:
+            raise Exception("Unknown figure {}".format(figure))
+        unknown = [option for option in options if option not in defaults]
+        if unknown:
+            raise Exception("Unknown options {} of the {} figure".format(", ".join(unknown), figure))
+        options = {**defaults, **options}
+
+        if figure == "histogram":
+            build = lambda keys, title: self.__histogram_grid(keys, title, part, options["bins"], options["scale"], options["shared_bins"])
+        else:
+            build = lambda keys, title: self.__pareto_grid(keys, title, part, options["max_points"])
+        key_list = self.select_classes(part, sort_by, ascending, query)
+        return self.__figure_pages(build, key_list, title_text, page_size, pages)
+
+    def __figure_pages(self, build, key_list, title_text, page_size, pages):
+        #Helper function of get_figure_pages, the generator that builds the pages
+        page_count = math.ceil(len(key_list) / page_size)
+        for page in (range(page_count) if pages is None else pages):
+            page_keys = key_list[page * page_size:(page + 1) * page_size]
+            if not page_keys:
+                continue
+            with instrument(self.instrumentation, "figure_build"):
+                fig = build(page_keys, "{} ({}/{})".format(title_text, page + 1, page_count))
+            yield fig
+
+    def export_figures(self, location, figures=None, parts=None, classes=None, format="png", workers=4, exporter=None):
+        '''
+        This function renders figures of the object and of every class into image files, in parallel through one
+        kaleido browser. The figures are built one by one while the previous ones render, see figureExport.FigureExporter
+        Input:
+        -location: string, folder of the images
+        -figures: list, figures of the object ("entity_count_histogram", "skewness_histogram", "kurtosis_histogram",
+                  "gini_histogram", "palma_histogram", named <figure>_<part>) and of every class ("histogram",
+                  "pareto", "lorenz", named <class>_<figure>_<part>). None for all. Default None.
+        -parts: list, columns to draw (pCount, iCount or totalCount), None for ["pCount"]. Default None.
+        -classes: list, classes of the class figures (e.g. from select_classes), None for all. Default None.
+        -format: string, "png", "svg", "jpeg", "webp" or "pdf". Default "png".
+        -workers: int, amount of figures rendered at the same time. Default 4.
+        -exporter: FigureExporter, e.g. one opened with "with" to reuse its browser for several exports,
+                   its format and workers are used instead. Default None.
+        Output:
+        -list of the paths written
+        '''
+        object_figures = {"skewness_histogram": self.get_skewness_histogram, "kurtosis_histogram": self.get_kurtosis_histogram,
+                          "gini_histogram": self.get_gini_histogram, "palma_histogram": self.get_palma_histogram}
+        class_figures = ["histogram", "pareto", "lorenz"]
+        if figures is None:
+            figures = ["entity_count_histogram"] + list(object_figures) + class_figures
+        for figure in figures:
+            if figure != "entity_count_histogram" and figure not in object_figures and figure not in class_figures:
+                raise Exception("Unknown figure {}".format(figure))
+        if classes is None:
+            classes = sorted(self.class_dict.keys())
+        parts = ["pCount"] if parts is None else parts
+
+        def generate():
+            if "entity_count_histogram" in figures:
+                yield "entity_count_histogram", self.get_entity_count_histogram()
+            for part in parts:
+                for figure in figures:
+                    if figure in object_figures:
+                        yield "{}_{}".format(figure, part), object_figures[figure](part)
+            builders = [figure for figure in figures if figure in class_figures]
+            if not builders:
+                return
+            for key in classes:
+                if self.distributions:
+                    distributions = {part: self.distributions[part][key] for part in self.distributions}
+                    single = WealthKGSingleClassObject(None, None, key, next(iter(distributions.values())).n,
+                                                       self.instrumentation, self.events, distributions)
+                else:
+                    df = self.class_dict[key]
+                    single = WealthKGSingleClassObject(df, None, key, len(df), self.instrumentation, self.events)
+                for part in parts:
+                    if "histogram" in builders:
+                        yield "{}_histogram_{}".format(key, part), single.get_histogram(part)
+                    if "pareto" in builders:
+                        yield "{}_pareto_{}".format(key, part), single.get_pareto_chart(part)
+                    if "lorenz" in builders:
+                        yield "{}_lorenz_{}".format(key, part), single.get_lorenz_curve(part)
+
+        exporter = exporter if exporter is not None else FigureExporter(workers, format)
+        return exporter.export(generate(), location)
+
     def save_to_csv_folder(self, location):
         '''
         This function is for saving the dictionary of dataframes to csvs within a folder
@@ -87,7 +347,149 @@ class WealthKGMultiClassObject:
             self.class_dict[key].to_csv(fullname)
         print("Saved to {}".format(location))
 
+    def save(self, location, format="csv", partitioned=False):
+        '''
+        This function is for saving the dictionary of dataframes in a selectable format
+        Input:
+        -location: string, folder for csv and partitioned stores, file for a single parquet file
+        -format: string, "csv" (same as save_to_csv_folder), "parquet" or "arrow". Default "csv".
+        -partitioned: boolean, True for one columnar file per class, False for a single parquet file. Default False.
+                      Entity IRIs are dictionary-encoded and counts stored as int32 in the columnar formats.
+        '''
+        if format == "csv":
+            self.save_to_csv_folder(location)
+            return
+
+        class_values = {}
+        for class_value in self.class_list['class']:
+            class_values[class_value.split('/')[-1]] = class_value
+
+        with ColumnarWriter(location, format, partitioned) as writer:
+            for key in self.class_dict.keys():
+                writer.write_class(key, self.class_dict[key], class_values.get(key, key))
+        print("Saved to {}".format(location))
+
   
+    def consolidate(self, parts=[]):
+        '''
+        Returns every class in one set of arrays, see ConsolidatedFrame
+        Input:
+        -parts: list, columns to keep (e.g. ["pCount", "iCount"]). Default empty, only the entity counts.
+        Output:
+        -ConsolidatedFrame
+        '''
+        return ConsolidatedFrame.from_class_dict(self.class_dict, parts)
+
+    @measured("statistics")
+    def get_class_statistics(self, part):
+        '''
+        The function returns the statistics of every class, computed in one vectorized pass
+        and cached until the classes change
+        Input:
+        -part: string, the column to calculate the statistics for (pCount, iCount or totalCount)
+        Output:
+        -pandas dataframe: entity_count, skewness, kurtosis, gini and palma, indexed by class
+        '''
+        return self.__cached_statistics(part).copy()
+
+    @measured("statistics")
+    def get_concentration_metrics(self, part, metrics=None, atkinson_epsilon=0.5):
+        '''
+        The function returns concentration metrics of every class, computed in one vectorized pass
+        over the sorted values and cached until the classes change
+        Input:
+        -part: string, the column (pCount, iCount or totalCount)
+        -metrics: list, any of "gini", "palma", "top_1_share", "top_10_share", "pareto_point", "theil",
+                  "atkinson", "hoover" and "herfindahl", None for all. Default None.
+        -atkinson_epsilon: float, inequality aversion of the atkinson index. Default 0.5.
+        Output:
+        -pandas dataframe: one column per metric, indexed by class
+        '''
+        metrics = list(CONCENTRATION_METRICS) if metrics is None else list(metrics)
+        def compute(keys, columns):
+            if part in self.distributions:
+                rows = [self.distributions[part][key].concentration(columns, atkinson_epsilon) for key in keys]
+                return pd.DataFrame(rows, index=pd.Index(keys, name="class"), columns=columns)
+            consolidated = ConsolidatedFrame.from_class_dict(self.class_dict, [part], keys)
+            return consolidated.concentration(part, columns, atkinson_epsilon)
+        return self.__cached_frame(("concentration", part, atkinson_epsilon), compute, metrics).copy()
+
+    def get_statistics_summary(self, parts=None):
+        '''
+        The function returns the per-class statistics and concentration metrics as a tidy table
+        Input:
+        -parts: list, parts to include, computing the missing statistics. None for the parts already computed. Default None.
+        Output:
+        -pandas dataframe: one row per class, part and metric with the columns class, part, metric and value
+        '''
+        if parts is None:
+            parts = [key for key in self.__statistics if isinstance(key, str)]
+            parts += [key[1] for key in self.__statistics if isinstance(key, tuple) and key[1] not in parts]
+        tables = []
+        for part in parts:
+            frames = [self.__cached_statistics(part)]
+            for key, frame in self.__statistics.items():
+                if isinstance(key, tuple) and key[1] == part:
+                    #atkinson indexes with another inequality aversion than the default are named after it
+                    frames.append(frame.rename(columns={"atkinson": "atkinson" if key[2] == 0.5 else "atkinson_{}".format(key[2])}))
+            for frame in frames:
+                table = frame.reset_index().melt(id_vars="class", var_name="metric")
+                table.insert(1, "part", part)
+                tables.append(table)
+        if not tables:
+            return pd.DataFrame(columns=["class", "part", "metric", "value"])
+        return pd.concat(tables, ignore_index=True).drop_duplicates(subset=["class", "part", "metric"])
+
+    def __cached_statistics(self, part):
+        #Helper function for the statistics of a part, None for the entity counts only
+        def compute(keys, columns):
+            if part in self.distributions or (part is None and self.distributions):
+                return self.__distribution_statistics(keys, part)
+            parts = [] if part is None else [part]
+            consolidated = ConsolidatedFrame.from_class_dict(self.class_dict, parts, keys)
+            if part is None:
+                return pd.DataFrame({"entity_count": consolidated.counts}, index=pd.Index(consolidated.keys, name="class"))
+            return consolidated.class_statistics(part)
+        return self.__cached_frame(part, compute)
+
+    def __distribution_statistics(self, keys, part):
+        #Helper function computing the statistics of __cached_statistics from the distributions
+        distributions = self.distributions[part] if part is not None else next(iter(self.distributions.values()))
+        index = pd.Index(keys, name="class")
+        entity_count = [distributions[key].n for key in keys]
+        if part is None:
+            return pd.DataFrame({"entity_count": entity_count}, index=index)
+        return pd.DataFrame({"entity_count": entity_count,
+                             "skewness": [distributions[key].skew() for key in keys],
+                             "kurtosis": [distributions[key].kurtosis() for key in keys],
+                             "gini": [distributions[key].gini() for key in keys],
+                             "palma": [distributions[key].palma() for key in keys]}, index=index)
+
+    def __cached_frame(self, cache_key, compute, columns=None):
+        '''
+        Helper function keeping one cached frame with a row per class for every cache key.
+        Classes missing from the frame are computed, classes removed from class_dict dropped,
+        and when columns are given the missing columns are computed for every class.
+        -compute: function with the class keys and the columns (None for all) that returns their frame
+        '''
+        keys = pd.Index(list(self.class_dict.keys()), name="class")
+        stats = self.__statistics.get(cache_key)
+        if stats is None:
+            stats = compute(keys, columns)
+        else:
+            missing = keys.difference(stats.index, sort=False)
+            if len(missing) > 0:
+                stats = pd.concat([stats, compute(missing, None if columns is None else list(stats.columns))])
+            if len(stats) != len(keys) or not stats.index.equals(keys):
+                stats = stats.reindex(keys)
+            if columns is not None:
+                missing_columns = [column for column in columns if column not in stats.columns]
+                if missing_columns:
+                    stats = stats.join(compute(keys, missing_columns))
+        self.__statistics[cache_key] = stats
+        return stats if columns is None else stats[columns]
+
+    @measured("statistics")
     def get_average_skewness(self, part):
         '''
         The function returns the average skewness of all the classes
@@ -96,16 +498,9 @@ class WealthKGMultiClassObject:
         Output:
         -skewness: float
         '''
-        skewness_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            skew = self.class_dict[key][part].skew()
-            if not math.isnan(skew):
-                skewness_arr.append(skew)
-
-        return sum(skewness_arr)/len(skewness_arr)
+        return self.__cached_statistics(part)['skewness'].mean()
 
+    @measured("figure_build")
     def get_skewness_histogram(self, part):
         '''
         The function returns the average skewness of all the classes
@@ -114,22 +509,12 @@ class WealthKGMultiClassObject:
         Output:
         -histogram for overall skewness
         '''
-        skewness_arr = []
-        key_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            skew = self.class_dict[key][part].skew()
-            if not math.isnan(skew):
-                skewness_arr.append(skew)
-                key_arr.append(key)
-
-
-        df = pd.DataFrame({'class':key_arr, 'skewness':skewness_arr})
+        df = self.__metric_frame(part, 'skewness')
         fig = px.histogram(df, x='skewness')
         fig.update_layout(height=500, width=800, title_x=0.5, title_text="Histogram of skewness values")
         return fig
   
+    @measured("statistics")
     def get_average_kurtosis(self, part):
         '''
         The function returns the average kurtosis of all the classes
@@ -138,16 +523,9 @@ class WealthKGMultiClassObject:
         Output:
         -kurtosis: float
         '''
-        kurtosis_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            skew = self.class_dict[key][part].kurtosis()
-            if not math.isnan(skew):
-                kurtosis_arr.append(skew)
-
-        return sum(kurtosis_arr)/len(kurtosis_arr)
+        return self.__cached_statistics(part)['kurtosis'].mean()
 
+    @measured("figure_build")
     def get_kurtosis_histogram(self, part):
         '''
         The function returns the average kurtosis of all the classes
@@ -156,30 +534,18 @@ class WealthKGMultiClassObject:
         Output:
         -plotly histogram
         '''
-        kurtosis_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            skew = self.class_dict[key][part].kurtosis()
-            if not math.isnan(skew):
-                kurtosis_arr.append(skew)
-
-        df = pd.DataFrame({'kurtosis':kurtosis_arr})
+        df = self.__metric_frame(part, 'kurtosis')
         fig = px.histogram(df, x='kurtosis')
         fig.update_layout(height=500, width=800, title_x=0.5, title_text="Histogram of kurtosis values")
         return fig
 
   
+    @measured("statistics")
     def get_total_entities(self):
         '''returns total entities'''
-        sum = 0
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            sum += len(self.class_dict[key])
-
-        return sum
+        return int(self.__entity_counts().sum())
   
+    @measured("figure_build")
     def get_gini_histogram(self, part):
         '''
         The function returns a histogram showing the distribution of gini values
@@ -188,21 +554,12 @@ class WealthKGMultiClassObject:
         Output:
         -plotly histogram
         '''
-        gini_arr = []
-        key_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            gini = self.__gini(self.class_dict[key][part])
-            if not math.isnan(gini):
-                gini_arr.append(gini)
-                key_arr.append(key)
-
-        df = pd.DataFrame({'key_arr':key_arr, 'gini':gini_arr})
+        df = self.__metric_frame(part, 'gini')
         fig = px.histogram(df, x='gini')
         fig.update_layout(height=500, width=800, title_x=0.5, title_text="Histogram of gini values")
-        fig.show()
+        return fig
   
+    @measured("statistics")
     def get_average_gini(self, part):
         '''
         The function returns the average gini value of all the classes
@@ -211,41 +568,24 @@ class WealthKGMultiClassObject:
         Output:
         -gini: float
         '''
-        gini_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            gini = self.__gini(self.class_dict[key][part])
-            if not math.isnan(gini):
-                gini_arr.append(gini)
-
-
-        return sum(gini_arr)/len(gini_arr)
+        return self.__cached_statistics(part)['gini'].mean()
 
   
+    @measured("statistics")
     def get_average_entities(self):
         #Returns average amount of entities
-        entity_amount_list = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            entity_amount_list.append(len(self.class_dict[key]))
-
-        return sum(entity_amount_list)/len(entity_amount_list)
+        return self.__entity_counts().mean()
   
+    @measured("figure_build")
     def get_entity_count_histogram(self):
         #returns histogram for entity count per each class
-        entity_amount_list = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            entity_amount_list.append(len(self.class_dict[key]))
-
-        df = pd.DataFrame({'class':key_list, 'entity_count':entity_amount_list})
+        entity_counts = self.__entity_counts()
+        df = pd.DataFrame({'class':entity_counts.index, 'entity_count':entity_counts.to_numpy()})
         fig = px.histogram(df, x='entity_count')
         fig.update_layout(height=500, width=800, title_x=0.5, title_text="Histogram of entity count")
         return fig
 
+    @measured("figure_build")
     def get_palma_histogram(self, part):
         '''
         The function returns a histogram showing the distribution of palma values
@@ -254,21 +594,12 @@ class WealthKGMultiClassObject:
         Output:
         -plotly histogram for palma
         '''
-        palma_arr = []
-        key_arr = []
-        key_list = list(self.class_dict.keys())
-
-        for key in key_list:
-            palma = self.__palma(self.class_dict[key][part])
-            if not math.isnan(palma):
-                palma_arr.append(palma)
-                key_arr.append(key)
-
-        df = pd.DataFrame({'class':key_arr, 'palma':palma_arr})
+        df = self.__metric_frame(part, 'palma')
         fig = px.histogram(df, x='palma')
         fig.update_layout(height=500, width=800, title_x=0.5, title_text="Histogram of palma ratios")
-        fig.show()
+        return fig
 
+    @measured("statistics")
     def get_average_palma(self, part):
         '''
         The function returns the average palma value of all the classes
@@ -277,58 +608,41 @@ class WealthKGMultiClassObject:
         Output:
         -palma value: float
         '''
-        palma_arr = []
-        key_arr = []
-        key_list = list(self.class_dict.keys())
+        return self.__cached_statistics(part)['palma'].mean()
 
-        for key in key_list:
-            palma = self.__palma(self.class_dict[key][part])
-            if not math.isnan(palma):
-                palma_arr.append(palma)
-                key_arr.append(key)
-
-        df = pd.DataFrame({'class':key_arr, 'palma':palma_arr})
-        return df['palma'].mean()
-
-    def __gini(self, df):
-        #Courtesy of Nurul Srianda
-        arr = np.array(df)
-        count = arr.size
-        coefficient = 2 / count
-        indexes = np.arange(1, count + 1)
-        weighted_sum = (indexes * arr).sum()
-        total = arr.sum()
-        constant = (count + 1) / count
-        return coefficient * weighted_sum / total - constant
-  
-    def __lorenz(self, df):
-        #Courtesy of Nurul Srianda
-        arr = np.array(df)
-        # this divides the prefix sum by the total sum
-        # this ensures all the values are between 0 and 1.0
-        scaled_prefix_sum = arr.cumsum() / arr.sum()
-        # this prepends the 0 value (because 0% of all people have 0% of all wealth)
-        return np.insert(scaled_prefix_sum, 0, 0)
-  
-    def __palma(self, df):
-        #Courtesy of Nurul Srianda
-        lorenz_arr = self.__lorenz(df)
-        return (1 - np.quantile(lorenz_arr, 0.9)) / np.quantile(lorenz_arr, 0.4)
+    def __entity_counts(self):
+        #Helper function returning the entity count of every class, taken from any part already computed
+        for part in self.__statistics:
+            if isinstance(part, str):
+                return self.__cached_statistics(part)['entity_count']
+        return self.__cached_statistics(None)['entity_count']
+
+    def __metric_frame(self, part, metric):
+        #Helper function returning the classes with a defined value of a metric
+        stats = self.__cached_statistics(part)
+        stats = stats[stats[metric].notna()]
+        return pd.DataFrame({'class': stats.index, metric: stats[metric].to_numpy()})
 
 
-    def get_all_pareto(self, title_text, part):
+    @measured("figure_build")
+    def get_all_pareto(self, title_text, part, max_points=200):
         '''
         This function creates a subplot filled with each class's pareto chart
         Input:
         -title_text: string, for setting the title of the plot
         -part: part of the dataframe to be mapped to histogram ("pCount", "iCount")
+        -max_points: int, above this amount of entities a class is drawn with bars of entities binned by rank and a
+                     cumulative line downsampled to max_points points, see paretoCurve. None for every entity. Default 200.
         
         output:
         -plotly figure for pareto chart
         '''
         key_list = list(self.class_dict.keys())
         key_list.sort()
+        return self.__pareto_grid(key_list, title_text, part, max_points)
 
+    def __pareto_grid(self, key_list, title_text, part, max_points):
+        #Helper function building the subplot grid of the pareto charts of some classes
         rows = math.ceil(len(key_list)/5)
         height = 2*120*rows
 
@@ -342,16 +656,16 @@ class WealthKGMultiClassObject:
         row = 1
         col = 1
         index = 0
-        for key in tqdm(key_list):
-            df = self.class_dict[key].copy()
-            #fig.add_trace(go.Histogram(x=self.class_dict[key][part]), row=row, col=col)
-            df_sorted = df.sort_values(by=part, ascending=False)
-            df_sorted.reset_index(inplace=True)
-            df_sorted['cumperc'] = df_sorted[part].cumsum()/df_sorted[part].sum()*100
+        for key in self.events.progress(key_list):
+            #only the column is sorted, the class frame is not copied
+            sorted_values = inequality.sort_values(self.class_dict[key][part].to_numpy())
+            bar_rank, bar_value, bar_width = pareto_bars(sorted_values, max_points)
+            curve_rank, curve_percentage = pareto_curve(sorted_values, max_points)
 
             trace1 = go.Bar(
-            x=df_sorted.index,
-            y=df_sorted[part],
+            x=bar_rank,
+            y=bar_value,
+            width=bar_width,
             name='Property Count',
             marker=dict(
                 color='rgb(34,163,192)'
@@ -359,8 +673,8 @@ class WealthKGMultiClassObject:
             hoverinfo='skip',
             )
             trace2 = go.Scatter(
-              x=df_sorted.index,
-              y=df_sorted['cumperc'],
+              x=curve_rank,
+              y=curve_percentage,
               name='Cumulative Percentage',
               yaxis='y2',
               hoverinfo='skip'
@@ -370,7 +684,7 @@ class WealthKGMultiClassObject:
             fig.add_trace(trace1, row=row, col=col)
             fig.add_trace(trace2, row=row, col=col)
             fig.layout.annotations[index].update(text=key)
-
+            self.events.emit("class_finished", "get_all_pareto", **{"class": key, "rows": len(sorted_values), "index": index, "total": len(key_list)})
 
             index += 1
             col += 1
@@ -381,64 +695,256 @@ class WealthKGMultiClassObject:
         fig.update_layout(height=height, width=1200, title_text=title_text, title_x=0.5, showlegend=False)
         return fig
     
-    def get_emd_distance_matrix(self, part):
+    @measured("statistics")
+    def get_emd_distance_matrix(self, part, condensed=False, method="auto", sketch_size=64):
         '''
         This function returns a distance matrix between each class with
         "earth mover's distance" algorithm being used to calculate distance.
-        The order of each row is based on the class key list sorted. The distance matrix then can be used for clustering purposes
+        The order of each row is based on the class key list sorted. The distance matrix then can be used for clustering purposes.
+        Every class is read and sorted once and only the pairs above the diagonal are computed, see distanceMatrix.emd_matrix
         Input:
         -part: part of the dataframe to be calculated ("pCount", "iCount")
+        -condensed: boolean, True for the condensed upper triangle (the format of scipy's pdist). Default False.
+        -method: string, "grid", "merge" or "auto" for the exact distance, "sketch" for the approximation of
+                 get_quantile_sketches, see get_sketch_error_report for its error. Default "auto".
+        -sketch_size: int, amount of quantiles per class of the "sketch" method. Default 64.
         
         output:
-        -distance matrix: numpy array
+        -distance matrix: float32 numpy array, square or condensed. NaN for the classes without entities, also on
+         the diagonal of the square matrix
         '''
-        class_dict = self.class_dict
-        key_list = list(class_dict.keys())
+        key_list = list(self.class_dict.keys())
         key_list.sort()
 
-        distance_matrix = []
-
-        for key in tqdm(key_list):
-            row = []
-            for other_key in key_list:
-                if other_key == key:
-                    row.append(0)
-                else:
-                    u_values = list(class_dict[key][part])
-                    v_values = list(class_dict[other_key][part])
-                    emd = wasserstein_distance(u_values, v_values)
-                    row.append(emd)
-            distance_matrix.append(row)
+        distributions = self.__class_distributions(key_list, part)
+        if method == "sketch":
+            return QuantileSketches.from_distributions(distributions, sketch_size).emd_matrix(condensed)
+        def on_row(index):
+            self.events.emit("class_finished", "get_emd_distance_matrix", **{"class": key_list[index], "rows": distributions[index].n, "index": index, "total": len(key_list)})
 
-        return np.array(distance_matrix)
+        return emd_matrix(distributions, condensed, method, progress=self.events.progress, on_row=on_row)
     
-    def get_ks_distance_matrix(self, part):
+    @measured("statistics")
+    def get_ks_distance_matrix(self, part, condensed=False, method="auto", transform="norm", pvalues=False, sketch_size=64):
         '''
         This function returns a distance matrix between each class with 
         "Kolmogorov–Smirnov test" algorithm being used to calculate distance between each class.
         The order of each row is based on the class key list sorted. The distance matrix then can be used for clustering purposes.
+        Every class is read, transformed and sorted once and only the pairs above the diagonal are computed, see distanceMatrix.ks_matrix
         Input:
         -part: part of the dataframe to be calculated ("pCount", "iCount")
+        -condensed: boolean, True for the condensed upper triangle (the format of scipy's pdist). Default False.
+        -method: string, "grid", "merge" or "auto" for the exact statistic, "sketch" for the approximation of
+                 get_quantile_sketches, off by at most 1 / sketch_size. Default "auto".
+        -transform: string, "norm" to compare norm.cdf of the counts like before, None to compare the counts.
+                    norm.cdf is 1.0 for every count above 8, so those counts are ties under "norm". Default "norm".
+        -pvalues: boolean, True to also return the matrix of asymptotic p-values, not available for "sketch". Default False.
+        -sketch_size: int, amount of quantiles per class of the "sketch" method. Default 64.
         
         output:
-        -distance matrix: numpy array
+        -distance matrix: float32 numpy array, square or condensed. A tuple with the p-values if pvalues is True.
+         NaN for the classes without entities, also on the diagonal of the square matrix
         '''
-        class_dict = self.class_dict
-        key_list = list(class_dict.keys())
+        key_list = list(self.class_dict.keys())
         key_list.sort()
 
-        distance_matrix = []
+        distributions = self.__class_distributions(key_list, part)
+        if method == "sketch":
+            if pvalues:
+                raise Exception("p-values are only available for the exact methods")
+            if transform == "norm":
+                distributions = [distribution.map(norm.cdf) for distribution in distributions]
+            return QuantileSketches.from_distributions(distributions, sketch_size).ks_matrix(condensed)
+        def on_row(index):
+            self.events.emit("class_finished", "get_ks_distance_matrix", **{"class": key_list[index], "rows": distributions[index].n, "index": index, "total": len(key_list)})
+
+        return ks_matrix(distributions, condensed, method, norm.cdf if transform == "norm" else None, pvalues,
+                         progress=self.events.progress, on_row=on_row)
+
+    @measured("statistics")
+    def save_distance_matrix(self, part, directory, distance="emd", condensed=True, tile_size=1024, processes=None,
+                             method="auto", transform="norm"):
+        '''
+        This function computes the EMD or KS matrix tile by tile in a process pool and writes it into directory/matrix.npy,
+        for more classes than the matrix fits in memory. A computation that is interrupted continues
+        with the unfinished tiles when it is called again with the same directory, see tiledDistance.TiledDistanceMatrix
+        Input:
+        -part: part of the dataframe to be calculated ("pCount", "iCount")
+        -directory: string, folder of the matrix and its journal
+        -distance: string, "emd" or "ks". Default "emd".
+        -condensed: boolean, True for the condensed upper triangle (the format of scipy's pdist), False for the square matrix. Default True.
+        -tile_size: int, amount of rows and columns computed by one task. Default 1024.
+        -processes: int, amount of worker processes, 1 to compute in this process, None for one per cpu. Default None.
+        -method: string, "grid", "merge" or "auto". Default "auto".
+        -transform: string, "norm" or None, the transform of the KS statistic, see get_ks_distance_matrix. Default "norm".
+        Output:
+        -distance matrix: read only float32 numpy memmap, rows in sorted class key order
+        '''
+        key_list = list(self.class_dict.keys())
+        key_list.sort()
 
-        for key in tqdm(key_list):
-            row = []
-            for other_key in key_list:
-                if other_key == key:
-                    row.append(0)
-                else:
-                    u_cdf = norm.cdf(list(class_dict[key][part]))
-                    v_cdf = norm.cdf(list(class_dict[other_key][part]))
-                    ks, pval = ks_2samp(u_cdf, v_cdf)
-                    row.append(ks)
-            distance_matrix.append(row)
+        distributions = self.__class_distributions(key_list, part)
+        if distance == "ks" and transform == "norm":
+            distributions = [distribution.map(norm.cdf) for distribution in distributions]
+        fingerprint = {"part": part, "classes": key_list, "entities": [distribution.n for distribution in distributions],
+                       "transform": transform if distance == "ks" else None}
+        matrix = TiledDistanceMatrix(directory, len(key_list), distance, condensed, tile_size,
+                                     fingerprint=fingerprint)
+        def on_tile(tile, index, total):
+            self.events.emit("tile_finished", "save_distance_matrix", tile=tile, index=index, total=total)
+
+        result = matrix.compute(distributions, processes, method, progress=self.events.progress, on_tile=on_tile)
+        print("Saved to {}".format(matrix.matrix_file))
+        return result
+
+    def get_similarity_index(self, part, distance="emd", sketch_size=64, transform="norm"):
+        '''
+        This function returns the nearest neighbour index of the classes, built once and cached. Classes added to
+        class_dict since the last call are added to the index and removed ones dropped, see similarityIndex.ClassSimilarityIndex
+        Input:
+        -part: part of the dataframe ("pCount", "iCount")
+        -distance: string, "emd" or "ks". Default "emd".
+        -sketch_size: int, amount of quantiles per class. Default 64.
+        -transform: string, "norm" or None, the transform of the KS statistic, see get_ks_distance_matrix. Default "norm".
+        Output:
+        -ClassSimilarityIndex
+        '''
+        transform = transform if distance == "ks" else None
+        cache_key = (part, distance, sketch_size, transform)
+        index = self.__similarity_indexes.get(cache_key)
+        if index is None:
+            index = ClassSimilarityIndex(distance, sketch_size, norm.cdf if transform == "norm" else None)
+            self.__similarity_indexes[cache_key] = index
+
+        keys = set(self.class_dict.keys())
+        index.remove([key for key in index.keys if key not in keys])
+        missing = [key for key in self.class_dict.keys() if key not in index]
+        index.add(dict(zip(missing, self.__class_distributions(missing, part))))
+        return index
+
+    @measured("statistics")
+    def find_similar_classes(self, target, part, k=10, distance="emd", sketch_size=64, transform="norm"):
+        '''
+        This function finds the classes whose distribution is the most similar to the one of a class,
+        under the approximate EMD or KS distance of the quantile sketches
+        Input:
+        -target: class key, or FrequencyDistribution of a class that is not in the object
+        -part: part of the dataframe ("pCount", "iCount")
+        -k: int, amount of classes returned. Default 10.
+        -distance: string, "emd" or "ks". Default "emd".
+        -sketch_size: int, amount of quantiles per class. Default 64.
+        -transform: string, "norm" or None, the transform of the KS statistic. Default "norm".
+        Output:
+        -pandas dataframe: class and distance, from the most to the least similar, without the target class
+        '''
+        return self.get_similarity_index(part, distance, sketch_size, transform).query(target, k)
+
+    @measured("statistics")
+    def cluster_classes(self, part, n_clusters, algorithm="hierarchical", distance="emd", method="auto", matrix=None,
+                        linkage_method="average", sketch_size=64, transform="norm", seed=0):
+        '''
+        This function clusters the classes by the distance between their distributions. The distances are read from
+        a condensed matrix or computed from the quantile sketches, the square matrix is never built, see classClustering
+        Input:
+        -part: part of the dataframe ("pCount", "iCount")
+        -n_clusters: int, amount of clusters
+        -algorithm: string, "hierarchical" or "kmedoids". Default "hierarchical".
+        -distance: string, "emd" or "ks". Default "emd".
+        -method: string, "grid", "merge" or "auto" to compute the exact condensed matrix, "sketch" to use the
+                 quantile sketches (EMD from the sketch vectors directly, KS from its condensed sketch matrix). Default "auto".
+        -matrix: numpy array, condensed matrix in sorted class key order to use instead (e.g. of save_distance_matrix). Default None.
+        -linkage_method: string, linkage of the hierarchical clustering ("single", "complete", "average", "weighted"). Default "average".
+        -sketch_size: int, amount of quantiles per class of the "sketch" method. Default 64.
+        -transform: string, "norm" or None, the transform of the KS statistic. Default "norm".
+        -seed: int, seed of the starting medoids of "kmedoids". Default 0.
+        Output:
+        -labels: pandas series, cluster of every class indexed by class, -1 for the classes without entities
+                 which are not clustered
+        -clusters: pandas dataframe, per cluster the amount of classes and entities, the medoid class, the mean
+                   distance to it and the mean skewness, kurtosis, gini and palma of its classes
+        '''
+        key_list = list(self.class_dict.keys())
+        key_list.sort()
 
-        return np.array(distance_matrix)
\ No newline at end of file
+        if matrix is not None:
+            distances = CondensedDistances(matrix)
+        elif method == "sketch" and distance == "emd":
+            sketches = self.get_quantile_sketches(part, sketch_size)
+            distances = EmbeddingDistances(sketches.quantiles, "cityblock", 1 / sketches.size)
+        elif distance == "emd":
+            distances = CondensedDistances(self.get_emd_distance_matrix(part, True, method, sketch_size))
+        else:
+            distances = CondensedDistances(self.get_ks_distance_matrix(part, True, method, transform, sketch_size=sketch_size))
+        if distances.n != len(key_list):
+            raise Exception("The matrix has {} classes, the object has {}".format(distances.n, len(key_list)))
+
+        #classes without entities have NaN distances, they are left out of the clustering
+        stats = self.get_class_statistics(part).loc[key_list]
+        kept = np.flatnonzero(stats["entity_count"].to_numpy() > 0)
+        if len(kept) == 0:
+            raise Exception("None of the classes has entities in {}".format(part))
+        if len(kept) < len(key_list):
+            distances = SubsetDistances(distances, kept)
+
+        if algorithm == "hierarchical":
+            kept_labels = hierarchical(distances, n_clusters, linkage_method)
+            medoids, mean_distance = cluster_medoids(distances, kept_labels)
+        elif algorithm == "kmedoids":
+            kept_labels, _ = k_medoids(distances, n_clusters, seed=seed)
+            medoids, mean_distance = cluster_medoids(distances, kept_labels)
+        else:
+            raise Exception("Unknown clustering algorithm {}".format(algorithm))
+
+        labels = np.full(len(key_list), -1, dtype=np.int64)
+        labels[kept] = kept_labels
+        labels = pd.Series(labels, index=pd.Index(key_list, name="class"), name="cluster")
+        grouped = stats.iloc[kept].groupby(kept_labels)
+        clusters = pd.DataFrame({"classes": grouped.size(), "entities": grouped["entity_count"].sum()})
+        clusters["medoid"] = [key_list[kept[medoid]] for medoid in medoids[clusters.index]]
+        clusters["mean_distance"] = mean_distance[clusters.index]
+        for column in ["skewness", "kurtosis", "gini", "palma"]:
+            clusters["mean_" + column] = grouped[column].mean()
+        clusters.index.name = "cluster"
+        return labels, clusters
+
+    def get_quantile_sketches(self, part, sketch_size=64, transform=None):
+        '''
+        This function summarizes every class by the same amount of quantiles, the approximate distances
+        of the "sketch" method are computed from them. Rows are in sorted class key order.
+        Input:
+        -part: part of the dataframe ("pCount", "iCount")
+        -sketch_size: int, amount of quantiles per class. Default 64.
+        -transform: string, "norm" to sketch norm.cdf of the counts like the KS matrix, None for the counts. Default None.
+        Output:
+        -QuantileSketches
+        '''
+        key_list = list(self.class_dict.keys())
+        key_list.sort()
+        distributions = self.__class_distributions(key_list, part)
+        if transform == "norm":
+            distributions = [distribution.map(norm.cdf) for distribution in distributions]
+        return QuantileSketches.from_distributions(distributions, sketch_size)
+
+    @measured("statistics")
+    def get_sketch_error_report(self, part, sketch_size=64, sample_pairs=1000, transform="norm", seed=0):
+        '''
+        This function reports the error of the "sketch" method against the exact distances on a random sample of pairs
+        Input:
+        -part: part of the dataframe ("pCount", "iCount")
+        -sketch_size: int, amount of quantiles per class. Default 64.
+        -sample_pairs: int, amount of pairs compared. Default 1000.
+        -transform: string, transform of the KS matrix, "norm" or None. Default "norm".
+        -seed: int, seed of the sample. Default 0.
+        Output:
+        -pandas dataframe: one row for emd and one for ks with the mean and max absolute error and the error bound
+        '''
+        key_list = list(self.class_dict.keys())
+        key_list.sort()
+        distributions = self.__class_distributions(key_list, part)
+        sketches = QuantileSketches.from_distributions(distributions, sketch_size)
+        report = [sketches.error_report(distributions, sample_pairs, seed, ["emd"])]
+        if transform == "norm":
+            distributions = [distribution.map(norm.cdf) for distribution in distributions]
+            sketches = QuantileSketches.from_distributions(distributions, sketch_size)
+        report.append(sketches.error_report(distributions, sample_pairs, seed, ["ks"]))
+        return pd.concat(report, ignore_index=True)
@@ -0,0 +1,101 @@
+#Import the libraries needed
+import numpy as np
+
+
+def pareto_bars(sorted_values, bins=None, counts=None):
+    '''
+    Bars of a Pareto chart, the entities from the richest to the poorest. Above bins entities, the entities are
+    grouped by rank into bins of the same size and every bar shows the mean value of its bin.
+    Input:
+    -sorted_values: numpy array sorted in ascending order (e.g. sorted_values of the single class object)
+    -bins: int, largest amount of bars, None for one bar per entity. Default None.
+    -counts: numpy array, amount of entities with each value (e.g. FrequencyDistribution.counts), None for one each.
+             With counts the bins are computed in O(distinct values). Default None.
+    Output:
+    -rank, value, width: numpy arrays, center rank (0 for the richest entity), height and width of every bar
+    '''
+    n = len(sorted_values) if counts is None else int(np.sum(counts))
+    if bins is None or n <= bins:
+        descending = (sorted_values if counts is None else np.repeat(sorted_values, counts))[::-1]
+        return np.arange(n), descending, np.ones(n)
+    edges = np.unique(np.linspace(0, n, bins + 1).astype(np.int64))
+    width = np.diff(edges)
+    return (edges[:-1] + edges[1:] - 1) / 2, np.diff(wealth_above(sorted_values, edges, counts)) / width, width
+
+
+def pareto_curve(sorted_values, max_points=None, counts=None):
+    '''
+    Cumulative percentage of the total held by the richest entities, the line of a Pareto chart.
+    Above max_points entities the curve is downsampled with largest triangle three buckets (see lttb).
+    Input:
+    -sorted_values: numpy array sorted in ascending order
+    -max_points: int, largest amount of points, None for one point per entity. Default None.
+    -counts: numpy array, amount of entities with each value, None for one each. Default None.
+             The curve is straight between the last entities of two distinct values, so with counts only these
+             points are computed and downsampled, in O(distinct values).
+    Output:
+    -rank, percentage: numpy arrays, rank of the entity (0 for the richest) and cumulative percentage up to it
+    '''
+    if counts is not None:
+        n = int(np.sum(counts))
+        if max_points is None or n <= max_points:
+            return pareto_curve(np.repeat(sorted_values, counts), max_points)
+        #the richest entity and the last entity of every distinct value from the richest
+        rank = np.concatenate([[0], np.cumsum(counts[::-1])]) - 1
+        rank[0] = 0
+        rank = np.unique(rank)
+        cumulative = wealth_above(sorted_values, rank + 1, counts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            percentage = cumulative / cumulative[-1] * 100
+        return lttb(rank, percentage, max_points)
+    cumulative = np.cumsum(sorted_values[::-1], dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percentage = cumulative / cumulative[-1] * 100 if len(cumulative) else cumulative
+    rank = np.arange(len(percentage))
+    if max_points is None or len(percentage) <= max_points:
+        return rank, percentage
+    return lttb(rank, percentage, max_points)
+
+
+def wealth_above(sorted_values, ranks, counts=None):
+    #Helper function returning the total value of the richest ranks entities for every amount in ranks
+    descending = sorted_values[::-1].astype(np.float64)
+    counts = np.ones(len(descending), dtype=np.int64) if counts is None else counts[::-1]
+    entities = np.concatenate([[0], np.cumsum(counts)])
+    cumulative = np.concatenate([[0], np.cumsum(descending * counts)])
+    #the value the last of the ranks entities belongs to, the entities before it hold cumulative[value]
+    value = np.clip(np.searchsorted(entities, ranks, side="right") - 1, 0, max(len(descending) - 1, 0))
+    return cumulative[value] + (ranks - entities[value]) * descending[value]
+
+
+def lttb(x, y, n_out):
+    '''
+    Largest triangle three buckets downsampling, keeps the points that preserve the shape of a line.
+    The first and last points are kept and every bucket in between contributes the point forming the largest
+    triangle with the point kept before it and the mean of the next bucket.
+    Input:
+    -x, y: numpy arrays, the line with x in ascending order
+    -n_out: int, amount of points kept, at least 3
+    Output:
+    -x, y: numpy arrays of the kept points
+    '''
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    x64 = x.astype(np.float64)
+    y64 = y.astype(np.float64)
+    #bucket i holds the points from bounds[i] up to bounds[i + 1], the first and last point are buckets of their own
+    bounds = np.concatenate([np.floor(np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1, [n]])
+    selected = np.zeros(n_out, dtype=np.int64)
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        next_end = bounds[bucket + 2]
+        next_x = x64[end:next_end].mean()
+        next_y = y64[end:next_end].mean()
+        area = np.abs((x64[previous] - next_x) * (y64[start:end] - y64[previous])
+                      - (x64[previous] - x64[start:end]) * (next_y - y64[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    selected[-1] = n - 1
+    return x[selected], y[selected]
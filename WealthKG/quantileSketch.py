@@ -0,0 +1,171 @@
+#Import the libraries needed
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist
+
+from .distanceMatrix import MAX_GRID_CELLS, mask_empty, to_square, sorted_cdfs, emd_pair, ks_pair
+
+#amount of classes compared at once by the row by row KS method, bounds the temporary arrays to about ROW_CHUNK * size values
+ROW_CHUNK = 65536
+
+
+class QuantileSketches:
+    '''
+    Every class summarized by the same amount of quantiles, for approximate distances between
+    many classes computed as vectorized operations on the quantile vectors.
+
+    The quantiles are taken at the levels (k + 0.5) / size with the inverted cdf definition, so
+    - EMD is approximated by the mean absolute difference of two quantile vectors (the integral of the
+      difference of the quantile functions with the midpoint rule). It is off by at most
+      (range of the first class + range of the second class) / size.
+    - KS is computed from the step cdfs of the sketches, each within 0.5 / size of the exact cdf,
+      so it is off by at most 1 / size.
+    A class without entities has a row of NaN quantiles and a NaN distance to every class, like the exact matrices.
+
+    Attributes:
+    - quantiles: numpy array. One row of size quantiles per class
+    - minimum, maximum: numpy arrays. Smallest and largest value of every class
+    - size: int. Amount of quantiles per class
+    '''
+    def __init__(self, quantiles, minimum, maximum):
+        self.quantiles = quantiles
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = quantiles.shape[1]
+
+    @classmethod
+    def from_distributions(cls, distributions, size=64):
+        '''
+        Builds the sketches of frequency distributions, in O(distinct values) per class
+        Input:
+        -distributions: list of FrequencyDistribution
+        -size: int, amount of quantiles per class. Default 64.
+        Output:
+        -QuantileSketches
+        '''
+        levels = (np.arange(size) + 0.5) / size
+        quantiles = np.full((len(distributions), size), np.nan)
+        minimum = np.full(len(distributions), np.nan)
+        maximum = np.full(len(distributions), np.nan)
+        for index, distribution in enumerate(distributions):
+            if distribution.n == 0:
+                continue
+            #smallest value whose cumulative count reaches the level
+            cumulative = np.cumsum(distribution.counts)
+            quantiles[index] = distribution.values[np.searchsorted(cumulative, levels * distribution.n, side="left")]
+            minimum[index] = distribution.values[0]
+            maximum[index] = distribution.values[-1]
+        return cls(quantiles, minimum, maximum)
+
+    @property
+    def empty(self):
+        #True for the classes without entities
+        return np.isnan(self.quantiles[:, 0]) if self.size else np.zeros(len(self.quantiles), dtype=bool)
+
+    def emd_matrix(self, condensed=False, dtype=np.float32):
+        #Approximate earth mover's distance between every pair of classes
+        result = (pdist(self.quantiles, "cityblock") / self.size).astype(dtype)
+        return result if condensed else to_square(result, self.empty)
+
+    def emd_error_bound(self, condensed=False, dtype=np.float32):
+        #Largest possible error of emd_matrix for every pair of classes
+        spread = self.maximum - self.minimum
+        i, j = np.triu_indices(len(spread), k=1)
+        result = ((spread[i] + spread[j]) / self.size).astype(dtype)
+        return result if condensed else to_square(result, self.empty)
+
+    def ks_matrix(self, condensed=False, dtype=np.float32):
+        #Approximate KS statistic between every pair of classes, off by at most ks_error_bound
+        n = len(self.quantiles)
+        empty = self.empty
+        grid = np.unique(self.quantiles[~empty])
+        if n * len(grid) <= MAX_GRID_CELLS:
+            #the step cdfs of all sketches on the shared grid, the statistic is the Chebyshev distance between two rows
+            cdfs = np.zeros((n, len(grid)), dtype=np.float64)
+            for index in np.flatnonzero(~empty):
+                cdfs[index] = np.searchsorted(self.quantiles[index], grid, side="right") / self.size
+            result = pdist(cdfs, "chebyshev").astype(dtype)
+            #the Chebyshev distance of scipy skips NaN, so the pairs of classes without entities are set here
+            mask_empty(result, empty)
+        else:
+            #one class against all the following ones at a time
+            result = np.zeros(n * (n - 1) // 2, dtype=dtype)
+            position = 0
+            for a in range(n - 1):
+                for start in range(a + 1, n, ROW_CHUNK):
+                    rows = self.quantiles[start:min(start + ROW_CHUNK, n)]
+                    result[position:position + len(rows)] = sketch_ks_distances(self.quantiles[a], rows)
+                    position += len(rows)
+        return result if condensed else to_square(result, empty)
+
+    def ks_error_bound(self):
+        #Largest possible error of ks_matrix for any pair of classes
+        return 1 / self.size
+
+    def error_report(self, distributions, sample_pairs=1000, seed=0, distances=["emd", "ks"]):
+        '''
+        Compares the approximate distances with the exact ones on a random sample of pairs
+        Input:
+        -distributions: list of FrequencyDistribution the sketches were built from
+        -sample_pairs: int, amount of pairs to compare. Default 1000.
+        -seed: int, seed of the sample. Default 0.
+        -distances: list, "emd" and/or "ks". Default both.
+        Output:
+        -pandas dataframe: one row per distance with the mean and max absolute error of the sampled pairs
+                           and the largest error bound among them
+        '''
+        #the pairs are sampled among the classes with entities
+        classes = np.flatnonzero(~self.empty)
+        if len(classes) < 2:
+            raise Exception("The error report needs at least 2 classes with entities")
+        rng = np.random.default_rng(seed)
+        i = rng.integers(0, len(classes), sample_pairs)
+        j = rng.integers(0, len(classes) - 1, sample_pairs)
+        j = np.where(j >= i, j + 1, j)
+        i, j = classes[i], classes[j]
+        cdfs = sorted_cdfs(distributions)
+
+        rows = []
+        for distance in distances:
+            if distance == "emd":
+                exact = np.array([emd_pair(cdfs[a], cdfs[b]) for a, b in zip(i, j)])
+                approximate = np.abs(self.quantiles[i] - self.quantiles[j]).sum(axis=1) / self.size
+                spread = self.maximum - self.minimum
+                bound = ((spread[i] + spread[j]) / self.size).max()
+            elif distance == "ks":
+                exact = np.array([ks_pair(cdfs[a], cdfs[b]) for a, b in zip(i, j)])
+                approximate = np.array([sketch_ks_distances(self.quantiles[a], self.quantiles[b:b + 1])[0] for a, b in zip(i, j)])
+                bound = self.ks_error_bound()
+            else:
+                raise Exception("Unknown distance {}".format(distance))
+            error = np.abs(approximate - exact)
+            rows.append({"distance": distance, "mean_error": error.mean(), "max_error": error.max(),
+                         "error_bound": bound, "pairs": sample_pairs})
+        return pd.DataFrame(rows)
+
+
+def sketch_ks_distances(quantiles, rows):
+    '''
+    KS statistic between the step cdf of one sketch and the one of every row, in a few vectorized operations.
+    Each cdf rises by 1 / size at every quantile, so the largest gap is at a quantile of one of the two sketches.
+    Input:
+    -quantiles: numpy array, one sorted sketch
+    -rows: numpy array, one sorted sketch of the same size per row
+    Output:
+    -numpy array: one statistic per row, NaN when either sketch is of a class without entities
+    '''
+    size = len(quantiles)
+    ranks = np.arange(1, size + 1)
+    #amount of row quantiles at or below each quantile of the target, from where the row quantiles fall among them
+    positions = np.searchsorted(quantiles, rows, side="left")
+    cells = (positions + (size + 1) * np.arange(len(rows))[:, None]).ravel()
+    at_target = np.bincount(cells, minlength=len(rows) * (size + 1)).reshape(len(rows), size + 1)
+    at_target = np.cumsum(at_target, axis=1)[:, :size]
+    above = (ranks - at_target).max(axis=1)
+    #amount of target quantiles at or below each quantile of the rows
+    below = (ranks - np.searchsorted(quantiles, rows, side="right")).max(axis=1)
+    result = np.maximum(np.maximum(above, below), 0) / size
+    result[np.isnan(rows[:, 0])] = np.nan
+    if np.isnan(quantiles[0]):
+        result[:] = np.nan
+    return result
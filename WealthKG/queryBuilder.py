@@ -201,6 +201,58 @@ class QueryBuilder:
 
         return query
     
+    def construct_class_count_query(self, class_property, class_uris, additional_filter_string=""):
+        '''
+        Helper function to construct a query counting the entities of multiple classes at once
+        Input:
+        -class_property: string, property for "is instance" or equivalent
+        -class_uris: list of class URIs to count
+        -additional_filter_string: string, additional filters for the entities
+
+        Output:
+        -query: string, query string returning ?class and ?count
+        '''
+        values = ""
+        for v in class_uris:
+            values += " <{}> ".format(v)
+
+        query = self.prefix_string + '''
+                SELECT ?class (COUNT(DISTINCT ?s) AS ?count) WHERE {
+                  VALUES ?class {'''+values+'''}
+                  ?s '''+class_property+''' ?class .
+                  '''+additional_filter_string+'''
+                } GROUP BY ?class
+              '''
+        return query
+
+    def construct_class_modified_query(self, class_property, class_uris, modified_property, since, additional_filter_string=""):
+        '''
+        Helper function to construct a query counting the entities of multiple classes modified after a point in time
+        Input:
+        -class_property: string, property for "is instance" or equivalent
+        -class_uris: list of class URIs to probe
+        -modified_property: string, property holding the modification date of an entity (e.g. "schema:dateModified")
+        -since: string, xsd:dateTime in ISO 8601 format (e.g. "2023-01-01T00:00:00Z")
+        -additional_filter_string: string, additional filters for the entities
+
+        Output:
+        -query: string, query string returning ?class and ?count
+        '''
+        values = ""
+        for v in class_uris:
+            values += " <{}> ".format(v)
+
+        query = self.prefix_string + '''
+                SELECT ?class (COUNT(DISTINCT ?s) AS ?count) WHERE {
+                  VALUES ?class {'''+values+'''}
+                  ?s '''+class_property+''' ?class .
+                  ?s '''+modified_property+''' ?modified .
+                  FILTER(?modified > "'''+since+'''"^^<http://www.w3.org/2001/XMLSchema#dateTime>)
+                  '''+additional_filter_string+'''
+                } GROUP BY ?class
+              '''
+        return query
+
     def construct_prefix_string(self, prefixes):
         #Helper function to create prefix string needed for queries
 
@@ -0,0 +1,124 @@
+#Import the libraries needed
+import numpy as np
+import pandas as pd
+
+from .frequencyDistribution import FrequencyDistribution
+from .quantileSketch import QuantileSketches, sketch_ks_distances
+
+#amount of classes compared at once by a query, bounds the temporary arrays to about QUERY_CHUNK * sketch size values
+QUERY_CHUNK = 65536
+
+
+class ClassSimilarityIndex:
+    '''
+    Nearest neighbour index of classes by the shape of their distribution. Every class is embedded as its
+    quantile sketch (see QuantileSketches) and a query compares one sketch with all of them in a few vectorized
+    operations, so finding the most similar classes costs O(classes * sketch size) instead of a distance matrix.
+    - "emd": approximate earth mover's distance, the mean absolute difference of two quantile vectors
+    - "ks": KS statistic between the step cdfs of two sketches, off by at most 1 / sketch_size
+    Classes can be added, replaced and removed without rebuilding the index. Classes without entities have NaN
+    distances and are never returned by query.
+
+    Attributes:
+    - distance: string. "emd" or "ks"
+    - sketch_size: int. Amount of quantiles per class
+    - transform: function applied to the values of every class before sketching (e.g. norm.cdf), None for the values
+    - keys: list. Class keys in the order of the rows
+    '''
+    def __init__(self, distance="emd", sketch_size=64, transform=None):
+        if distance not in ("emd", "ks"):
+            raise Exception("Unknown distance {}".format(distance))
+        self.distance = distance
+        self.sketch_size = sketch_size
+        self.transform = transform
+        self.keys = []
+        self.__rows = {}
+        #rows past len(keys) are spare capacity, so adding classes one by one is amortized O(sketch size)
+        self.__quantiles = np.empty((0, sketch_size), dtype=np.float64)
+
+    def add(self, distributions):
+        '''
+        Adds classes to the index, a class that is already indexed is replaced
+        Input:
+        -distributions: dictionary with class key as the key and FrequencyDistribution as value
+        '''
+        if not distributions:
+            return
+        keys = list(distributions.keys())
+        sketches = self.sketch(list(distributions.values()))
+        new = [key for key in dict.fromkeys(keys) if key not in self.__rows]
+        self.__reserve(len(self.keys) + len(new))
+        for key in new:
+            self.__rows[key] = len(self.keys)
+            self.keys.append(key)
+        for key, quantiles in zip(keys, sketches):
+            self.__quantiles[self.__rows[key]] = quantiles
+
+    def remove(self, keys):
+        #Removes classes from the index, the last row takes the place of a removed one
+        for key in keys:
+            row = self.__rows.pop(key, None)
+            if row is None:
+                continue
+            last = self.keys.pop()
+            if last != key:
+                self.keys[row] = last
+                self.__rows[last] = row
+                self.__quantiles[row] = self.__quantiles[len(self.keys)]
+
+    def sketch(self, distributions):
+        #Returns the quantile vectors of distributions, transformed like the indexed classes
+        if self.transform is not None:
+            distributions = [distribution.map(self.transform) for distribution in distributions]
+        return QuantileSketches.from_distributions(distributions, self.sketch_size).quantiles
+
+    def distances(self, target):
+        '''
+        Approximate distance from a class or distribution to every indexed class
+        Input:
+        -target: class key of an indexed class or FrequencyDistribution
+        Output:
+        -numpy array: one distance per class, in the order of keys
+        '''
+        quantiles = self.__quantiles[self.__rows[target]] if self.__is_key(target) else self.sketch([target])[0]
+        result = np.empty(len(self.keys), dtype=np.float64)
+        for start in range(0, len(self.keys), QUERY_CHUNK):
+            rows = self.__quantiles[start:min(start + QUERY_CHUNK, len(self.keys))]
+            if self.distance == "emd":
+                result[start:start + len(rows)] = np.abs(rows - quantiles).sum(axis=1) / self.sketch_size
+            else:
+                result[start:start + len(rows)] = sketch_ks_distances(quantiles, rows)
+        return result
+
+    def query(self, target, k=10, include_self=False):
+        '''
+        Finds the k classes most similar to a class or distribution
+        Input:
+        -target: class key of an indexed class or FrequencyDistribution
+        -k: int, amount of classes returned. Default 10.
+        -include_self: boolean, True to keep the target class in the result. Default False.
+        Output:
+        -pandas dataframe: class and distance, from the most to the least similar
+        '''
+        distances = self.distances(target)
+        if self.__is_key(target) and not include_self:
+            distances[self.__rows[target]] = np.inf
+        k = min(k, int(np.isfinite(distances).sum()))
+        nearest = np.argpartition(distances, k - 1)[:k] if 0 < k < len(distances) else np.flatnonzero(np.isfinite(distances))
+        nearest = nearest[np.lexsort((nearest, distances[nearest]))]
+        return pd.DataFrame({"class": [self.keys[row] for row in nearest], "distance": distances[nearest]})
+
+    def __is_key(self, target):
+        return not isinstance(target, FrequencyDistribution) and target in self.__rows
+
+    def __reserve(self, rows):
+        if rows > len(self.__quantiles):
+            grown = np.empty((max(rows, 2 * len(self.__quantiles)), self.sketch_size), dtype=np.float64)
+            grown[:len(self.keys)] = self.__quantiles[:len(self.keys)]
+            self.__quantiles = grown
+
+    def __contains__(self, key):
+        return key in self.__rows
+
+    def __len__(self):
+        return len(self.keys)
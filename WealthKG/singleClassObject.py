@@ -1,7 +1,6 @@
 #Import the libraries needed
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import matplotlib.pyplot as plt
 import math
 import kaleido
@@ -12,7 +11,13 @@ import os
 from plotly.subplots import make_subplots
 from scipy.stats import ks_2samp, norm, wasserstein_distance
 from matplotlib.ticker import PercentFormatter
-from tqdm import tqdm
+from .instrumentation import measured
+from .events import EventDispatcher
+from . import inequality
+from .frequencyDistribution import FrequencyDistribution
+from .histogramBins import histogram_edges, histogram_trace, value_range
+from .paretoCurve import pareto_bars, pareto_curve, lttb
+from .figureExport import FigureExporter
 
 class WealthKGSingleClassObject:
     '''
@@ -23,16 +28,113 @@ class WealthKGSingleClassObject:
     - distinct: Boolean. True if querying distinct properties.
     - class_filter: string. Represents the class of this analysis.
     - entity_count: int. Represents number of entities in analysis.
+    - instrumentation: Instrumentation. Records stage timings of the statistics and figures, None to disable.
+    - events: EventDispatcher. Progress bars and event callbacks
+    - distributions: dictionary with part as the key and FrequencyDistribution as value. The statistics and figures
+      of these parts are computed from the distributions, see from_distribution. Cleared when the dataframe is replaced.
     '''
-    def __init__(self, dataframe, distinct, class_filter, entity_count):
+    def __init__(self, dataframe, distinct, class_filter, entity_count, instrumentation=None, events=None, distributions=None):
+        self.__sorted = {}
         self.dataframe = dataframe
         self.distinct = distinct
         self.class_filter = class_filter
         self.entity_count = entity_count
+        self.instrumentation = instrumentation
+        self.events = events if events is not None else EventDispatcher()
+        self.distributions = distributions if distributions is not None else {}
+
+    @property
+    def dataframe(self):
+        #None for an object built from distributions, see to_dataframe
+        return self.__dataframe
+
+    @dataframe.setter
+    def dataframe(self, dataframe):
+        self.__dataframe = dataframe
+        self.__sorted = {}
+        self.distributions = {}
+
+    def to_dataframe(self):
+        '''
+        Returns the dataframe, for an object built from distributions a new one expanded from them in O(entities)
+        Output:
+        -pandas dataframe with one column per part
+        '''
+        if self.__dataframe is None and self.distributions:
+            return pd.DataFrame({part: distribution.to_values() for part, distribution in self.distributions.items()})
+        return self.__dataframe
+
+    def sorted_values(self, part):
+        '''
+        Returns the values of a part sorted in ascending order, sorted (or expanded from the distribution) once
+        and cached until the dataframe is replaced
+        Input:
+        -part: string, the column to sort (pCount, iCount or totalCount)
+        Output:
+        -numpy array with the dtype of the column
+        '''
+        if part not in self.__sorted:
+            if part in self.distributions:
+                self.__sorted[part] = self.distributions[part].to_values()
+            else:
+                self.__sorted[part] = inequality.sort_values(self.__weighted_values(part)[0])
+        return self.__sorted[part]
+
+    def __weighted_values(self, part):
+        #Helper function returning the values of a part and the amount of entities with each value, None for one each
+        if part in self.distributions:
+            return self.distributions[part].values, self.distributions[part].counts
+        if self.__dataframe is None:
+            raise Exception("Class {} only holds the distributions of {}, not {}".format(
+                self.class_filter, ", ".join(self.distributions), part))
+        return self.__dataframe[part].to_numpy(), None
   
+    @classmethod
+    def from_distribution(cls, distribution, part, class_filter, distinct=True, instrumentation=None, events=None):
+        '''
+        Builds a single class object from a frequency distribution, the entities are unnamed.
+        The distribution is kept instead of the entities, the statistics and the figures of the part are computed
+        from it in O(distinct values).
+        Input:
+        -distribution: FrequencyDistribution of the part
+        -part: string, column the distribution belongs to (pCount, iCount or totalCount)
+        -class_filter: string, class of the distribution
+        -distinct: boolean, True if the counts are distinct properties. Default True.
+        Output:
+        -WealthKGSingleClassObject: without dataframe, to_dataframe expands the values of the part
+        '''
+        return cls(None, distinct, class_filter, distribution.n, instrumentation, events, {part: distribution})
+
+    def to_distribution(self, part):
+        '''
+        Returns the frequency distribution of a part
+        Input:
+        -part: string, the column (pCount, iCount or totalCount)
+        Output:
+        -FrequencyDistribution
+        '''
+        if part in self.distributions:
+            return self.distributions[part]
+        return FrequencyDistribution.from_values(self.sorted_values(part))
+
+    @measured("statistics")
     def get_summary(self, part):
         #Returns a summary for the class based on a part
-        df = self.dataframe
+        if part in self.distributions:
+            distribution = self.distributions[part]
+            print("Q1 =", distribution.quantile(.25))
+            print("Q2/median =", distribution.quantile(.5))
+            print("Q3 =", distribution.quantile(.75))
+            print("Min = ", distribution.values[0])
+            print("Max = ", distribution.values[-1])
+            print("mode =", distribution.mode())
+            print("mean =", distribution.mean())
+            print("kurtosis =", distribution.kurtosis())
+            print("skewness =", distribution.skew())
+            print("..........")
+            print("")
+            return
+        df = pd.DataFrame({part: self.__weighted_values(part)[0]})
         print("Q1 =", df[part].quantile(.25))
         print("Q2/median =", df[part].median())
         print("Q3 =", df[part].quantile(.75))
@@ -45,85 +147,129 @@ class WealthKGSingleClassObject:
         print("..........")
         print("")
   
+    @measured("statistics")
     def gini(self, part):
         #courtesy of Nurul Srianda
         #Calculates gini value
-        arr = list(self.dataframe[part])
-        count = arr.size
-        coefficient = 2 / count
-        indexes = np.arange(1, count + 1)
-        weighted_sum = (indexes * arr).sum()
-        total = arr.sum()
-        constant = (count + 1) / count
-        return coefficient * weighted_sum / total - constant
+        if part in self.distributions:
+            return self.distributions[part].gini()
+        return inequality.gini(self.sorted_values(part))
   
+    @measured("statistics")
     def lorenz(self, part):
         #Courtesy of Nurul Srianda
-        #Calculates lorenz value
-        arr = list(self.dataframe[part])
-        # this divides the prefix sum by the total sum
-        # this ensures all the values are between 0 and 1.0
-        scaled_prefix_sum = arr.cumsum() / arr.sum()
-        # this prepends the 0 value (because 0% of all people have 0% of all wealth)
-        return np.insert(scaled_prefix_sum, 0, 0)
+        #Calculates lorenz value, the share of all properties owned by the poorest entities starting at 0
+        return inequality.lorenz(self.sorted_values(part))
   
+    @measured("statistics")
     def palma(self, part):
         #Courtesy of Nurul Srianda
         #Calculates palma value
-        lorenz_arr = self.lorenz(part)
-        return (1 - np.quantile(lorenz_arr, 0.9)) / np.quantile(lorenz_arr, 0.4)
+        if part in self.distributions:
+            return self.distributions[part].palma()
+        return inequality.palma(self.sorted_values(part))
+
+    @measured("statistics")
+    def top_share(self, part, k):
+        #Calculates the share of all properties owned by the richest k (e.g. 0.1) of the entities
+        if part in self.distributions:
+            return self.distributions[part].top_share(k)
+        return inequality.top_share(self.sorted_values(part), k)
+
+    @measured("statistics")
+    def get_concentration_metrics(self, part, metrics=None, atkinson_epsilon=0.5):
+        '''
+        Calculates concentration metrics in one pass over the sorted values
+        Input:
+        -part: string, the column (pCount, iCount or totalCount)
+        -metrics: list, any of "gini", "palma", "top_1_share", "top_10_share", "pareto_point", "theil",
+                  "atkinson", "hoover" and "herfindahl", None for all. Default None.
+        -atkinson_epsilon: float, inequality aversion of the atkinson index. Default 0.5.
+        Output:
+        -dict with metric as the key and its value
+        '''
+        if part in self.distributions:
+            return self.distributions[part].concentration(metrics, atkinson_epsilon)
+        return inequality.concentration(self.sorted_values(part), metrics, atkinson_epsilon=atkinson_epsilon)
     
-    def get_histogram(self, part):
-        #Returns a plotly histogram for a part
-        #Input: part: string, which column to visualize
-        #Output: plotly histogram
+    @measured("figure_build")
+    def get_histogram(self, part, bins=50, scale="linear"):
+        #Returns a plotly histogram for a part, binned with NumPy so the figure holds one bar per bin instead of every entity
+        #Input: part: string, which column to visualize, any other value for the three columns in one figure
+        #       bins: int, largest amount of bins. Default 50.
+        #       scale: string, "linear" for bins of the same width, "log" for bins growing geometrically. Default "linear".
+        #Output: plotly figure
         height = 500
         width = 800
-        if part == "iCount":
-            fig = px.histogram(self.dataframe, x='iCount', title = "Incoming Properties")
-        elif part == "pCount":
-            fig = px.histogram(self.dataframe, x='pCount', title = "Outgoing Properties")
-        elif part =="totalCount":
-            fig = px.histogram(self.dataframe, x='totalCount', title="Total Properties" )
+        titles = {"iCount": "Incoming Properties", "pCount": "Outgoing Properties", "totalCount": "Total Properties"}
+        if part in titles:
+            #the distinct values of a distribution are weighted by their amount of entities
+            values, weights = self.__weighted_values(part)
+            edges = histogram_edges([value_range(values)], bins, scale, integer=values.dtype.kind in "iub")
+            fig = go.Figure(histogram_trace(values, edges, scale, weights=weights))
+            fig.update_layout(xaxis_title=titles[part], yaxis_title="count", bargap=0)
         else:
+            columns = ["iCount", "pCount", "totalCount"]
+            if self.__dataframe is None:
+                #an object built from distributions draws the parts it holds
+                columns = [column for column in columns if column in self.distributions]
+            subplot_titles = {"iCount": "Incoming Properties", "pCount": "Outgoing Properties", "totalCount": "All Properties"}
+            weighted = [self.__weighted_values(column) for column in columns]
+            ranges = [value_range(values) for values, _ in weighted]
+            #the bin size follows the largest total, or the largest value of the parts held
+            largest = ranges[columns.index("totalCount")] if "totalCount" in columns else \
+                max([r for r in ranges if r is not None], key=lambda r: r[1], default=None)
+            largest = largest[1] if largest is not None else 0
             bin_size = 5
-            if self.dataframe['totalCount'].max() > 100:
+            if largest > 100:
                 bin_size = 10
-            if self.dataframe['totalCount'].max() < 20:
+            if largest < 20:
                 bin_size = 19
-            fig = make_subplots(rows=3, cols=1,  subplot_titles=['Incoming Properties', 'Outgoing Properties', 'All Properties'])
-            fig.add_trace(go.Histogram(x=self.dataframe.iCount, xbins={'size':bin_size}), row=1, col=1)
-            fig.add_trace(go.Histogram(x=self.dataframe.pCount, xbins={'size':bin_size}), row=2, col=1)
-            fig.add_trace(go.Histogram(x=self.dataframe.totalCount, xbins={'size':bin_size}), row=3, col=1)
-            height = 900
+            #the histograms share their bins
+            integer = all(values.dtype.kind in "iub" for values, _ in weighted)
+            edges = histogram_edges(ranges, bins, scale, width=bin_size if scale == "linear" else None, integer=integer)
+            fig = make_subplots(rows=len(columns), cols=1, subplot_titles=[subplot_titles[column] for column in columns])
+            for row, (values, weights) in enumerate(weighted):
+                fig.add_trace(histogram_trace(values, edges, scale, weights=weights), row=row + 1, col=1)
+            fig.update_layout(bargap=0)
+            height = max(500, 300 * len(columns))
             width = 800
 
         fig.update_layout(height=height, width=width, title_text="Class Filters: {}".format(self.class_filter), showlegend=False)
 
         return fig
   
-    def get_pareto_chart(self, part):
+    @measured("figure_build")
+    def get_pareto_chart(self, part, max_points=500):
         #Courtesy of Nurul Srianda
         ### This function plots the Pareto chart of a given a class based on a part
         ### INPUT: part: string, which column to visualize
+        ###        max_points: int, above this amount of entities the bars are bins of entities by rank and the
+        ###                    cumulative line is downsampled to max_points points (see paretoCurve). None for every entity. Default 500.
         ### OUTPUT: Pareto chart
         ### source = https://stackoverflow.com/questions/62287001/how-to-overlay-two-plots-in-same-figure-in-plotly-create-pareto-chart-in-plotl
-        df = self.dataframe
-        df_sorted = df.sort_values(by=part, ascending=False)
-        df_sorted.reset_index(inplace=True)
-        df_sorted['cumperc'] = df_sorted[part].cumsum()/df_sorted[part].sum()*100
+        if part in self.distributions:
+            #built from the distinct values and their amount of entities
+            distribution = self.distributions[part]
+            bar_rank, bar_value, bar_width = pareto_bars(distribution.values, max_points, distribution.counts)
+            curve_rank, curve_percentage = pareto_curve(distribution.values, max_points, distribution.counts)
+        else:
+            sorted_values = self.sorted_values(part)
+            bar_rank, bar_value, bar_width = pareto_bars(sorted_values, max_points)
+            curve_rank, curve_percentage = pareto_curve(sorted_values, max_points)
 
         trace1 = go.Bar(
-          x=df_sorted.index,
-          y=df_sorted[part],
+          x=bar_rank,
+          y=bar_value,
+          width=bar_width,
           name='Property Count',
           marker=dict(
               color='rgb(34,163,192)'
                     )
         )
         trace2 = go.Scatter(
-            x=df_sorted.index,
-            y=df_sorted['cumperc'],
+            x=curve_rank,
+            y=curve_percentage,
             name='Cumulative Percentage',
             yaxis='y2'
 
@@ -136,4 +282,57 @@ class WealthKGSingleClassObject:
               tickangle=-90
             ))
 
-        return fig
\ No newline at end of file
+        return fig
+
+    @measured("figure_build")
+    def get_lorenz_curve(self, part, max_points=500):
+        #Returns a plotly figure of the lorenz curve of a part next to the line of perfect equality
+        #Input: part: string, which column to visualize
+        #       max_points: int, above this amount of entities the curve is downsampled with LTTB (see paretoCurve.lttb),
+        #                   None for every entity. Default 500.
+        #Output: plotly figure
+        if part in self.distributions:
+            #the curve is a straight line between the ends of the distinct values
+            population, share = self.distributions[part].lorenz()
+        else:
+            share = self.lorenz(part)
+            population = np.linspace(0, 1, len(share))
+        if max_points is not None:
+            population, share = lttb(population, share, max_points)
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=population, y=share, name='Lorenz Curve'))
+        fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], name='Perfect Equality', line=dict(dash='dash')))
+        fig.update_layout(height=700, width=700, title_text="Class Filters: {}".format(self.class_filter),
+                          xaxis_title="Share of Entities", yaxis_title="Share of Properties")
+        return fig
+
+    def export_figures(self, location, figures=None, parts=None, format="png",
+                       workers=4, exporter=None):
+        '''
+        This function renders figures of the class into image files, in parallel through one kaleido browser
+        Input:
+        -location: string, folder of the images, one file per figure and part named <class>_<figure>_<part>
+        -figures: list, any of "histogram", "pareto" and "lorenz", None for all. Default None.
+        -parts: list, columns to draw (pCount, iCount or totalCount), None for ["pCount"]. Default None.
+        -format: string, "png", "svg", "jpeg", "webp" or "pdf". Default "png".
+        -workers: int, amount of figures rendered at the same time. Default 4.
+        -exporter: FigureExporter, e.g. one opened with "with" to reuse its browser for several exports,
+                   its format and workers are used instead. Default None.
+        Output:
+        -list of the paths written
+        '''
+        builders = {"histogram": self.get_histogram, "pareto": self.get_pareto_chart, "lorenz": self.get_lorenz_curve}
+        figures = list(builders) if figures is None else figures
+        parts = ["pCount"] if parts is None else parts
+        for figure in figures:
+            if figure not in builders:
+                raise Exception("Unknown figure {}".format(figure))
+
+        def generate():
+            for part in parts:
+                for figure in figures:
+                    yield "{}_{}_{}".format(self.class_filter, figure, part), builders[figure](part)
+
+        exporter = exporter if exporter is not None else FigureExporter(workers, format)
+        return exporter.export(generate(), location)
@@ -0,0 +1,266 @@
+#Import the libraries needed
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from .distanceMatrix import MAX_GRID_SIZE, MAX_GRID_CELLS, condensed_index, emd_pair, ks_pair
+
+#inputs of the tile workers, the arrays themselves in the parent and views on the shared memory in the pool
+_inputs = {}
+#shared memory blocks attached by a worker, kept open while the views are in use
+_shared = []
+
+
+class TiledDistanceMatrix:
+    '''
+    EMD or KS matrix computed tile by tile into a memory mapped .npy file, for more classes than fit in memory.
+    The tiles cover the upper triangle and run in a process pool that reads the class distributions from
+    shared memory, every worker writes its tiles straight into the file. A finished tile is journaled after
+    it is flushed to disk, so a computation that is killed is resumed by running it again with the same directory.
+
+    Layout of the directory:
+    - manifest.json: fingerprint of the matrix (classes, distance, layout and tile size)
+    - journal.jsonl: one line per finished tile
+    - matrix.npy: the square matrix or the condensed upper triangle in the format of scipy's pdist
+
+    Attributes:
+    - directory: string. Location of the matrix
+    - n: int. Amount of classes
+    - distance: string. "emd" or "ks"
+    - condensed: boolean. True for the condensed upper triangle, False for the square matrix
+    - tile_size: int. Amount of rows and columns of a tile
+    - fingerprint: string. Hash of the layout and of the json fingerprint given by the caller (e.g. the class keys)
+    - done: set. Finished tiles as (row start, column start)
+    '''
+    def __init__(self, directory, n, distance="emd", condensed=True, tile_size=1024, dtype=np.float32, fingerprint=None):
+        if distance not in ("emd", "ks"):
+            raise Exception("Unknown distance {}".format(distance))
+        self.directory = directory
+        self.n = n
+        self.distance = distance
+        self.condensed = condensed
+        self.tile_size = tile_size
+        self.dtype = np.dtype(dtype)
+        self.fingerprint = hashlib.sha256(json.dumps({"n": n, "distance": distance, "condensed": condensed,
+                                                      "tile_size": tile_size, "dtype": self.dtype.str,
+                                                      "fingerprint": fingerprint}, sort_keys=True).encode()).hexdigest()
+        self.done = set()
+
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.__read_manifest()
+        if manifest is not None and os.path.exists(self.matrix_file):
+            if manifest["fingerprint"] != self.fingerprint:
+                raise Exception("Distance matrix at {} belongs to different classes or parameters".format(directory))
+            self.__replay_journal()
+        else:
+            shape = (n * (n - 1) // 2,) if condensed else (n, n)
+            np.lib.format.open_memmap(self.matrix_file, mode="w+", dtype=self.dtype, shape=shape).flush()
+            if os.path.exists(self.__journal_file()):
+                os.remove(self.__journal_file())
+            self.__write_manifest()
+
+    @property
+    def matrix_file(self):
+        return os.path.join(self.directory, "matrix.npy")
+
+    def tiles(self):
+        #Returns every tile of the upper triangle as (row start, column start)
+        starts = range(0, self.n, self.tile_size)
+        return [(row, column) for row in starts for column in starts if column >= row]
+
+    def pending(self):
+        return [tile for tile in self.tiles() if tile not in self.done]
+
+    def compute(self, distributions, processes=None, method="auto", progress=None, on_tile=None):
+        '''
+        Computes the tiles that are not finished yet
+        Input:
+        -distributions: list of FrequencyDistribution in the order of the matrix, see distanceMatrix.class_distributions
+        -processes: int, amount of worker processes, 1 to compute in this process, None for the executor default. Default None.
+        -method: string, "grid", "merge" or "auto", see distanceMatrix.emd_matrix. Default "auto".
+        -progress: function wrapping the loop over the tiles (e.g. EventDispatcher.progress). Default None.
+        -on_tile: function called with every finished tile, its position and the amount of tiles. Default None.
+        Output:
+        -numpy memmap: the read only matrix
+        '''
+        if len(distributions) != self.n:
+            raise Exception("Expected {} distributions, got {}".format(self.n, len(distributions)))
+        pending = self.pending()
+        if pending:
+            arrays = _pack(distributions)
+            if method == "auto":
+                grid_size = len(arrays["support"])
+                method = "grid" if grid_size <= MAX_GRID_SIZE and 2 * self.tile_size * grid_size <= MAX_GRID_CELLS else "merge"
+            task = (self.matrix_file, self.distance, self.condensed, method, self.tile_size)
+            total = len(pending)
+            finished = self.__finished_tiles(pending, arrays, task, processes)
+            finished = finished if progress is None else progress(finished, total=total)
+            for index, tile in enumerate(finished):
+                self.__append_journal(tile)
+                self.done.add(tile)
+                if on_tile is not None:
+                    on_tile(tile, index, total)
+        return self.open()
+
+    def open(self, mode="r"):
+        #Returns the matrix as a memory mapped numpy array
+        return np.load(self.matrix_file, mmap_mode=mode)
+
+    def status(self):
+        #Returns the amount of finished and pending tiles
+        return {"done": len(self.done), "pending": len(self.tiles()) - len(self.done)}
+
+    def __finished_tiles(self, pending, arrays, task, processes):
+        #Helper function yielding the tiles as they finish, in this process or in a pool over shared memory
+        if processes == 1:
+            _inputs.update(arrays)
+            try:
+                for tile in pending:
+                    yield _compute_tile(tile, *task)
+            finally:
+                _inputs.clear()
+            return
+
+        blocks = []
+        try:
+            layout = {}
+            for name, array in arrays.items():
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+                layout[name] = (block.name, array.shape, array.dtype.str)
+            with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=(layout,)) as pool:
+                futures = [pool.submit(_compute_tile, tile, *task) for tile in pending]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def __journal_file(self):
+        return os.path.join(self.directory, "journal.jsonl")
+
+    def __read_manifest(self):
+        fullname = os.path.join(self.directory, "manifest.json")
+        if not os.path.exists(fullname):
+            return None
+        with open(fullname) as f:
+            return json.load(f)
+
+    def __write_manifest(self):
+        #Atomically rewrites manifest.json
+        manifest = {"fingerprint": self.fingerprint, "n": self.n, "distance": self.distance,
+                    "condensed": self.condensed, "tile_size": self.tile_size, "dtype": self.dtype.str}
+        fullname = os.path.join(self.directory, "manifest.json")
+        with open(fullname + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(fullname + ".tmp", fullname)
+
+    def __append_journal(self, tile):
+        with open(self.__journal_file(), "a") as f:
+            f.write(json.dumps({"row": tile[0], "column": tile[1]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __replay_journal(self):
+        #Rebuilds done from the journal, a line torn by a crash is ignored
+        if not os.path.exists(self.__journal_file()):
+            return
+        with open(self.__journal_file()) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.done.add((entry["row"], entry["column"]))
+
+
+def _pack(distributions):
+    #Helper function storing the sorted values and cdfs of every distribution in flat arrays
+    value_offsets = np.zeros(len(distributions) + 1, dtype=np.int64)
+    np.cumsum([len(d.values) for d in distributions], out=value_offsets[1:])
+    values = np.concatenate([d.values.astype(np.float64) for d in distributions]) if distributions else np.zeros(0)
+    #every cdf starts with 0, so it is one longer than the values
+    cdfs = np.concatenate([np.concatenate([[0], np.cumsum(d.counts) / d.n]) for d in distributions]) if distributions else np.zeros(0)
+    return {"values": values, "cdfs": cdfs, "value_offsets": value_offsets, "support": np.unique(values)}
+
+
+def _attach(layout):
+    #Helper function run once in every worker, maps the shared memory blocks as numpy arrays
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared.append(block)
+        _inputs[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def _distribution(index):
+    #Helper function returning the sorted values and the cdf of a distribution, as in distanceMatrix.sorted_cdfs
+    start, end = _inputs["value_offsets"][index], _inputs["value_offsets"][index + 1]
+    return _inputs["values"][start:end], _inputs["cdfs"][start + index:end + index + 1]
+
+
+def _grid_cdfs(indices, distance):
+    #Helper function for the cdfs of several distributions on the shared support, see distanceMatrix._pairwise
+    support = _inputs["support"]
+    result = np.empty((len(indices), max(len(support) - 1, 0)), dtype=np.float64)
+    for position, index in enumerate(indices):
+        values, cdf = _distribution(index)
+        result[position] = cdf[np.searchsorted(values, support[:-1], side="right")]
+    if distance == "emd":
+        result *= np.diff(support)
+    return result
+
+
+def _compute_tile(tile, matrix_file, distance, condensed, method, tile_size):
+    #Helper function computing one tile and writing it into the matrix file, returns the tile once it is on disk
+    n = len(_inputs["value_offsets"]) - 1
+    rows = np.arange(tile[0], min(tile[0] + tile_size, n))
+    columns = np.arange(tile[1], min(tile[1] + tile_size, n))
+
+    if method == "grid":
+        metric = "cityblock" if distance == "emd" else "chebyshev"
+        row_cdfs = _grid_cdfs(rows, distance)
+        column_cdfs = row_cdfs if tile[0] == tile[1] else _grid_cdfs(columns, distance)
+        block = cdist(row_cdfs, column_cdfs, metric) if row_cdfs.shape[1] else np.zeros((len(rows), len(columns)))
+    elif method == "merge":
+        kernel = emd_pair if distance == "emd" else ks_pair
+        block = np.zeros((len(rows), len(columns)))
+        for a, i in enumerate(rows):
+            for b, j in enumerate(columns):
+                if j > i:
+                    block[a, b] = kernel(_distribution(i), _distribution(j))
+    else:
+        raise Exception("Unknown distance method {}".format(method))
+    #classes without entities have no values and a NaN distance to every class, like distanceMatrix.mask_empty
+    empty = np.diff(_inputs["value_offsets"]) == 0
+    block[empty[rows], :] = np.nan
+    block[:, empty[columns]] = np.nan
+
+    matrix = np.load(matrix_file, mmap_mode="r+")
+    if condensed:
+        #the pairs i < j of a row of the tile are next to each other in the condensed matrix
+        for a, i in enumerate(rows):
+            first = max(tile[1], i + 1)
+            if first < columns[-1] + 1:
+                start = condensed_index(n, i, first)
+                matrix[start:start + columns[-1] + 1 - first] = block[a, first - tile[1]:]
+    else:
+        if tile[0] == tile[1]:
+            block = np.triu(block, 1)
+            block = block + block.T
+            #the diagonal of an empty class is NaN too, like distanceMatrix.to_square
+            diagonal = np.flatnonzero(empty[rows])
+            block[diagonal, diagonal] = np.nan
+        matrix[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1] = block
+        matrix[columns[0]:columns[-1] + 1, rows[0]:rows[-1] + 1] = block.T
+    matrix.flush()
+    del matrix
+    return tile
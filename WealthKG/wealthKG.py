@@ -2,15 +2,20 @@
 import pandas as pd
 import math
 import time
-from tqdm import tqdm
 import requests
 import validators
 import glob
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from .multiClassObject import WealthKGMultiClassObject
 from .singleClassObject import WealthKGSingleClassObject
 from .queryBuilder import QueryBuilder
+from .instrumentation import instrument
+from .events import EventDispatcher
+from .checkpoint import CrawlCheckpoint
+from .columnarStore import ClassDictOverlay, LazyClassDict, detect_format, read_class_csv
+
 
 class WealthKG:
     '''
@@ -19,15 +24,19 @@ class WealthKG:
     Attributes:
     - sparql_endpoint: string. Endpoint for SPARQL server
     - query_builder: QueryBuilder. Object for constructing queries
+    - instrumentation: Instrumentation. Records stage timings of the queries and the result objects, None to disable.
+    - events: EventDispatcher. Progress bars and event callbacks, shared with the result objects
     '''
 
-    def __init__(self, sparql_endpoint, prefixes = []):
+    def __init__(self, sparql_endpoint, prefixes = [], instrumentation=None, events=None, quiet=False):
         if validators.url(sparql_endpoint):
             self.sparql_endpoint = sparql_endpoint
         else:
             raise Exception("URL not valid")
         
         self.__query_builder = QueryBuilder(prefixes)
+        self.instrumentation = instrumentation
+        self.events = events if events is not None else EventDispatcher(quiet=quiet)
   
     def single_class_query(self, class_filters, additional_filters=[], distinct=True, limit=10000):
         '''
@@ -43,84 +52,106 @@ class WealthKG:
         -WealthKGSingleClassObject: Object for the results of the query
         '''
 
-        filter_string = self.__query_builder.construct_filter_string(class_filters)
-        out_filters = [x for x in additional_filters if "?p" in x] + [x for x in additional_filters if "?s" in x]
-        in_filters = [x for x in additional_filters if "?i" in x] + [x for x in additional_filters if "?s" in x]
-        additional_filter_string_out = self.__query_builder.construct_additional_filter_string(out_filters)
-        additional_filter_string_in = self.__query_builder.construct_additional_filter_string(in_filters)
+        with instrument(self.instrumentation, "query_build"):
+            filter_string = self.__query_builder.construct_filter_string(class_filters)
+            out_filters = [x for x in additional_filters if "?p" in x] + [x for x in additional_filters if "?s" in x]
+            in_filters = [x for x in additional_filters if "?i" in x] + [x for x in additional_filters if "?s" in x]
+            additional_filter_string_out = self.__query_builder.construct_additional_filter_string(out_filters)
+            additional_filter_string_in = self.__query_builder.construct_additional_filter_string(in_filters)
             
         if limit <= 10000 or "dbpedia" in self.sparql_endpoint:
-            query_string_outgoing = self.__query_builder.construct_query_outgoing(filter_string, additional_filter_string_out, limit, distinct)
-            query_string_incoming = self.__query_builder.construct_query_incoming(filter_string, additional_filter_string_in, limit, distinct)
+            with instrument(self.instrumentation, "query_build"):
+                query_string_outgoing = self.__query_builder.construct_query_outgoing(filter_string, additional_filter_string_out, limit, distinct)
+                query_string_incoming = self.__query_builder.construct_query_incoming(filter_string, additional_filter_string_in, limit, distinct)
 
             df = self.__construct_df_outgoing_incoming(query_string_outgoing, query_string_incoming)
 
-            return WealthKGSingleClassObject(df, distinct, filter_string, len(df))
+            return WealthKGSingleClassObject(df, distinct, filter_string, len(df), self.instrumentation, self.events)
 
 
         #If more than 10000 construct the query in a different way
         else:
-            entity_additional_filter = [x for x in additional_filters if "?s" in x]
-            entity_additional_filter_string = self.__query_builder.construct_additional_filter_string(entity_additional_filter)
-            sample_query = self.__query_builder.construct_sample_entities_query(filter_string, entity_additional_filter_string, limit)
+            with instrument(self.instrumentation, "query_build"):
+                entity_additional_filter = [x for x in additional_filters if "?s" in x]
+                entity_additional_filter_string = self.__query_builder.construct_additional_filter_string(entity_additional_filter)
+                sample_query = self.__query_builder.construct_sample_entities_query(filter_string, entity_additional_filter_string, limit)
             entities_list = self.__get_entities_list(sample_query)
 
             df = self.__construct_batch_df(filter_string, entities_list, additional_filters, distinct)
-            return WealthKGSingleClassObject(df, distinct, filter_string, len(df))
+            return WealthKGSingleClassObject(df, distinct, filter_string, len(df), self.instrumentation, self.events)
 
   
   
-    def __construct_df_outgoing_incoming(self, query_out, query_in):
+    def __construct_df_outgoing_incoming(self, query_out, query_in, class_key=None, batch=None):
         '''
         Helper function to call endpoint and create df from results
         Input:
         -query_out: string, query string for outgoing properties
         -query_in: string, query string for incoming properties
+        -class_key: string, class the queries belong to, used for instrumentation. Default None.
+        -batch: int, batch the queries belong to, used for instrumentation. Default None.
         Output:
         -result_df: pandas dataframe, dataframe for query result ordered from total properties
         '''
         url = self.sparql_endpoint
 
         
-        out_r = requests.post(url, data = {'format': 'json', 'query': query_out})
-        outdata = out_r.json()
-        outdf = pd.DataFrame.from_dict(outdata['results']['bindings'])
-
-        try:
-            outdf['s'] = outdf['s'].apply(self.__getValue)
-            outdf['pCount'] = outdf['pCount'].apply(self.__getValue)
-            outdf = outdf.astype({"pCount": int})
-        except:
-            outdf['s'] = []
-            outdf['pCount'] = []
-
-        in_r = requests.post(url, data = {'format': 'json', 'query': query_in})
-        indata = in_r.json()
-        indf = pd.DataFrame.from_dict(indata['results']['bindings'])
-
-        try:
-            indf['s'] = indf['s'].apply(self.__getValue)
-            indf['iCount'] = indf['iCount'].apply(self.__getValue)
-            indf = indf.astype({"iCount": int})
-        except:
-            indf['s'] = []
-            indf['iCount'] = []
-
-        resultdf = pd.merge(
-                    outdf,
-                    indf,
-                    how="left",
-                    on="s",
-                    left_index=False,
-                    right_index=False,
-                    suffixes=("_x", "_y"),
-                    copy=True,
-                )
-        resultdf.fillna(0, inplace=True)
-
-        resultdf["totalCount"] = resultdf["pCount"] + resultdf["iCount"]
-
-        return resultdf.sort_values(by='totalCount', ascending=False).reset_index(drop=True)
+        with instrument(self.instrumentation, "http_wait", class_key, batch) as record:
+            out_r = requests.post(url, data = {'format': 'json', 'query': query_out})
+            record["bytes_out"] = len(query_out)
+            record["bytes_in"] = len(out_r.content)
+        self.events.emit("bytes_received", "outgoing", **{"class": class_key, "batch": batch, "bytes": len(out_r.content)})
+
+        with instrument(self.instrumentation, "decode", class_key, batch) as record:
+            outdata = out_r.json()
+            outdf = pd.DataFrame.from_dict(outdata['results']['bindings'])
+
+            try:
+                outdf['s'] = outdf['s'].apply(self.__getValue)
+                outdf['pCount'] = outdf['pCount'].apply(self.__getValue)
+                outdf = outdf.astype({"pCount": int})
+            except:
+                outdf['s'] = []
+                outdf['pCount'] = []
+            record["rows"] = len(outdf)
+
+        with instrument(self.instrumentation, "http_wait", class_key, batch) as record:
+            in_r = requests.post(url, data = {'format': 'json', 'query': query_in})
+            record["bytes_out"] = len(query_in)
+            record["bytes_in"] = len(in_r.content)
+        self.events.emit("bytes_received", "incoming", **{"class": class_key, "batch": batch, "bytes": len(in_r.content)})
+
+        with instrument(self.instrumentation, "decode", class_key, batch) as record:
+            indata = in_r.json()
+            indf = pd.DataFrame.from_dict(indata['results']['bindings'])
+
+            try:
+                indf['s'] = indf['s'].apply(self.__getValue)
+                indf['iCount'] = indf['iCount'].apply(self.__getValue)
+                indf = indf.astype({"iCount": int})
+            except:
+                indf['s'] = []
+                indf['iCount'] = []
+            record["rows"] = len(indf)
+
+        with instrument(self.instrumentation, "merge", class_key, batch) as record:
+            resultdf = pd.merge(
+                        outdf,
+                        indf,
+                        how="left",
+                        on="s",
+                        left_index=False,
+                        right_index=False,
+                        suffixes=("_x", "_y"),
+                        copy=True,
+                    )
+            resultdf.fillna(0, inplace=True)
+
+            resultdf["totalCount"] = resultdf["pCount"] + resultdf["iCount"]
+            record["rows"] = len(resultdf)
+
+        with instrument(self.instrumentation, "sort", class_key, batch):
+            return resultdf.sort_values(by='totalCount', ascending=False).reset_index(drop=True)
 
     def __construct_batch_df(self, filter_string, values_list, additional_filters, distinct):
         '''
@@ -151,34 +182,47 @@ class WealthKG:
             df = pd.DataFrame(df_dict)
             return df
 
-        for i in tqdm(range(0,upperRange,10000)):
-            while True:
-                try:
-                    lower = i
-                    upper = i+10000
-                    if upper >= upperRange:
-                        upper = upperRange-1
-
-                    query_out = self.__query_builder.construct_batch_query_outgoing(filter_string, values_list[lower:upper], additional_filter_string_out, distinct)
-
-                    query_in = self.__query_builder.construct_batch_query_incoming(filter_string, values_list[lower:upper], additional_filter_string_in, distinct)
-
-                    df = self.__construct_df_outgoing_incoming(query_out, query_in)
-
-                    entities += list(df['s'])
-                    pCount += list(df['pCount'])
-                    iCount += list(df['iCount'])
-                    totalCount += list(df['totalCount'])
-
-                except:
-                    time.sleep(2)
-                    continue
-                break 
-
-        df_dict = {"entity":entities, "pCount":pCount, "iCount":iCount, "totalCount":totalCount}
-        df = pd.DataFrame(df_dict)
-        df.drop_duplicates(keep='first', inplace=True)
-        return df.sort_values(by='totalCount', ascending=False).reset_index(drop=True)
+        for i in self.events.progress(range(0,upperRange,10000)):
+            batch = i // 10000
+            retries = 0
+            self.events.emit("batch_started", "batch", batch=batch, size=min(10000, upperRange - i))
+            with instrument(self.instrumentation, "batch", batch=batch) as batch_record:
+                while True:
+                    try:
+                        lower = i
+                        upper = i+10000
+                        if upper >= upperRange:
+                            upper = upperRange-1
+
+                        with instrument(self.instrumentation, "query_build", batch=batch):
+                            query_out = self.__query_builder.construct_batch_query_outgoing(filter_string, values_list[lower:upper], additional_filter_string_out, distinct)
+
+                            query_in = self.__query_builder.construct_batch_query_incoming(filter_string, values_list[lower:upper], additional_filter_string_in, distinct)
+
+                        df = self.__construct_df_outgoing_incoming(query_out, query_in, batch=batch)
+
+                        entities += list(df['s'])
+                        pCount += list(df['pCount'])
+                        iCount += list(df['iCount'])
+                        totalCount += list(df['totalCount'])
+
+                    except Exception as e:
+                        retries += 1
+                        batch_record["retries"] = retries
+                        self.events.emit("retry", "batch", **{"class": None, "batch": batch, "attempt": retries, "error": repr(e)})
+                        time.sleep(2)
+                        continue
+                    batch_record["rows"] = len(df)
+                    break 
+            self.events.emit("batch_finished", "batch", batch=batch, rows=len(df), retries=retries)
+
+        with instrument(self.instrumentation, "merge") as record:
+            df_dict = {"entity":entities, "pCount":pCount, "iCount":iCount, "totalCount":totalCount}
+            df = pd.DataFrame(df_dict)
+            df.drop_duplicates(keep='first', inplace=True)
+            record["rows"] = len(df)
+        with instrument(self.instrumentation, "sort"):
+            return df.sort_values(by='totalCount', ascending=False).reset_index(drop=True)
   
 
     def __get_entities_list(self, query):
@@ -192,18 +236,25 @@ class WealthKG:
         '''
         
         url = self.sparql_endpoint
-        r = requests.get(url, params = {'format': 'json', 'query': query})
-        data = r.json()
-        
-        try:
-            df = pd.DataFrame.from_dict(data['results']['bindings'])
-            df['s'] = df['s'].apply(self.__getValue)
-        except:
-            return []
+        with instrument(self.instrumentation, "http_wait") as record:
+            r = requests.get(url, params = {'format': 'json', 'query': query})
+            record["bytes_out"] = len(query)
+            record["bytes_in"] = len(r.content)
 
-        return list(df['s'])
+        with instrument(self.instrumentation, "decode") as record:
+            data = r.json()
+        
+            try:
+                df = pd.DataFrame.from_dict(data['results']['bindings'])
+                df['s'] = df['s'].apply(self.__getValue)
+            except:
+                return []
+
+            record["rows"] = len(df)
+            return list(df['s'])
   
-    def multiclass_query(self, class_property, class_identifier, class_additional_filters, additional_filters, class_limit=0, distinct=False, limit=10000):
+    def multiclass_query(self, class_property, class_identifier, class_additional_filters, additional_filters, class_limit=0, distinct=False, limit=10000,
+                         checkpoint_dir=None, max_retries=None):
         '''
         This function is for querying multiple class in a knowledge graph
         Input:
@@ -213,26 +264,46 @@ class WealthKG:
         -additional_filters: string, additional filter for querying each class
         -distinct: boolean. True for distinct queries, false for normal queries. Default False.
         -limit: int. Maximum ammount of entities to be queried. Default 10 thousand.
+        -checkpoint_dir: string, directory where every finished class is saved as it completes. Running the same query
+                         with the same directory resumes the crawl and skips the finished classes. Default None.
+        -max_retries: int, retries before a class is given up and marked as failed, None to retry forever. Default None.
         
         Output:
         -WealthKGMultiClassObject: Object for the results of the query
         '''
-        class_add_string = self.__query_builder.construct_additional_filter_string(class_additional_filters)
-        class_query = self.__query_builder.construct_get_all_classes_query(class_property, 
-                                                                           class_identifier, 
-                                                                           class_add_string,
-                                                                           class_limit)
+        checkpoint = None
+        if checkpoint_dir is not None:
+            fingerprint = CrawlCheckpoint.query_fingerprint(sparql_endpoint=self.sparql_endpoint, class_property=class_property,
+                                                            class_identifier=class_identifier, class_additional_filters=class_additional_filters,
+                                                            additional_filters=additional_filters, class_limit=class_limit,
+                                                            distinct=distinct, limit=limit)
+            checkpoint = CrawlCheckpoint(checkpoint_dir, fingerprint)
+
+        if checkpoint is not None and checkpoint.class_list is not None:
+            #a resumed crawl keeps the class list it started with
+            class_df = pd.DataFrame({'class': checkpoint.class_list})
+        else:
+            with instrument(self.instrumentation, "query_build"):
+                class_add_string = self.__query_builder.construct_additional_filter_string(class_additional_filters)
+                class_query = self.__query_builder.construct_get_all_classes_query(class_property, 
+                                                                                   class_identifier, 
+                                                                                   class_add_string,
+                                                                                   class_limit)
 
-        class_df = self.__construct_all_classes_df(class_query)
+            class_df = self.__construct_all_classes_df(class_query)
+            if checkpoint is not None:
+                checkpoint.start(list(class_df["class"]))
 
 
         result_dict = self.__get_all_df(class_property=class_property, 
                                         class_list = list(class_df["class"]), 
                                         additional_filters=additional_filters, 
                                         limit=limit, 
-                                        distinct=distinct)
+                                        distinct=distinct,
+                                        checkpoint=checkpoint,
+                                        max_retries=max_retries)
         
-        return WealthKGMultiClassObject(result_dict, class_df)
+        return WealthKGMultiClassObject(result_dict, class_df, self.instrumentation, self.events)
   
     def __construct_all_classes_df(self,  query):
         '''
@@ -243,17 +314,23 @@ class WealthKG:
         -df: pandas dataframe
         '''
         url = self.sparql_endpoint
-        r = requests.get(url, params = {'format': 'json', 'query': query})
-        data = r.json()
+        with instrument(self.instrumentation, "http_wait") as record:
+            r = requests.get(url, params = {'format': 'json', 'query': query})
+            record["bytes_out"] = len(query)
+            record["bytes_in"] = len(r.content)
+
+        with instrument(self.instrumentation, "decode") as record:
+            data = r.json()
 
-        df = pd.DataFrame.from_dict(data['results']['bindings'])
+            df = pd.DataFrame.from_dict(data['results']['bindings'])
 
-        df['class'] = df['class'].apply(self.__getValue)
+            df['class'] = df['class'].apply(self.__getValue)
+            record["rows"] = len(df)
 
         return df
 
 
-    def __get_all_df(self, class_list, class_property, additional_filters, limit, distinct):
+    def __get_all_df(self, class_list, class_property, additional_filters, limit, distinct, checkpoint=None, max_retries=None):
         '''
         This is a function to get entities of multiple classes from a KG
         Input:
@@ -263,6 +340,8 @@ class WealthKG:
         -additional_filters: string, additional filter for querying each class
         -limit: int, max limit of entities
         -distinct: boolean. True for distinct queries, false for normal queries. Default False.
+        -checkpoint: CrawlCheckpoint, finished classes are read from and written to it. Default None.
+        -max_retries: int, retries before a class is skipped, None to retry forever. Default None.
 
         Output: 
         -dict: dictionary with class identifier as the key and pandas dataframe of class as value
@@ -275,30 +354,53 @@ class WealthKG:
         additional_filter_string_out = self.__query_builder.construct_additional_filter_string(out_filters)
         additional_filter_string_in = self.__query_builder.construct_additional_filter_string(in_filters)
 
-        for class_uri in tqdm(class_list):
-            while True:
-                try:
-                    key = class_uri.split('/')[-1]
-                    filter_string = "?s {} <{}> .".format(class_property, class_uri)
-                    query_out = self.__query_builder.construct_query_outgoing(filter_string=filter_string, 
-                                                                            additional_filter_string=additional_filter_string_out, 
-                                                                            limit=limit, 
-                                                                            distinct=distinct)
-                    
-                    query_in = self.__query_builder.construct_query_incoming(filter_string=filter_string, 
-                                                                           additional_filter_string=additional_filter_string_in, 
-                                                                           limit=limit,
-                                                                           distinct=distinct)
-
-                    class_df = self.__construct_df_outgoing_incoming(query_out, query_in)
-
-                    df_dict[key] = class_df
-
-                except:
-                    time.sleep(0.1)
-                    continue
-                break
-
+        for index, class_uri in enumerate(self.events.progress(class_list)):
+            key = class_uri.split('/')[-1]
+            if checkpoint is not None and checkpoint.is_done(key):
+                df_dict[key] = checkpoint.read_class(key)
+                self.events.emit("class_finished", "checkpoint", **{"class": key, "rows": len(df_dict[key]), "index": index, "total": len(class_list)})
+                continue
+
+            retries = 0
+            class_df = None
+            with instrument(self.instrumentation, "class", key) as class_record:
+                while True:
+                    try:
+                        with instrument(self.instrumentation, "query_build", key):
+                            filter_string = "?s {} <{}> .".format(class_property, class_uri)
+                            query_out = self.__query_builder.construct_query_outgoing(filter_string=filter_string, 
+                                                                                    additional_filter_string=additional_filter_string_out, 
+                                                                                    limit=limit, 
+                                                                                    distinct=distinct)
+                            
+                            query_in = self.__query_builder.construct_query_incoming(filter_string=filter_string, 
+                                                                                   additional_filter_string=additional_filter_string_in, 
+                                                                                   limit=limit,
+                                                                                   distinct=distinct)
+
+                        class_df = self.__construct_df_outgoing_incoming(query_out, query_in, class_key=key)
+
+                        df_dict[key] = class_df
+
+                    except Exception as e:
+                        retries += 1
+                        class_record["retries"] = retries
+                        if max_retries is not None and retries > max_retries:
+                            if checkpoint is not None:
+                                checkpoint.mark_failed(key, class_uri, repr(e))
+                            break
+                        self.events.emit("retry", "class", **{"class": key, "batch": None, "attempt": retries, "error": repr(e)})
+                        time.sleep(0.1)
+                        continue
+                    class_record["rows"] = len(class_df)
+                    if checkpoint is not None:
+                        checkpoint.write_class(key, class_uri, class_df)
+                    break
+            if class_df is not None:
+                self.events.emit("class_finished", "class", **{"class": key, "rows": len(class_df), "index": index, "total": len(class_list)})
+
+        if checkpoint is not None:
+            checkpoint.save_manifest()
         return df_dict
 
 
@@ -306,30 +408,199 @@ class WealthKG:
         #Helper function to getvalue from json
         return x['value']
   
-    def read_csv_folder(self, location):
+    def read_csv_folder(self, location, workers=None, executor="thread", columns=None):
         '''
         Function for reading folders filled with csv for classes
-        For windows directories. The user must add r before the string to prevent
-        backslash errors
+        The files are read in parallel with explicit dtypes: entity IRIs as strings, counts as int32.
+        The index column written by save_to_csv_folder is skipped.
         input:
         -location: string, folder location
+        -workers: int, amount of parallel readers, 1 to read sequentially, None for the executor default. Default None.
+        -executor: string, "thread" or "process". Processes help when parsing, not the disk, is the bottleneck. Default "thread".
+        -columns: list, columns to read (e.g. ["s", "pCount"]), None for all. Default None.
         output:
         -WealthKGMultiClassObject: object filled with dataframe for each class with at least one entity
         '''
-        file_list = glob.glob("{}*.csv".format(location))
+        file_list = sorted(glob.glob(os.path.join(location, "*.csv")))
         result_dict = {}
         class_list = []
-        for file_name in tqdm(file_list):
-            df = pd.read_csv(file_name)
-            df.fillna(0, inplace=True)
-            if len(df) > 0:
-                key = file_name.split('/')[-1][:-4]
-               
-                if len(file_name.split('/')) == 1:
-                    key = file_name.split('\\')[-1][:-4]
-                class_list.append(key)
-                result_dict[key] = df
+
+        if workers == 1:
+            results = map(read_class_csv, file_list, [columns] * len(file_list))
+            pool = None
+        else:
+            pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+            pool = pool_class(max_workers=workers)
+            results = pool.map(read_class_csv, file_list, [columns] * len(file_list))
+
+        try:
+            for index, (key, df) in enumerate(self.events.progress(results, total=len(file_list))):
+                if len(df) > 0:
+                    class_list.append(key)
+                    result_dict[key] = df
+                self.events.emit("class_finished", "read_csv_folder", **{"class": key, "rows": len(df), "index": index, "total": len(file_list)})
+        finally:
+            if pool is not None:
+                pool.shutdown()
         
         class_df = pd.DataFrame({'class':class_list})
-        result_object = WealthKGMultiClassObject(result_dict, class_df)
-        return result_object
\ No newline at end of file
+        result_object = WealthKGMultiClassObject(result_dict, class_df, self.instrumentation, self.events)
+        return result_object
+
+    def load(self, location, format=None, lazy=True, columns=None, memory_budget=None):
+        '''
+        Function for loading a multiclass result saved with WealthKGMultiClassObject.save
+        input:
+        -location: string, folder or single parquet file
+        -format: string, "csv", "parquet" or "arrow", None to detect it from the location. Default None.
+        -lazy: boolean, True to read classes only when they are accessed, for results that do not fit in memory. Default True.
+        -columns: list, columns to read, None for all. Default None.
+        -memory_budget: int, bytes of class dataframes kept in memory when lazy, the least recently used
+                        classes are dropped beyond it. None to keep every class read. Default None.
+        output:
+        -WealthKGMultiClassObject: object filled with dataframe for each class with at least one entity
+        '''
+        if format is None:
+            format = detect_format(location)
+        if format == "csv" and not lazy:
+            return self.read_csv_folder(location, columns=columns)
+
+        class_dict = LazyClassDict(location, columns, memory_budget, format)
+        class_df = pd.DataFrame({'class': class_dict.class_values()})
+        if not lazy:
+            class_dict = {key: class_dict.read(key) for key in self.events.progress(list(class_dict.keys()))}
+        return WealthKGMultiClassObject(class_dict, class_df, self.instrumentation, self.events)
+
+    def refresh(self, source, class_property, additional_filters=[], distinct=False, limit=10000, probe="count",
+                modified_property=None, since=None, class_uri_prefix=None, probe_batch_size=200, max_retries=None):
+        '''
+        Function for updating a previously crawled multiclass result without a full re-crawl.
+        Every class of the class list is probed against the endpoint, also the classes that had no entities,
+        and only the classes that changed are queried again.
+        Probes:
+        - "count": a class changed if its entity count differs from the amount of entities stored for it.
+                   Classes stored with limit entities only count as changed if the endpoint has fewer than limit.
+        - "modified": a class changed if any of its entities has a modified_property date later than since.
+        Input:
+        -source: WealthKGMultiClassObject or string, result object or folder saved with save, loaded lazily
+        -class_property: string, property for "is instance" or equivalent, the same as used for the crawl
+        -additional_filters: string list, additional filter for querying each class, the same as used for the crawl
+        -distinct: boolean. True for distinct queries, false for normal queries. Default False.
+        -limit: int. Maximum ammount of entities to be queried. Default 10 thousand.
+        -probe: string, "count" or "modified". Default "count".
+        -modified_property: string, property with the modification date of an entity, needed for the "modified" probe
+        -since: string, xsd:dateTime of the previous crawl (e.g. "2023-01-01T00:00:00Z"), needed for the "modified" probe
+        -class_uri_prefix: string, namespace to build class URIs from keys, needed if the class list only has keys
+                           (e.g. "http://www.wikidata.org/entity/" for a folder read with read_csv_folder)
+        -probe_batch_size: int, amount of classes probed per query. Default 200.
+        -max_retries: int, retries of a probe or class query before it is given up, None to retry forever.
+                      The classes of a probe that is given up are kept as stored. Default None.
+
+        Output:
+        -WealthKGMultiClassObject: object with the changed classes replaced, classes without entities are removed
+                                   from class_dict and kept in class_list. Classes that did not change are not read
+                                   when the source is loaded lazily
+        '''
+        if isinstance(source, str):
+            source = self.load(source)
+        if probe == "modified" and (modified_property is None or since is None):
+            raise Exception("The modified probe needs modified_property and since")
+        if probe not in ["count", "modified"]:
+            raise Exception("Unknown probe {}".format(probe))
+
+        class_uris = {}
+        for class_value in source.class_list['class']:
+            key = class_value.split('/')[-1]
+            if "/" in class_value:
+                class_uris[key] = class_value
+            elif class_uri_prefix is not None:
+                class_uris[key] = class_uri_prefix + class_value
+            else:
+                raise Exception("Class list has no URIs, class_uri_prefix is needed")
+
+        entity_filters = [x for x in additional_filters if "?s" in x and "?p" not in x and "?i" not in x]
+        additional_filter_string = self.__query_builder.construct_additional_filter_string(entity_filters)
+        uri_list = list(class_uris.values())
+
+        counts = {}
+        unprobed = set()
+        for i in self.events.progress(range(0, len(uri_list), probe_batch_size)):
+            batch_uris = uri_list[i:i+probe_batch_size]
+            with instrument(self.instrumentation, "query_build"):
+                if probe == "count":
+                    query = self.__query_builder.construct_class_count_query(class_property, batch_uris, additional_filter_string)
+                else:
+                    query = self.__query_builder.construct_class_modified_query(class_property, batch_uris,
+                                                                                modified_property, since, additional_filter_string)
+            batch_counts = self.__get_class_counts(query, i // probe_batch_size, max_retries)
+            if batch_counts is None:
+                unprobed.update(batch_uris)
+            else:
+                counts.update(batch_counts)
+
+        changed = []
+        for key, class_uri in class_uris.items():
+            if class_uri in unprobed:
+                continue
+            count = counts.get(class_uri, 0)
+            if probe == "modified":
+                if count > 0:
+                    changed.append(class_uri)
+            else:
+                stored = len(source.class_dict[key]) if key in source.class_dict else 0
+                if stored != min(count, limit):
+                    changed.append(class_uri)
+
+        #only the changed classes are written, the others stay in the source, read when accessed
+        stored_dict = source.class_dict.mapping
+        result_dict = dict(stored_dict) if isinstance(stored_dict, dict) else ClassDictOverlay(stored_dict)
+        refreshed = self.__get_all_df(class_property=class_property,
+                                      class_list=changed,
+                                      additional_filters=additional_filters,
+                                      limit=limit,
+                                      distinct=distinct,
+                                      max_retries=max_retries)
+        for class_uri in changed:
+            key = class_uri.split('/')[-1]
+            if key in refreshed and len(refreshed[key]) > 0:
+                result_dict[key] = refreshed[key]
+            elif key in refreshed and key in result_dict:
+                del result_dict[key]
+
+        class_df = pd.DataFrame({'class': uri_list})
+        self.events.emit("refresh_finished", "refresh", changed=len(changed), classes=len(class_uris), unprobed=len(unprobed))
+        if not self.events.quiet:
+            print("Refreshed {} of {} classes".format(len(changed), len(class_uris)))
+        return WealthKGMultiClassObject(result_dict, class_df, self.instrumentation, self.events)
+
+    def __get_class_counts(self, query, batch=None, max_retries=None):
+        '''
+        Helper function to get the result of a class count query, retried like the queries of the crawl
+        Input:
+        -query: string, query string returning ?class and ?count
+        -batch: int, position of the probe batch for the retry events. Default None.
+        -max_retries: int, retries before the probe is given up, None to retry forever. Default None.
+        Output:
+        -dict: dictionary with class URI as the key and count as value, None if the probe was given up
+        '''
+        url = self.sparql_endpoint
+        retries = 0
+        while True:
+            try:
+                with instrument(self.instrumentation, "http_wait") as record:
+                    r = requests.post(url, data = {'format': 'json', 'query': query})
+                    record["bytes_out"] = len(query)
+                    record["bytes_in"] = len(r.content)
+                self.events.emit("bytes_received", "probe", **{"class": None, "batch": batch, "bytes": len(r.content)})
+
+                with instrument(self.instrumentation, "decode") as record:
+                    data = r.json()
+                    bindings = data['results']['bindings']
+                    record["rows"] = len(bindings)
+                    return {self.__getValue(b['class']): int(self.__getValue(b['count'])) for b in bindings}
+            except Exception as e:
+                retries += 1
+                if max_retries is not None and retries > max_retries:
+                    return None
+                self.events.emit("retry", "probe", **{"class": None, "batch": batch, "attempt": retries, "error": repr(e)})
+                time.sleep(0.1)
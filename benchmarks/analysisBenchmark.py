@@ -0,0 +1,205 @@
+'''
+Micro-benchmarks for the analysis layer (WealthKGSingleClassObject and WealthKGMultiClassObject)
+at increasing class counts and class sizes. Records wall time and tracemalloc peak memory of every
+benchmark to a JSON file and compares them against a saved baseline.
+
+Usage:
+    python -m benchmarks.analysisBenchmark --output analysis_results.json
+    python -m benchmarks.analysisBenchmark --baseline analysis_results.json --threshold 0.25
+'''
+#Import the libraries needed
+import argparse
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from WealthKG.multiClassObject import WealthKGMultiClassObject
+from WealthKG.singleClassObject import WealthKGSingleClassObject
+from WealthKG.wealthKG import WealthKG
+
+from .syntheticKG import PowerLawKGGenerator
+
+PART = "pCount"
+
+
+def build_class_dict(generator):
+    #Builds the class dictionary of a generator in the layout returned by multiclass_query
+    frames = {}
+    for k, entity_ids, out_distinct, out_total, in_distinct, in_total in generator.iter_chunks():
+        df = pd.DataFrame({"s": entity_ids.astype(str), "pCount": out_total, "iCount": in_total, "totalCount": out_total + in_total})
+        key = "C{}".format(k)
+        frames[key] = df if key not in frames else pd.concat([frames[key], df], ignore_index=True)
+    for key in frames:
+        frames[key] = frames[key].sort_values(by="totalCount", ascending=False).reset_index(drop=True)
+    return frames
+
+
+def measure(function, repeat):
+    '''
+    Measures a benchmark
+    Input:
+    -function: function without arguments to benchmark
+    -repeat: int, amount of timed runs, the fastest one is reported
+    Output:
+    -dict: seconds, peak_memory_bytes and status of the benchmark
+    '''
+    try:
+        seconds = math.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            seconds = min(seconds, time.perf_counter() - start)
+
+        #memory is traced in a separate run so the tracing overhead does not end up in the timings
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        return {"seconds": None, "peak_memory_bytes": None, "status": "error: {}: {}".format(type(e).__name__, e)}
+
+    return {"seconds": seconds, "peak_memory_bytes": peak, "status": "ok"}
+
+
+def single_class_benchmarks(class_size, repeat):
+    #Benchmarks of WealthKGSingleClassObject for one class size
+    generator = PowerLawKGGenerator(class_size, 1)
+    df = build_class_dict(generator)["C0"]
+    #the objects cache sorted values and statistics, every run gets a new object so the timings are not cache hits
+    single = lambda: WealthKGSingleClassObject(df, False, "?s wdt:P31 <C0> .", len(df))
+
+    benchmarks = {
+        "single.gini": lambda: single().gini(PART),
+        "single.lorenz": lambda: single().lorenz(PART),
+        "single.palma": lambda: single().palma(PART),
+    }
+    return [dict(benchmark=name, classes=1, class_size=class_size, **measure(function, repeat))
+            for name, function in benchmarks.items()]
+
+
+def multiclass_benchmarks(n_classes, class_size, repeat, max_pairwise_classes, max_figure_classes):
+    #Benchmarks of WealthKGMultiClassObject for one class count and mean class size
+    generator = PowerLawKGGenerator(n_classes * class_size, n_classes)
+    class_dict = build_class_dict(generator)
+    class_df = pd.DataFrame({"class": list(class_dict.keys())})
+    #the objects cache sorted values and statistics, every run gets a new object so the timings are not cache hits
+    multi = lambda: WealthKGMultiClassObject(class_dict, class_df)
+
+    benchmarks = {
+        "multi.get_average_gini": lambda: multi().get_average_gini(PART),
+        "multi.get_average_palma": lambda: multi().get_average_palma(PART),
+        "multi.get_average_skewness": lambda: multi().get_average_skewness(PART),
+        "multi.get_average_kurtosis": lambda: multi().get_average_kurtosis(PART),
+        "multi.get_total_entities": lambda: multi().get_total_entities(),
+    }
+    if n_classes <= max_pairwise_classes:
+        benchmarks["multi.get_emd_distance_matrix"] = lambda: multi().get_emd_distance_matrix(PART)
+        benchmarks["multi.get_ks_distance_matrix"] = lambda: multi().get_ks_distance_matrix(PART)
+    if n_classes <= max_figure_classes:
+        benchmarks["multi.get_all_histogram"] = lambda: multi().get_all_histogram("benchmark", PART)
+        benchmarks["multi.get_all_pareto"] = lambda: multi().get_all_pareto("benchmark", PART)
+
+    results = [dict(benchmark=name, classes=n_classes, class_size=class_size, **measure(function, repeat))
+               for name, function in benchmarks.items()]
+
+    folder = tempfile.mkdtemp()
+    try:
+        generator.write_csv_folder(folder)
+        reader = WealthKG("http://127.0.0.1/sparql")
+        results.append(dict(benchmark="wealthkg.read_csv_folder", classes=n_classes, class_size=class_size,
+                            **measure(lambda: reader.read_csv_folder(folder + "/"), repeat)))
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Compares results against a baseline
+    Input:
+    -results: list of dict, current results
+    -baseline: list of dict, baseline results
+    -threshold: float, relative slowdown or memory growth that counts as a regression
+    Output:
+    -list of dict: one comparison per benchmark present in both
+    '''
+    def key(r):
+        return (r["benchmark"], r["classes"], r["class_size"])
+
+    baseline_dict = {key(r): r for r in baseline}
+    comparisons = []
+    for r in results:
+        old = baseline_dict.get(key(r))
+        if old is None or r["seconds"] is None or old["seconds"] is None:
+            continue
+        time_ratio = r["seconds"] / old["seconds"] if old["seconds"] > 0 else math.inf
+        memory_ratio = r["peak_memory_bytes"] / old["peak_memory_bytes"] if old["peak_memory_bytes"] > 0 else math.inf
+        comparisons.append({"benchmark": r["benchmark"], "classes": r["classes"], "class_size": r["class_size"],
+                            "time_ratio": time_ratio, "memory_ratio": memory_ratio,
+                            "regression": time_ratio > 1 + threshold or memory_ratio > 1 + threshold})
+    return comparisons
+
+
+def print_results(results, comparisons):
+    #Prints the results and comparisons as tables
+    header = "{:<32}{:>9}{:>12}{:>12}{:>16}  {}"
+    print(header.format("benchmark", "classes", "class_size", "seconds", "peak_memory", "status"))
+    for r in results:
+        seconds = "-" if r["seconds"] is None else "{:.4f}".format(r["seconds"])
+        memory = "-" if r["peak_memory_bytes"] is None else str(r["peak_memory_bytes"])
+        print(header.format(r["benchmark"], r["classes"], r["class_size"], seconds, memory, r["status"]))
+
+    if comparisons:
+        print("")
+        header = "{:<32}{:>9}{:>12}{:>12}{:>14}  {}"
+        print(header.format("benchmark", "classes", "class_size", "time_ratio", "memory_ratio", ""))
+        for c in comparisons:
+            print(header.format(c["benchmark"], c["classes"], c["class_size"], "{:.2f}".format(c["time_ratio"]),
+                                "{:.2f}".format(c["memory_ratio"]), "REGRESSION" if c["regression"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the WealthKG analysis layer")
+    parser.add_argument("--class-counts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--class-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--single-class-sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--max-pairwise-classes", type=int, default=100, help="largest class count the distance matrices are run for")
+    parser.add_argument("--max-figure-classes", type=int, default=100, help="largest class count the subplot grids are run for")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = []
+    for class_size in args.single_class_sizes:
+        results += single_class_benchmarks(class_size, args.repeat)
+    for n_classes in args.class_counts:
+        for class_size in args.class_sizes:
+            results += multiclass_benchmarks(n_classes, class_size, args.repeat, args.max_pairwise_classes, args.max_figure_classes)
+
+    comparisons = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            comparisons = compare(results, json.load(f)["results"], args.threshold)
+
+    print_results(results, comparisons)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "analysis", "created": time.time(), "results": results, "comparisons": comparisons}, f, indent=2)
+        print("Saved to {}".format(args.output))
+
+    if any(c["regression"] for c in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
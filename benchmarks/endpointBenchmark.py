@@ -0,0 +1,114 @@
+'''
+End-to-end throughput benchmark for the crawling paths of WealthKG.
+Runs single_class_query (direct and batch strategy) and multiclass_query against a
+LocalSparqlEndpoint and reports queries/sec, bytes transferred and wall time.
+
+Usage:
+    python -m benchmarks.endpointBenchmark --output endpoint_results.json
+'''
+#Import the libraries needed
+import argparse
+import json
+import time
+
+from WealthKG.wealthKG import WealthKG
+
+from .localEndpoint import LocalSparqlEndpoint, SyntheticGraph
+
+PREFIXES = ["wdt: <http://www.wikidata.org/prop/direct/>"]
+
+
+def run_scenario(endpoint, name, scale, crawl):
+    '''
+    Runs one crawl against the endpoint and collects its measurements
+    Input:
+    -endpoint: LocalSparqlEndpoint, running endpoint
+    -name: string, scenario name
+    -scale: dict, parameters of the scenario for the report
+    -crawl: function, runs the crawl and returns the amount of entities fetched
+    Output:
+    -dict: measurements of the scenario
+    '''
+    endpoint.reset_stats()
+    start = time.perf_counter()
+    entities = crawl()
+    wall_time = time.perf_counter() - start
+    stats = dict(endpoint.stats)
+
+    result = {"scenario": name, **scale, "entities": entities, "wall_time": wall_time}
+    result.update(stats)
+    result["queries_per_sec"] = stats["requests"] / wall_time if wall_time > 0 else float("nan")
+    return result
+
+
+def single_class_scenarios(class_sizes, latency, error_rate, rate_limit, max_rows):
+    #Benchmarks both single_class_query strategies on a graph with one class per size
+    results = []
+    for size in class_sizes:
+        graph = SyntheticGraph.random(n_classes=1, entities_per_class=size)
+        class_filter = "wdt:P31 <{}>".format(next(iter(graph.class_members)))
+
+        with LocalSparqlEndpoint(graph, latency=latency, error_rate=error_rate, rate_limit=rate_limit, max_rows=max_rows, seed=0) as endpoint:
+            wealth_kg = WealthKG(endpoint.url, PREFIXES)
+            scale = {"classes": 1, "class_size": size}
+
+            #limit <= 10000 uses one outgoing and one incoming query
+            direct_limit = min(size, 10000)
+            results.append(run_scenario(endpoint, "single_class_direct", dict(scale, limit=direct_limit),
+                                        lambda: wealth_kg.single_class_query([class_filter], [], True, direct_limit).entity_count))
+
+            #limit > 10000 samples the entities first and queries them in batches
+            if size > 10000:
+                results.append(run_scenario(endpoint, "single_class_batch", dict(scale, limit=size),
+                                            lambda: wealth_kg.single_class_query([class_filter], [], True, size).entity_count))
+    return results
+
+
+def multiclass_scenarios(class_counts, class_size, latency, error_rate, rate_limit, max_rows):
+    #Benchmarks multiclass_query on graphs with an increasing amount of classes
+    results = []
+    for n_classes in class_counts:
+        graph = SyntheticGraph.random(n_classes=n_classes, entities_per_class=class_size)
+
+        with LocalSparqlEndpoint(graph, latency=latency, error_rate=error_rate, rate_limit=rate_limit, max_rows=max_rows, seed=0) as endpoint:
+            wealth_kg = WealthKG(endpoint.url, PREFIXES)
+            scale = {"classes": n_classes, "class_size": class_size, "limit": 10000}
+            results.append(run_scenario(endpoint, "multiclass", scale,
+                                        lambda: wealth_kg.multiclass_query("wdt:P31", "", ["?class wdt:P279 <http://example.org/class/Root> ."], [],
+                                                                          class_limit=0, distinct=False, limit=10000).get_total_entities()))
+    return results
+
+
+def print_results(results):
+    #Prints the results as a table
+    header = "{:<22}{:>9}{:>12}{:>10}{:>10}{:>14}{:>14}{:>11}{:>10}"
+    print(header.format("scenario", "classes", "class_size", "requests", "errors", "bytes_in", "bytes_out", "wall_s", "q/s"))
+    for r in results:
+        print(header.format(r["scenario"], r["classes"], r["class_size"], r["requests"], r["errors"] + r["rate_limited"],
+                            r["bytes_in"], r["bytes_out"], "{:.3f}".format(r["wall_time"]), "{:.1f}".format(r["queries_per_sec"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the WealthKG crawling paths against a local SPARQL stand-in")
+    parser.add_argument("--class-sizes", type=int, nargs="+", default=[1000, 10000, 25000])
+    parser.add_argument("--class-counts", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--multiclass-size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 500 response")
+    parser.add_argument("--rate-limit", type=int, default=None, help="requests per second before answering 429")
+    parser.add_argument("--max-rows", type=int, default=None, help="maximum rows per response")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = single_class_scenarios(args.class_sizes, args.latency, args.error_rate, args.rate_limit, args.max_rows)
+    results += multiclass_scenarios(args.class_counts, args.multiclass_size, args.latency, args.error_rate, args.rate_limit, args.max_rows)
+
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "endpoint", "created": time.time(), "results": results}, f, indent=2)
+        print("Saved to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#Import the libraries needed
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DEFAULT_BASE = "http://example.org/"
+COUNT_DATATYPE = "http://www.w3.org/2001/XMLSchema#integer"
+
+
+class SyntheticGraph:
+    '''
+    In-memory synthetic knowledge graph served by LocalSparqlEndpoint.
+    Only the per-entity property counts are stored, the triples themselves are never materialized.
+
+    Attributes:
+    - base: string. Namespace used for entity and class IRIs
+    - class_members: dictionary with class IRI as the key and numpy array of entity ids as value
+    - class_parents: dictionary with class IRI as the key and parent class IRI as value
+    - out_distinct, out_total: numpy arrays. Distinct and total outgoing property count per entity id
+    - in_distinct, in_total: numpy arrays. Distinct and total incoming property count per entity id
+    '''
+    def __init__(self, class_members, out_distinct, out_total, in_distinct, in_total, class_parents=None, base=DEFAULT_BASE):
+        self.base = base
+        self.class_members = class_members
+        self.class_parents = class_parents if class_parents is not None else {}
+        self.out_distinct = out_distinct
+        self.out_total = out_total
+        self.in_distinct = in_distinct
+        self.in_total = in_total
+
+    @classmethod
+    def random(cls, n_classes, entities_per_class, seed=0, base=DEFAULT_BASE):
+        '''
+        Builds a flat graph of n_classes classes under a single root class, each with
+        entities_per_class entities with zipf distributed property counts
+        Input:
+        -n_classes: int, amount of classes
+        -entities_per_class: int, amount of entities per class
+        -seed: int, seed for the random generator
+        -base: string, namespace for the IRIs
+        Output:
+        -SyntheticGraph
+        '''
+        rng = np.random.default_rng(seed)
+        entity_count = n_classes * entities_per_class
+
+        out_distinct = np.minimum(rng.zipf(2.0, entity_count), 5000)
+        out_total = out_distinct + rng.poisson(1.0, entity_count)
+        in_distinct = np.minimum(rng.zipf(2.5, entity_count) - 1, 5000)
+        in_total = in_distinct + rng.poisson(0.5, entity_count) * (in_distinct > 0)
+
+        root = "{}class/Root".format(base)
+        class_members = {}
+        class_parents = {}
+        for k in range(n_classes):
+            class_iri = "{}class/C{}".format(base, k)
+            class_members[class_iri] = np.arange(k * entities_per_class, (k + 1) * entities_per_class)
+            class_parents[class_iri] = root
+
+        return cls(class_members, out_distinct, out_total, in_distinct, in_total, class_parents, base)
+
+    @classmethod
+    def from_generator(cls, generator):
+        '''
+        Materializes the graph of a PowerLawKGGenerator, including its class hierarchy
+        Input:
+        -generator: PowerLawKGGenerator
+        Output:
+        -SyntheticGraph
+        '''
+        counts = [np.zeros(generator.n_entities, dtype=np.int32) for _ in range(4)]
+        class_members = {}
+        for k, entity_ids, *chunk_counts in generator.iter_chunks():
+            for array, chunk in zip(counts, chunk_counts):
+                array[entity_ids] = chunk
+            class_iri = generator.class_iri(k)
+            members = class_members.get(class_iri)
+            class_members[class_iri] = entity_ids if members is None else np.concatenate([members, entity_ids])
+
+        return cls(class_members, *counts, generator.class_hierarchy(), generator.base)
+
+    def entity_iri(self, entity_id):
+        #Helper function to get the IRI of an entity id
+        return "{}entity/E{}".format(self.base, entity_id)
+
+    def entity_id(self, iri):
+        #Helper function to get the entity id of an IRI, None if the IRI is not an entity of this graph
+        prefix = "{}entity/E".format(self.base)
+        if iri.startswith(prefix) and iri[len(prefix):].isdigit():
+            return int(iri[len(prefix):])
+        return None
+
+    def children(self, class_iri):
+        #Returns the direct subclasses of a class
+        return [c for c, parent in self.class_parents.items() if parent == class_iri]
+
+
+class SparqlStandIn:
+    '''
+    Answers the query shapes produced by QueryBuilder against a SyntheticGraph.
+    Unsupported query shapes raise an Exception.
+
+    Attributes:
+    - graph: SyntheticGraph. Graph the queries are answered from
+    '''
+    def __init__(self, graph):
+        self.graph = graph
+
+    def answer(self, query):
+        '''
+        Answers a query
+        Input:
+        -query: string, SPARQL query string
+        Output:
+        -dict: SPARQL 1.1 JSON results
+        '''
+        prefixes = dict(re.findall(r'PREFIX\s+(\w*):\s*<([^>]*)>', query))
+        body = re.sub(r'(^|\s)#[^\n]*', r'\1', re.sub(r'PREFIX[^\n]*\n', '', query))
+        limit_match = re.findall(r'LIMIT\s+(\d+)', body, flags=re.IGNORECASE)
+        limit = int(limit_match[-1]) if limit_match else None
+
+        if "?modified" in body:
+            raise Exception("The synthetic graph has no modification dates")
+        if re.search(r'COUNT\(DISTINCT\s+\?s\)\s+AS\s+\?count', body, flags=re.IGNORECASE):
+            return self.__answer_class_counts(body, prefixes)
+        if re.search(r'SELECT\s+distinct\s+\?class\b', body, flags=re.IGNORECASE):
+            return self.__answer_classes(body, prefixes, limit)
+        if "?pCount" in body:
+            return self.__answer_counts(body, prefixes, limit, "pCount")
+        if "?iCount" in body:
+            return self.__answer_counts(body, prefixes, limit, "iCount")
+        if re.search(r'SELECT\s+\?s\s+WHERE', body, flags=re.IGNORECASE):
+            entities = self.__select_entities(body, prefixes)[:limit]
+            rows = [{"s": self.__uri(self.graph.entity_iri(e))} for e in entities]
+            return self.__result(["s"], rows)
+
+        raise Exception("Unsupported query shape")
+
+    def __answer_classes(self, body, prefixes, limit):
+        #Answers the class list query, "?class <p> <o>" triples with a known class as the object select its subclasses
+        class_list = list(self.graph.class_members.keys())
+        for _, obj in re.findall(r'\?class\s+([^\s{}]+)\s+([^\s{}]+)\s*\.(?=\s|$)', body):
+            obj = self.__expand(obj, prefixes)
+            if obj in self.graph.class_members or obj in self.graph.class_parents.values():
+                children = set(self.graph.children(obj))
+                class_list = [c for c in class_list if c in children]
+        rows = [{"class": self.__uri(c)} for c in class_list[:limit]]
+        return self.__result(["class"], rows)
+
+    def __answer_class_counts(self, body, prefixes):
+        #Answers the entity count probe of the classes in the VALUES clause
+        values = re.search(r'VALUES\s+\?class\s*\{([^}]*)\}', body)
+        class_list = re.findall(r'<([^>]*)>', values.group(1)) if values is not None else list(self.graph.class_members.keys())
+        rows = [{"class": self.__uri(c), "count": self.__count(len(self.graph.class_members[c]))}
+                for c in class_list if len(self.graph.class_members.get(c, [])) > 0]
+        return self.__result(["class", "count"], rows)
+
+    def __answer_counts(self, body, prefixes, limit, count_name):
+        #Answers the outgoing/incoming property count queries
+        distinct = re.search(r'SELECT\s+DISTINCT\s+\?s', body, flags=re.IGNORECASE) is not None
+        if count_name == "pCount":
+            counts = self.graph.out_distinct if distinct else self.graph.out_total
+        else:
+            counts = self.graph.in_distinct if distinct else self.graph.in_total
+
+        entities = self.__select_entities(body, prefixes)
+        entities = entities[counts[entities] > 0][:limit]
+        rows = [{"s": self.__uri(self.graph.entity_iri(e)), count_name: self.__count(c)}
+                for e, c in zip(entities.tolist(), counts[entities].tolist())]
+        return self.__result(["s", count_name], rows)
+
+    def __select_entities(self, body, prefixes):
+        #Returns the entity ids matching the "?s <p> <o>" class filters and the VALUES clause of a query
+        entities = None
+        for _, obj in re.findall(r'\?s\s+([^\s{}]+)\s+([^\s{}]+)\s*\.(?=\s|$)', body):
+            if obj.startswith('?'):
+                continue
+            members = self.graph.class_members.get(self.__expand(obj, prefixes), np.array([], dtype=np.int64))
+            entities = members if entities is None else np.intersect1d(entities, members)
+
+        values = re.search(r'VALUES\s+\?s\s*\{([^}]*)\}', body)
+        if values is not None:
+            ids = [self.graph.entity_id(iri) for iri in re.findall(r'<([^>]*)>', values.group(1))]
+            ids = np.array([i for i in ids if i is not None], dtype=np.int64)
+            entities = ids if entities is None else ids[np.isin(ids, entities)]
+
+        if entities is None:
+            return np.array([], dtype=np.int64)
+        return entities
+
+    def __expand(self, term, prefixes):
+        #Helper function to expand a prefixed name or strip the brackets of an IRI
+        if term.startswith('<') and term.endswith('>'):
+            return term[1:-1]
+        prefix, sep, local = term.partition(':')
+        if sep and prefix in prefixes:
+            return prefixes[prefix] + local
+        return term
+
+    def __uri(self, iri):
+        return {"type": "uri", "value": iri}
+
+    def __count(self, count):
+        return {"datatype": COUNT_DATATYPE, "type": "literal", "value": str(count)}
+
+    def __result(self, variables, rows):
+        return {"head": {"vars": variables}, "results": {"bindings": rows}}
+
+
+class LocalSparqlEndpoint:
+    '''
+    Local HTTP stand-in for a SPARQL endpoint serving a SyntheticGraph.
+    Accepts the same GET/POST requests WealthKG sends to query.wikidata.org.
+
+    Attributes:
+    - graph: SyntheticGraph. Graph being served
+    - latency: float. Seconds added to every response
+    - error_rate: float. Probability of answering a request with a 500 error
+    - rate_limit: int. Maximum requests per second before answering with 429, None for no limit
+    - max_rows: int. Maximum rows per response, None for no limit
+    - stats: dictionary. Request, status and byte counters since the last reset_stats call
+    '''
+    def __init__(self, graph, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, rate_limit=None, max_rows=None, seed=None):
+        self.graph = graph
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.max_rows = max_rows
+
+        self.__stand_in = SparqlStandIn(graph)
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__recent = deque()
+        self.__host = host
+        self.__port = port
+        self.__server = None
+        self.__thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        #URL to pass to WealthKG
+        return "http://{}:{}/sparql".format(self.__host, self.__server.server_address[1])
+
+    def start(self):
+        #Starts serving on a background thread
+        self.__server = ThreadingHTTPServer((self.__host, self.__port), self.__handler_class())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        #Stops the server
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset_stats(self):
+        #Resets the request counters
+        with self.__lock:
+            self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def __record(self, key, bytes_in, bytes_out):
+        with self.__lock:
+            self.stats["requests"] += 1
+            self.stats[key] += 1
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+
+    def __is_rate_limited(self):
+        #Sliding one second window over the previous requests
+        if self.rate_limit is None:
+            return False
+        with self.__lock:
+            now = time.monotonic()
+            while self.__recent and now - self.__recent[0] > 1.0:
+                self.__recent.popleft()
+            if len(self.__recent) >= self.rate_limit:
+                return True
+            self.__recent.append(now)
+            return False
+
+    def __respond(self, query, bytes_in):
+        #Returns status, headers and body for a query
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.__is_rate_limited():
+            body = b"Too Many Requests"
+            self.__record("rate_limited", bytes_in, len(body))
+            return 429, {"Retry-After": "1", "Content-Type": "text/plain"}, body
+        if self.error_rate > 0 and self.__random.random() < self.error_rate:
+            body = b"Internal Server Error"
+            self.__record("errors", bytes_in, len(body))
+            return 500, {"Content-Type": "text/plain"}, body
+
+        try:
+            result = self.__stand_in.answer(query)
+        except Exception as e:
+            body = str(e).encode()
+            self.__record("errors", bytes_in, len(body))
+            return 400, {"Content-Type": "text/plain"}, body
+
+        if self.max_rows is not None:
+            result["results"]["bindings"] = result["results"]["bindings"][:self.max_rows]
+        body = json.dumps(result).encode()
+        self.__record("ok", bytes_in, len(body))
+        return 200, {"Content-Type": "application/sparql-results+json"}, body
+
+    def __handler_class(self):
+        respond = self.__respond
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                self.__send(params, len(self.path))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length)
+                params = parse_qs(raw.decode())
+                self.__send(params, len(self.path) + length)
+
+            def __send(self, params, bytes_in):
+                query = params.get("query", [""])[0]
+                status, headers, body = respond(query, bytes_in)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                #Silence the per request logging of BaseHTTPRequestHandler
+                pass
+
+        return Handler
@@ -0,0 +1,252 @@
+'''
+Synthetic knowledge graph generator for benchmarks.
+Generates class hierarchies with heavy-tailed class sizes and entity degrees, similar to real
+knowledge graphs, and writes them as per-class csv folders readable by WealthKG.read_csv_folder,
+as columnar stores readable by WealthKG.load and as N-Triples. Output is produced in chunks,
+so 10^8 entities never have to be resident at once.
+
+Usage:
+    python -m benchmarks.syntheticKG --entities 1000000 --classes 1000 --csv-folder synthetic/ --parquet synthetic.parquet --ntriples synthetic.nt
+'''
+#Import the libraries needed
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from WealthKG.columnarStore import ColumnarWriter
+
+DEFAULT_BASE = "http://example.org/"
+CLASS_PROPERTY = "http://www.wikidata.org/prop/direct/P31"
+SUBCLASS_PROPERTY = "http://www.wikidata.org/prop/direct/P279"
+
+
+class PowerLawKGGenerator:
+    '''
+    Generator for synthetic knowledge graphs with power-law distributed class sizes and entity degrees.
+    Every class draws its counts from its own seeded streams, so the output does not depend on the chunk size
+    and the csv and N-Triples output of the same generator describe the same graph.
+
+    Attributes:
+    - n_entities: int. Total amount of entities, split over the classes
+    - n_classes: int. Amount of classes
+    - class_exponent: float. Zipf exponent of the class sizes, higher means fewer dominant classes
+    - degree_exponent: float. Zipf exponent of the outgoing property counts
+    - in_degree_exponent: float. Zipf exponent of the incoming property counts
+    - max_degree: int. Upper bound for the property counts of an entity
+    - duplicate_rate: float. Mean amount of repeated statements per entity, the difference between distinct and bag counts
+    - seed: int. Seed for the random generators
+    - base: string. Namespace used for the IRIs
+    '''
+    def __init__(self, n_entities, n_classes, class_exponent=1.1, degree_exponent=2.0, in_degree_exponent=2.5,
+                 max_degree=10000, duplicate_rate=1.0, seed=0, base=DEFAULT_BASE):
+        if n_entities < n_classes:
+            raise Exception("n_entities must be at least n_classes")
+        self.n_entities = int(n_entities)
+        self.n_classes = int(n_classes)
+        self.class_exponent = class_exponent
+        self.degree_exponent = degree_exponent
+        self.in_degree_exponent = in_degree_exponent
+        self.max_degree = max_degree
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+        self.base = base
+
+    def class_iri(self, class_index):
+        #Helper function to get the IRI of a class index
+        return "{}class/C{}".format(self.base, class_index)
+
+    @property
+    def root_iri(self):
+        #IRI of the root class every class descends from
+        return "{}class/Root".format(self.base)
+
+    def class_hierarchy(self):
+        '''
+        Builds a random recursive tree over the classes, class k is a subclass of a uniformly chosen earlier class
+        or of the root. This gives the heavy-tailed fan-out of real subclass hierarchies.
+        Output:
+        -dict: dictionary with class IRI as the key and parent class IRI as value
+        '''
+        rng = np.random.default_rng([self.seed, 0])
+        parents = {self.class_iri(0): self.root_iri}
+        choices = np.floor(rng.random(self.n_classes) * np.arange(self.n_classes + 1)[1:]).astype(np.int64) - 1
+        for k in range(1, self.n_classes):
+            parents[self.class_iri(k)] = self.root_iri if choices[k] < 0 else self.class_iri(choices[k])
+        return parents
+
+    def class_sizes(self):
+        '''
+        Splits n_entities over the classes with zipf weights, every class gets at least one entity
+        Output:
+        -numpy array: entity count per class index
+        '''
+        weights = np.arange(1, self.n_classes + 1, dtype=np.float64) ** -self.class_exponent
+        sizes = np.maximum(1, np.floor(self.n_entities * weights / weights.sum())).astype(np.int64)
+        sizes[0] += self.n_entities - sizes.sum()
+        if sizes[0] < 1:
+            raise Exception("class_exponent too low for the amount of classes")
+        return sizes
+
+    def iter_chunks(self, chunk_size=1000000):
+        '''
+        Yields the entities of every class in chunks
+        Input:
+        -chunk_size: int, maximum amount of entities per chunk
+        Output:
+        -generator of (class index, entity ids, out_distinct, out_total, in_distinct, in_total), the counts are int32 numpy arrays
+        '''
+        sizes = self.class_sizes()
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        for k in range(self.n_classes):
+            streams = [np.random.default_rng([self.seed, 1, k, stream]) for stream in range(4)]
+            for lower in range(0, sizes[k], chunk_size):
+                n = min(chunk_size, sizes[k] - lower)
+                out_distinct = np.minimum(streams[0].zipf(self.degree_exponent, n), self.max_degree).astype(np.int32)
+                #an entity with a single property only has its class statement, so it can not repeat properties
+                out_total = out_distinct + (streams[1].poisson(self.duplicate_rate, n) * (out_distinct > 1)).astype(np.int32)
+                in_distinct = np.minimum(streams[2].zipf(self.in_degree_exponent, n) - 1, self.max_degree).astype(np.int32)
+                in_total = in_distinct + (streams[3].poisson(self.duplicate_rate, n) * (in_distinct > 0)).astype(np.int32)
+                entity_ids = np.arange(starts[k] + lower, starts[k] + lower + n, dtype=np.int64)
+                yield k, entity_ids, out_distinct, out_total, in_distinct, in_total
+
+    def write_csv_folder(self, location, distinct=False, chunk_size=1000000):
+        '''
+        Writes one csv per class in the layout of WealthKGMultiClassObject.save_to_csv_folder
+        Input:
+        -location: string, location of folder to save to. Can be preexisting
+        -distinct: boolean, True to write the distinct property counts, False for the bag counts
+        -chunk_size: int, maximum amount of entities held in memory at once
+        '''
+        if not os.path.exists(location):
+            os.makedirs(location)
+
+        written = set()
+        index_start = 0
+        for k, entity_ids, out_distinct, out_total, in_distinct, in_total in self.iter_chunks(chunk_size):
+            p_count = out_distinct if distinct else out_total
+            i_count = in_distinct if distinct else in_total
+            first_chunk = k not in written
+            if first_chunk:
+                index_start = 0
+                written.add(k)
+
+            df = pd.DataFrame({"s": self.__entity_iris(entity_ids), "pCount": p_count, "iCount": i_count,
+                               "totalCount": p_count + i_count},
+                              index=pd.RangeIndex(index_start, index_start + len(entity_ids)))
+            fullname = os.path.join(location, "C{}.csv".format(k))
+            df.to_csv(fullname, mode="w" if first_chunk else "a", header=first_chunk)
+            index_start += len(entity_ids)
+
+        print("Saved to {}".format(location))
+
+    def write_columnar(self, location, format="parquet", partitioned=False, distinct=False, chunk_size=1000000):
+        '''
+        Writes the graph in the columnar store read by WealthKG.load
+        Input:
+        -location: string, file for a single parquet file, folder for a partitioned store
+        -format: string, "parquet" or "arrow". Default "parquet".
+        -partitioned: boolean, True for one file per class. Default False.
+        -distinct: boolean, True to write the distinct property counts, False for the bag counts
+        -chunk_size: int, maximum amount of entities held in memory at once
+        '''
+        with ColumnarWriter(location, format, partitioned) as writer:
+            for k, entity_ids, out_distinct, out_total, in_distinct, in_total in self.iter_chunks(chunk_size):
+                p_count = out_distinct if distinct else out_total
+                i_count = in_distinct if distinct else in_total
+                df = pd.DataFrame({"s": self.__entity_iris(entity_ids), "pCount": p_count, "iCount": i_count,
+                                   "totalCount": p_count + i_count})
+                writer.write_class("C{}".format(k), df, self.class_iri(k))
+
+        print("Saved to {}".format(location))
+
+    def write_ntriples(self, path, chunk_size=1000000):
+        '''
+        Writes the graph as N-Triples. Outgoing statements of an entity are its class statement followed by
+        literal valued properties, incoming statements come from reference nodes outside of the classes,
+        so counting them reproduces the counts of write_csv_folder.
+        Input:
+        -path: string, file to write to
+        -chunk_size: int, maximum amount of entities held in memory at once
+        '''
+        with open(path, "w") as f:
+            for class_iri, parent in self.class_hierarchy().items():
+                f.write("<{}> <{}> <{}> .\n".format(class_iri, SUBCLASS_PROPERTY, parent))
+
+            for k, entity_ids, out_distinct, out_total, in_distinct, in_total in self.iter_chunks(chunk_size):
+                entities = "<" + self.__entity_iris(entity_ids).astype(object) + ">"
+                class_iri = self.class_iri(k)
+
+                lines = entities + " <{}> <{}> .".format(CLASS_PROPERTY, class_iri)
+                f.write("\n".join(lines) + "\n")
+
+                #outgoing: properties P1..P(d-1) once, the repeated statements reuse P1 with other values
+                property_index, statement_index = self.__statement_indexes(out_distinct - 1, out_total - 1)
+                if len(property_index) > 0:
+                    subjects = np.repeat(entities, out_total - 1)
+                    lines = subjects + " <{}property/P".format(self.base) + (property_index + 1).astype(str).astype(object) + \
+                            '> "' + statement_index.astype(str).astype(object) + '" .'
+                    f.write("\n".join(lines) + "\n")
+
+                #incoming: properties P0..P(d-1) once, the repeated statements reuse P0 from other reference nodes
+                property_index, statement_index = self.__statement_indexes(in_distinct, in_total)
+                if len(property_index) > 0:
+                    objects = np.repeat(entities, in_total)
+                    subjects = "<{}ref/R".format(self.base) + np.repeat(entity_ids, in_total).astype(str).astype(object) + \
+                               "_" + statement_index.astype(str).astype(object) + ">"
+                    lines = subjects + " <{}property/P".format(self.base) + property_index.astype(str).astype(object) + "> " + objects + " ."
+                    f.write("\n".join(lines) + "\n")
+
+        print("Saved to {}".format(path))
+
+    def __entity_iris(self, entity_ids):
+        #Helper function to build the IRIs of an array of entity ids
+        return np.char.add("{}entity/E".format(self.base), entity_ids.astype(str))
+
+    def __statement_indexes(self, distinct, total):
+        '''
+        Helper function to number the statements of every entity
+        Input:
+        -distinct: numpy array, distinct property count per entity
+        -total: numpy array, statement count per entity
+        Output:
+        -property index, statement index: numpy arrays with one element per statement
+        '''
+        total = total.astype(np.int64)
+        ends = np.cumsum(total)
+        statement_index = np.arange(ends[-1] if len(ends) > 0 else 0) - np.repeat(ends - total, total)
+        property_index = np.where(statement_index < np.repeat(distinct, total), statement_index, 0)
+        return property_index, statement_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic power-law knowledge graph")
+    parser.add_argument("--entities", type=float, default=1e5, help="total amount of entities, 1e3 to 1e8")
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--class-exponent", type=float, default=1.1)
+    parser.add_argument("--degree-exponent", type=float, default=2.0)
+    parser.add_argument("--in-degree-exponent", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distinct", action="store_true", help="write distinct property counts to the csv folder")
+    parser.add_argument("--chunk-size", type=int, default=1000000)
+    parser.add_argument("--csv-folder", default=None)
+    parser.add_argument("--ntriples", default=None)
+    parser.add_argument("--parquet", default=None, help="single parquet file to write")
+    parser.add_argument("--arrow-folder", default=None, help="folder to write one arrow file per class to")
+    args = parser.parse_args()
+
+    generator = PowerLawKGGenerator(int(args.entities), args.classes, class_exponent=args.class_exponent,
+                                    degree_exponent=args.degree_exponent, in_degree_exponent=args.in_degree_exponent, seed=args.seed)
+    if args.csv_folder is not None:
+        generator.write_csv_folder(args.csv_folder, distinct=args.distinct, chunk_size=args.chunk_size)
+    if args.parquet is not None:
+        generator.write_columnar(args.parquet, "parquet", distinct=args.distinct, chunk_size=args.chunk_size)
+    if args.arrow_folder is not None:
+        generator.write_columnar(args.arrow_folder, "arrow", partitioned=True, distinct=args.distinct, chunk_size=args.chunk_size)
+    if args.ntriples is not None:
+        generator.write_ntriples(args.ntriples, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()